@@ -3,3 +3,4 @@ Python interface to SER-SAG in-kind LSST proposal periodicity module
 """
 from .wavelets import *
 from .superlets import *
+from .lombscargle import *
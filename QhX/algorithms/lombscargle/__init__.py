@@ -0,0 +1,4 @@
+"""
+Initialization module for the Lomb-Scargle screening algorithms within the QhX package.
+"""
+from .lombscargle import *
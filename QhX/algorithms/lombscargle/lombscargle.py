@@ -0,0 +1,219 @@
+"""
+Fast Lomb-Scargle periodogram used as a cheap first-pass screen before WWZ.
+
+The periodogram follows the Press & Rybicki (1989) approach: the trigonometric
+sums are extirpolated onto a regular grid and evaluated with a single FFT, so
+the cost is O(N log N) instead of the O(N * ntau * ngrid) of the WWZ transform.
+The screen turns the periodogram into a list of candidate frequencies and a
+(minfq, maxfq) window that can be handed to `hybrid2d`.
+"""
+
+from math import factorial
+
+import numpy as np
+from scipy.signal import find_peaks
+
+# Default number of periodogram samples across a single peak
+DEFAULT_SAMPLES_PER_PEAK = 5
+# Default false alarm probability below which a peak is kept as a candidate
+DEFAULT_FAP_THRESHOLD = 0.01
+# Default relative margin added around the candidate periods
+DEFAULT_WINDOW_MARGIN = 0.2
+
+
+def _extirpolate(x, y, N, M=4):
+    """
+    Extirpolate values (x, y) onto an integer grid of length N using M-point Lagrange weights.
+    """
+    result = np.zeros(N, dtype=y.dtype)
+
+    # Points falling exactly on the grid contribute directly
+    integers = (x % 1 == 0)
+    np.add.at(result, x[integers].astype(int), y[integers])
+    x, y = x[~integers], y[~integers]
+
+    # Remaining points are spread over the M nearest grid nodes
+    ilo = np.clip((x - M // 2).astype(int), 0, N - M)
+    numerator = y * np.prod(x - ilo - np.arange(M)[:, np.newaxis], 0)
+    denominator = factorial(M - 1)
+    for j in range(M):
+        if j > 0:
+            denominator *= j / (j - M)
+        ind = ilo + (M - 1 - j)
+        np.add.at(result, ind, numerator / (denominator * (x - ind)))
+    return result
+
+
+def _trig_sum(t, h, df, N, f0=0., freq_factor=1, oversampling=5, Mfft=4):
+    """
+    Compute S_j = sum_i h_i sin(2 pi f_j t_i) and C_j = sum_i h_i cos(2 pi f_j t_i)
+    for f_j = freq_factor * (f0 + j * df), j = 0..N-1, with the FFT approximation.
+    """
+    df *= freq_factor
+    f0 *= freq_factor
+
+    Nfft = 1 << int(np.ceil(np.log2(N * oversampling)))
+    t0 = t.min()
+
+    if f0 > 0:
+        h = h * np.exp(2j * np.pi * f0 * (t - t0))
+
+    tnorm = ((t - t0) * Nfft * df) % Nfft
+    grid = _extirpolate(tnorm, h.astype(complex), Nfft, Mfft)
+    fftgrid = np.fft.ifft(grid)[:N]
+
+    if t0 != 0:
+        f = f0 + df * np.arange(N)
+        fftgrid *= np.exp(2j * np.pi * t0 * f)
+
+    return Nfft * fftgrid.imag, Nfft * fftgrid.real
+
+
+def fast_lomb_scargle(tt, yy, f0, df, N, dy=None, oversampling=5, Mfft=4):
+    """
+    Compute a floating-mean Lomb-Scargle periodogram on a regular frequency grid.
+
+    Parameters:
+    -----------
+    - tt (array): Array of time values.
+    - yy (array): Array of magnitude values corresponding to the time values.
+    - f0 (float): First frequency of the grid (1/days).
+    - df (float): Frequency step of the grid (1/days).
+    - N (int): Number of frequencies in the grid.
+    - dy (array, optional): Magnitude errors used as 1/dy^2 weights. Default is uniform weights.
+    - oversampling (int, optional): FFT grid oversampling factor. Default is 5.
+    - Mfft (int, optional): Number of extirpolation points. Default is 4.
+
+    Returns:
+    --------
+    - power (np.ndarray): Periodogram power with the standard normalization (0 to 1).
+    """
+    tt = np.asarray(tt, dtype=float)
+    yy = np.asarray(yy, dtype=float)
+    w = np.ones_like(yy) if dy is None else np.asarray(dy, dtype=float) ** -2
+    w /= w.sum()
+
+    # Center the data on the weighted mean
+    yy = yy - np.dot(w, yy)
+
+    kwargs = dict(df=df, N=N, f0=f0, oversampling=oversampling, Mfft=Mfft)
+    Sh, Ch = _trig_sum(tt, w * yy, **kwargs)
+    S2, C2 = _trig_sum(tt, w, freq_factor=2, **kwargs)
+    S, C = _trig_sum(tt, w, **kwargs)
+
+    tan_2omega_tau = (S2 - 2 * S * C) / (C2 - (C * C - S * S))
+    S2w = tan_2omega_tau / np.sqrt(1 + tan_2omega_tau * tan_2omega_tau)
+    C2w = 1 / np.sqrt(1 + tan_2omega_tau * tan_2omega_tau)
+    Cw = np.sqrt(0.5) * np.sqrt(1 + C2w)
+    Sw = np.sqrt(0.5) * np.sign(S2w) * np.sqrt(1 - C2w)
+
+    YY = np.dot(w, yy ** 2)
+    YC = Ch * Cw + Sh * Sw
+    YS = Sh * Cw - Ch * Sw
+    CC = 0.5 * (1 + C2 * C2w + S2 * S2w) - (C * Cw + S * Sw) ** 2
+    SS = 0.5 * (1 - C2 * C2w - S2 * S2w) - (S * Cw - C * Sw) ** 2
+
+    return (YC * YC / CC + YS * YS / SS) / YY
+
+
+def false_alarm_probability(power, n_points, n_independent):
+    """
+    Approximate false alarm probability of a peak with standard-normalized power.
+
+    Uses the single-frequency distribution (1 - P)^((N - 3) / 2) corrected for the
+    number of independent frequencies searched.
+    """
+    single = np.power(1. - np.clip(power, 0., 1.), (n_points - 3) / 2.)
+    return 1. - np.power(1. - single, n_independent)
+
+
+def lomb_scargle_candidates(tt, yy, minfq, maxfq, dy=None, samples_per_peak=DEFAULT_SAMPLES_PER_PEAK,
+                            fap_threshold=DEFAULT_FAP_THRESHOLD):
+    """
+    Find candidate frequencies in a light curve with the fast Lomb-Scargle periodogram.
+
+    Parameters:
+    -----------
+    - tt (array): Array of time values.
+    - yy (array): Array of magnitude values.
+    - minfq (float): Period corresponding to the minimum frequency for analysis.
+    - maxfq (float): Period corresponding to the maximum frequency for analysis.
+    - dy (array, optional): Magnitude errors.
+    - samples_per_peak (int, optional): Frequency grid density relative to the peak width.
+    - fap_threshold (float, optional): Peaks with a false alarm probability above this are discarded.
+
+    Returns:
+    --------
+    - candidates (np.ndarray): Candidate frequencies (1/days), strongest first. Empty if none.
+    """
+    if tt is None or yy is None or len(tt) < 4:
+        return np.array([])
+
+    fmin, fmax = 1. / minfq, 1. / maxfq
+    baseline = np.max(tt) - np.min(tt)
+    if baseline <= 0:
+        return np.array([])
+
+    n_independent = max(int(np.ceil((fmax - fmin) * baseline)), 1)
+    N = n_independent * samples_per_peak + 1
+    df = (fmax - fmin) / (N - 1)
+
+    power = fast_lomb_scargle(tt, yy, fmin, df, N, dy=dy)
+    peaks, _ = find_peaks(power)
+    if len(peaks) == 0:
+        return np.array([])
+
+    fap = false_alarm_probability(power[peaks], len(tt), n_independent)
+    peaks = peaks[fap < fap_threshold]
+    peaks = peaks[np.argsort(power[peaks])[::-1]]
+
+    return fmin + df * peaks
+
+
+def candidate_window(candidates, minfq, maxfq, margin=DEFAULT_WINDOW_MARGIN):
+    """
+    Turn candidate frequencies into a (minfq, maxfq) period window for `hybrid2d`.
+
+    The window spans all candidate periods widened by `margin` on both sides and is
+    clipped to the originally provided range.
+    """
+    candidate_periods = 1. / np.asarray(candidates)
+    window_minfq = min(minfq, np.max(candidate_periods) * (1. + margin))
+    window_maxfq = max(maxfq, np.min(candidate_periods) * (1. - margin))
+    return window_minfq, window_maxfq
+
+
+class LombScargleScreen:
+    """
+    Pluggable pre-stage for `process1_new` and `process1_new_dyn`.
+
+    Calling the screen with a list of (tt, yy) band light curves returns None when no
+    band has a candidate peak, so the caller can skip the WWZ stage, and otherwise the
+    (minfq, maxfq) period window bounding the candidates found in all bands.
+
+    Attributes:
+        samples_per_peak (int): Frequency grid density relative to the peak width.
+        fap_threshold (float): False alarm probability a peak must be below to be kept.
+        margin (float): Relative margin added around the candidate periods.
+        max_candidates (int or None): Maximum number of candidates kept per band.
+    """
+
+    def __init__(self, samples_per_peak=DEFAULT_SAMPLES_PER_PEAK, fap_threshold=DEFAULT_FAP_THRESHOLD,
+                 margin=DEFAULT_WINDOW_MARGIN, max_candidates=None):
+        self.samples_per_peak = samples_per_peak
+        self.fap_threshold = fap_threshold
+        self.margin = margin
+        self.max_candidates = max_candidates
+
+    def __call__(self, light_curves, minfq, maxfq):
+        candidates = []
+        for tt, yy in light_curves:
+            band_candidates = lomb_scargle_candidates(tt, yy, minfq, maxfq,
+                                                      samples_per_peak=self.samples_per_peak,
+                                                      fap_threshold=self.fap_threshold)
+            candidates.extend(band_candidates[:self.max_candidates])
+
+        if not candidates:
+            return None
+
+        return candidate_window(candidates, minfq, maxfq, self.margin)
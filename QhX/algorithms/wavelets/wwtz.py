@@ -1,3 +1,4 @@
+from functools import lru_cache
 from libwwz import wwt as libwwz_wwt
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,6 +7,7 @@ import sys
 import io
 from traitlets.traitlets import Integer
 from QhX.utils.correlation import correlation_nd
+from QhX.utils.stage_timing import stage
 
 
 
@@ -49,6 +51,36 @@ def compute_frequency_grid(Nn, minfq=None, maxfq=None):
 # This will compute the frequency grid for a given number of points and frequency range.
 
 
+@lru_cache(maxsize=32)
+def frequency_axes(ngrid, minfq, maxfq):
+    """
+    Returns the frequency axes used to read periods from the correlation of WWZ maps.
+
+    The axes only depend on the grid size and the frequency window, so they are computed once
+    per configuration and shared by all objects (workers warm the cache for the configured
+    grid when they start, see `ParallelSolver.initialize_worker`).
+
+    Parameters:
+    -----------
+    - ngrid (int): Number of grid points for the frequency axis.
+    - minfq (float): period corresponding to the Minimum frequency.
+    - maxfq (float): period corresponding to the Maximum frequency.
+
+    Returns:
+    --------
+    tuple: (osax, xax), the WWZ frequency axis and the axis with twice its resolution on which
+    the correlation is interpolated. Both arrays are read-only.
+    """
+    fmin = 1 / minfq
+    fmax = 1 / maxfq
+    df = (fmax - fmin) / ngrid
+    osax = np.arange(start=fmin, stop=fmax + df, step=df)
+    xax = np.arange(start=fmin, stop=fmax + df, step=df / 2)
+    osax.flags.writeable = False
+    xax.flags.writeable = False
+    return osax, xax
+
+
 
 def estimate_wavelet_periods(time_series,  ngrid, known_period=None):
     """
@@ -219,11 +251,13 @@ def hybrid2d(tt, mag, ntau, ngrid, minfq, maxfq, parallel=False, f=2, method='li
     # ...
 
     # Perform WWZ analysis on the data using the wwt function
-    wwz_matrix = wwt1(tt, mag, ntau, ngrid, minfq, maxfq, parallel, f, method)
+    with stage('wwz'):
+        wwz_matrix = wwt1(tt, mag, ntau, ngrid, minfq, maxfq, parallel, f, method)
 
     # Auto-correlate the WWZ matrix
     # np.rot90 rotates the matrix by 90 degrees to align time and frequency axes as needed
-    corr = correlation_nd(np.rot90(wwz_matrix[2]), np.rot90(wwz_matrix[2]))
+    with stage('correlation'):
+        corr = correlation_nd(np.rot90(wwz_matrix[2]), np.rot90(wwz_matrix[2]))
 
     # Determine the extent (range) of the frequency axis for plotting purposes
     extent_min = np.min(wwz_matrix[1])  # Minimum frequency from the WWZ result
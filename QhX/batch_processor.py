@@ -3,18 +3,40 @@ This module is designed for processing large datasets in parallel batches within
 It facilitates the batch processing of datasets using multiple workers to speed up the analysis.
 
 Functions:
-    process_batches(batch_size, num_workers=25, start_i=0): Main function to process data in specified batch sizes using parallel workers.
+    process_batches(batch_size, num_workers=25, start_i=0, store_path=None, resume=False, shard=None,
+                    results_file='result.csv'): Main function to process data in specified batch sizes using parallel workers.
 
 Example usage as a script:
     $ python batch_processor.py 100 25 0
     This command will process the dataset in batches of 100, using 25 parallel workers, starting from index 0.
+
+    $ python batch_processor.py 100 25 0 lc_store
+    Same as above, but the light curves are read from the memory-mapped store 'lc_store',
+    which is created from the Parquet file on the first run and reused afterwards.
+
+    $ python batch_processor.py 100 25 0 lc_store --resume
+    Resumes an interrupted run: completed batches are skipped and the batch that was running
+    continues from its journal, processing again the objects that were in flight.
+
+    $ python batch_processor.py 100 25 0 --shard 3/16
+    Processes only the objects of shard 3 of 16 (assigned by a stable hash of their IDs), loading
+    only them from the Parquet file. Batches are written to the directory 'shard3of16', with a
+    manifest once the shard completes; `python sharding.py` verifies and merges the shards.
+    `--results result.parquet` writes the results of each batch as a Parquet dataset instead.
+    With a store path, a shard without a complete store there creates its own store 'lc_store-shard3of16'.
 """
 import sys  # System-specific parameters and functions
 import os  # Miscellaneous operating system interfaces
+import time  # Timings recorded in shard manifests
 from QhX.parallelization_solver import ParallelSolver  # Import the ParallelSolver class
 from QhX.data_manager import DataManager  # Import the DataManager class for handling datasets
+from QhX.lc_index import STORE_METADATA_FILE  # Marker file of a complete light curve store
+from QhX.scheduling import CostModel  # Longest-first dispatch of objects
+from QhX.journal import RunJournal, JOURNAL_SUFFIX  # Completed and failed set IDs of a batch
+from QhX.sharding import parse_shard, select_shard, read_object_ids, write_manifest, result_files_of  # Multi-node runs
 
-def process_batches(batch_size, num_workers=25, start_i=0):
+def process_batches(batch_size, num_workers=25, start_i=0, store_path=None, resume=False, shard=None,
+                    results_file='result.csv'):
     """
     Processes data in batches using parallel processing.
 
@@ -22,37 +44,86 @@ def process_batches(batch_size, num_workers=25, start_i=0):
         batch_size (int): The number of data points to process in each batch.
         num_workers (int, optional): The number of parallel workers to use for processing. Defaults to 25.
         start_i (int, optional): The index from which to start processing the dataset. Defaults to 0.
+        store_path (str, optional): Directory of a memory-mapped light curve store. If it exists, the
+            light curves are attached from it instead of re-reading the Parquet file; otherwise it is
+            created from the Parquet file for later runs. Defaults to None (no store). A shard attaches
+            to a complete store at `store_path`, but only creates a store of its own objects, at
+            '<store_path>-shard<i>of<K>', so it is never mistaken for a store of the whole catalogue.
+        resume (bool, optional): Resume an interrupted run. Existing batch directories are entered
+            instead of skipped, and set IDs recorded as done in the journals of their results are not
+            processed again. Defaults to False.
+        shard (str, optional): Shard 'i/K' to process. Only the objects hashed to shard i of K are
+            loaded and processed, in batch directories below 'shard<i>of<K>', and a manifest of the
+            shard is written at the end. Defaults to None (all objects).
+        results_file (str, optional): Results file written in each batch directory, a Parquet
+            dataset if it ends with '.parquet'. Defaults to 'result.csv'.
 
     This function loads a dataset, groups the data as necessary, and then processes it in batches.
     Each batch is processed in a new directory to keep the results organized.
+    Objects of a batch are dispatched longest-first by a cost model, refined by the runtimes of earlier batches.
     """
 
     # Initial logging to indicate batch processing start
     print(f'Starting testing in batches of size {batch_size}')
 
+    if shard is not None:
+        shard, n_shards = parse_shard(shard)
+        print(f'Processing shard {shard} of {n_shards}')
+        if store_path is not None and not os.path.isfile(os.path.join(store_path, STORE_METADATA_FILE)):
+            # A store exported here would only hold the objects of this shard
+            store_path = f'{store_path.rstrip(os.sep)}-shard{shard}of{n_shards}'
+
     # Load and prepare the dataset using DataManager
     data_manager = DataManager()
-    fs_df = data_manager.load_fs_df('ForcedSourceTable.parquet')  # Load the dataset
-    fs_gp = data_manager.group_fs_df()  # Optional grouping step, specific to dataset structure
-    fs_df = data_manager.fs_df  # Access the DataFrame after any preprocessing
+    if store_path is not None and os.path.isfile(os.path.join(store_path, STORE_METADATA_FILE)):
+        # Attach to the existing store, pages are shared with other runs through the OS cache
+        data_manager.load_lc_store(store_path)
+        setids = data_manager.lc_index.object_ids.tolist()
+        if shard is not None:
+            setids = select_shard(setids, shard, n_shards)
+    else:
+        shard_ids = None
+        if shard is not None:
+            # Only the ID column is read to assign the shard, then only its objects are loaded
+            shard_ids = select_shard(read_object_ids('ForcedSourceTable.parquet'), shard, n_shards)
+        fs_df = data_manager.load_fs_df('ForcedSourceTable.parquet', object_ids=shard_ids)  # Load the dataset
+        fs_gp = data_manager.group_fs_df()  # Optional grouping step, specific to dataset structure
+        fs_df = data_manager.fs_df  # Access the DataFrame after any preprocessing
+
+        # Log the DataFrame to console (optional)
+        print(fs_df)
 
-    # Log the DataFrame to console (optional)
-    print(fs_df)
+        # Retrieve unique identifiers from the dataset for batch processing
+        setids = fs_df.objectId.unique().tolist()
 
-    # Retrieve unique identifiers from the dataset for batch processing
-    setids = fs_df.objectId.unique().tolist()
+        if store_path is not None:
+            # Persist the light curves and switch to the memory-mapped copy
+            data_manager.export_lc_store(store_path)
+            data_manager.load_lc_store(store_path)
+            data_manager.fs_df, data_manager.fs_gp = None, None
     j = 0  # Counter for batch directories
 
     # Initialize the ParallelSolver with specific parameters
     solver = ParallelSolver(data_manager=data_manager, delta_seconds=15.0, num_workers=num_workers, log_files=True,
-                            provided_minfq=500, provided_maxfq=10, ngrid=100, ntau=80)
+                            provided_minfq=500, provided_maxfq=10, ngrid=100, ntau=80,
+                            cost_model=CostModel(ntau=80, ngrid=100),
+                            store_path=store_path if data_manager.lc_index is not None else None)
     print(f'Tried num of workers {num_workers}')
 
+    run_dir = os.getcwd()
+    if shard is not None:
+        # Each shard writes its batches to its own directory, so nodes can share a file system
+        shard_dir = f'shard{shard}of{n_shards}'
+        os.makedirs(shard_dir, exist_ok=True)
+        os.chdir(shard_dir)
+    started = time.time()
+    batch_seconds = {}
+
     # Process each batch
     for i in range(start_i, len(setids), batch_size):
         try:
             # Attempt to create a directory for the current batch
-            os.mkdir(f'batch{j}sz{batch_size}')
+            os.makedirs(f'batch{j}sz{batch_size}', exist_ok=resume)
         except Exception as e:
             print(f'Error\n{e}\nfor batch {j}\nMoving to next batch\n')
             j += 1
@@ -60,19 +131,57 @@ def process_batches(batch_size, num_workers=25, start_i=0):
 
         print(f'Batch {j}')  # Log the current batch being processed
         os.chdir(f'batch{j}sz{batch_size}')  # Change to the batch directory
-        solver.process_ids(setids[i:min(i+batch_size, len(setids))], 'result.csv')  # Process the IDs in the batch
+        batch_start = time.perf_counter()
+        solver.process_ids(setids[i:min(i+batch_size, len(setids))], results_file, resume=resume)  # Process the IDs in the batch
+        batch_seconds[f'batch{j}sz{batch_size}'] = time.perf_counter() - batch_start
         j += 1  # Increment the batch counter
         print(os.getcwd())  # Log the current working directory
         os.chdir('..')  # Change back to the parent directory
 
+    if shard is not None:
+        write_shard_manifest(shard, n_shards, setids, batch_size, started, batch_seconds, results_file)
+        os.chdir(run_dir)
+
+
+def write_shard_manifest(shard, n_shards, setids, batch_size, started, batch_seconds, results_file='result.csv'):
+    """
+    Writes the manifest of a shard in the current (shard) directory, collecting the completed and
+    failed set IDs from the journals of its batch directories and the files of their `results_file`.
+    """
+    completed, failed, result_files = set(), set(), []
+    for batch_dir in sorted(os.listdir('.')):
+        result_path = os.path.join(batch_dir, results_file)
+        if batch_dir.startswith('batch') and batch_dir.endswith(f'sz{batch_size}') and os.path.exists(result_path):
+            result_files.extend(result_files_of(result_path))
+            journal = RunJournal(result_path + JOURNAL_SUFFIX)
+            completed |= journal.completed()
+            failed |= journal.failed()
+    timings = {'started': started, 'finished': time.time(), 'batch_seconds': batch_seconds}
+    path = write_manifest('.', shard, n_shards, setids, completed, failed, result_files, timings)
+    print(f'Shard manifest written to {os.path.abspath(path)}')
+
 if __name__ == "__main__":
     # Allow the module to be executed as a script with command-line arguments
     try:
-        batch_size = int(sys.argv[1])  # Batch size is a required argument
-        num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 25  # Optional num_workers argument
-        start_i = int(sys.argv[3]) if len(sys.argv) > 3 else 0  # Optional start_i argument
+        resume = '--resume' in sys.argv[1:]  # Optional flag to resume an interrupted run
+        args = [arg for arg in sys.argv[1:] if arg != '--resume']
+        shard = None  # Optional '--shard i/K' to process one shard of a multi-node run
+        if '--shard' in args:
+            k = args.index('--shard')
+            shard = args[k + 1]
+            parse_shard(shard)
+            del args[k:k + 2]
+        results_file = 'result.csv'  # Optional '--results <file>', e.g. 'result.parquet'
+        if '--results' in args:
+            k = args.index('--results')
+            results_file = args[k + 1]
+            del args[k:k + 2]
+        batch_size = int(args[0])  # Batch size is a required argument
+        num_workers = int(args[1]) if len(args) > 1 else 25  # Optional num_workers argument
+        start_i = int(args[2]) if len(args) > 2 else 0  # Optional start_i argument
+        store_path = args[3] if len(args) > 3 else None  # Optional light curve store argument
     except Exception as e:
         print(f'Error: {e}')
         sys.exit("Invalid Arguments")
 
-    process_batches(batch_size, num_workers, start_i)  # Call the main processing function with the arguments
+    process_batches(batch_size, num_workers, start_i, store_path, resume, shard, results_file)  # Call the main processing function with the arguments
@@ -114,20 +114,12 @@ def periods(lcID, data, ngrid, plot=False, save=False, peakHeight=0.6, prominenc
     hh1arr = np.rot90(hh1.T)
     hh1arr1 = np.abs(hh1arr).sum(1) / np.abs(hh1arr).sum(1).max()
 
-    # Calculate frequency parameters
-    fmin = 1 / minfq
-    fmax = 1 / maxfq
-    df = (fmax - fmin) / ngrid
+    # Frequency axes of the grid, shared by all objects with the same configuration
+    osax, xax = frequency_axes(ngrid, minfq, maxfq)
 
     # Interpolate data to obtain more points
-    osax = np.arange(start=fmin, stop=fmax + df, step=df)
-    xax = np.arange(start=fmin, stop=fmax + df, step=df / 2)
-    from scipy import interpolate
     f = interpolate.interp1d(osax, np.abs(hh1arr1), fill_value="extrapolate")
-    yax = []
-    for v in xax:
-        yax.append(float(f(v)))
-    yax = np.array(yax)
+    yax = np.asarray(f(xax), dtype=float)
 
     # Finding peaks
     peaks, _ = find_peaks(yax, peakHeight, prominence=prominence)
@@ -196,11 +188,7 @@ def signif_johnson(numlc, peak, idx_peaks, yax, tt, yy, ntau, ngrid, f=2, peakHe
     """
 
     # Interpolation parameters
-    fmin = 1 / minfq
-    fmax = 1 / maxfq
-    df = (fmax - fmin) / ngrid
-    osax = np.arange(start=fmin, stop=fmax + df, step=df)
-    xax = np.arange(start=fmin, stop=fmax + df, step=df / 2)
+    osax, xax = frequency_axes(ngrid, minfq, maxfq)
 
     idxrep = idx_peaks[peak]
     count = 0.  # Peak power larger than red noise peak power
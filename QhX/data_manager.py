@@ -1,5 +1,167 @@
 import pandas as pd
 import logging
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from QhX.lc_index import LightCurveIndex
+from QhX.lc_cache import LightCurveCache, DEFAULT_CACHE_BYTES
+
+
+def read_parquet_subset(source, object_ids=None, filters=None, columns=None,
+                        id_column='objectId', filter_column='filter') -> pd.DataFrame:
+    """
+    Read a subset of a Parquet file with predicate and projection pushdown.
+
+    The object ID and filter selections are pushed down to pyarrow, which skips row groups
+    whose statistics exclude them, and only the requested columns are decoded.
+
+    Parameters
+    ----------
+    source : str or file-like
+        Path or buffer of the Parquet file (or directory of Parquet files).
+    object_ids : list, optional
+        Object IDs to keep. Default is all objects.
+    filters : list, optional
+        Filter values to keep. Default is all filters.
+    columns : list of str, optional
+        Columns to read. The ID and filter columns are always included. Default is all columns.
+    id_column : str, optional
+        Name of the object ID column (default is 'objectId').
+    filter_column : str, optional
+        Name of the filter column (default is 'filter').
+
+    Returns
+    -------
+    pd.DataFrame
+        The selected rows and columns.
+
+    Examples
+    --------
+    >>> df = read_parquet_subset('ForcedSourceTable.parquet', object_ids=[1385092], columns=['mjd', 'psMag'])
+    """
+    expression = None
+    if object_ids is not None:
+        expression = ds.field(id_column).isin(list(object_ids))
+    if filters is not None:
+        filter_expression = ds.field(filter_column).isin(list(filters))
+        expression = filter_expression if expression is None else expression & filter_expression
+
+    if columns is not None:
+        columns = list(dict.fromkeys([id_column, filter_column] + list(columns)))
+
+    return pq.read_table(source, columns=columns, filters=expression).to_pandas()
+
+def compact_dtypes(df, group_by_key='objectId', mjd_epoch=None, integer_ids=True) -> pd.DataFrame:
+    """
+    Downcast a forced source table to compact dtypes and log the memory use per row.
+
+    - 'psMag' and 'psMagErr' become float32.
+    - 'mjd' stays float64, or becomes float32 days since `mjd_epoch` if an epoch is given.
+    - 'filter' becomes int8 if its values are small integers, otherwise categorical.
+    - Object IDs become int64 if they are integers or strings of integers and `integer_ids` is True.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Forced source data.
+    group_by_key : str, optional
+        Column holding the object ID (default is 'objectId').
+    mjd_epoch : float, optional
+        Epoch subtracted from 'mjd' before storing it as float32. Default keeps float64 MJD.
+    integer_ids : bool, optional
+        Convert object IDs to int64 when this is lossless (default is True). Note that IDs
+        passed to `get_lc22`/`process1_new` must then be integers too.
+
+    Returns
+    -------
+    pd.DataFrame
+        The compacted DataFrame.
+
+    Examples
+    --------
+    >>> fs_df = compact_dtypes(fs_df)
+    Memory per row: 61.0 bytes before, 26.0 bytes after compaction.
+    """
+    before = df.memory_usage(deep=True).sum() / max(len(df), 1)
+    df = df.copy()
+
+    for col in ('psMag', 'psMagErr'):
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+
+    if 'mjd' in df.columns and mjd_epoch is not None:
+        df['mjd'] = (df['mjd'] - mjd_epoch).astype('float32')
+
+    if 'filter' in df.columns:
+        filters = df['filter']
+        numeric = pd.api.types.is_numeric_dtype(filters) and not pd.api.types.is_bool_dtype(filters)
+        if numeric and filters.notna().all() and (filters % 1 == 0).all() \
+                and filters.min() >= -128 and filters.max() <= 127:
+            df['filter'] = filters.astype('int8')
+        else:
+            df['filter'] = filters.astype('category')
+
+    if integer_ids and group_by_key in df.columns and not pd.api.types.is_integer_dtype(df[group_by_key]):
+        try:
+            ids = pd.to_numeric(df[group_by_key], errors='raise')
+            if ids.notna().all() and (ids % 1 == 0).all():
+                df[group_by_key] = ids.astype('int64')
+        except (ValueError, TypeError):
+            logging.info(f"Column '{group_by_key}' is not numeric, object IDs are kept as they are.")
+    elif integer_ids and group_by_key in df.columns:
+        df[group_by_key] = df[group_by_key].astype('int64')
+
+    after = df.memory_usage(deep=True).sum() / max(len(df), 1)
+    logging.info(f"Memory per row: {before:.1f} bytes before, {after:.1f} bytes after compaction.")
+    return df
+
+
+def count_points(df, group_by_key='objectId') -> pd.DataFrame:
+    """
+    Count valid points per object and filter with a single groupby.
+
+    Rows containing NaN in any column are not counted, matching the `dropna` applied
+    when light curves are extracted.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Forced source data.
+    group_by_key : str, optional
+        Column holding the object ID (default is 'objectId').
+
+    Returns
+    -------
+    pd.DataFrame
+        Point counts indexed by object ID with one column per filter.
+    """
+    return df.dropna().groupby([group_by_key, 'filter'], observed=True).size().unstack(fill_value=0)
+
+
+def select_by_counts(counts, object_ids, min_points=100, bands=None) -> list:
+    """
+    Select the object IDs that have at least `min_points` points in every band.
+
+    Parameters
+    ----------
+    counts : pd.DataFrame
+        Point counts indexed by object ID with one column per filter (see `count_points`).
+    object_ids : list
+        Object IDs to check. The order is preserved in the output.
+    min_points : int, optional
+        Minimum number of points required in each band (default is 100).
+    bands : iterable, optional
+        Bands that must be complete. Default is all filters present in `counts`.
+
+    Returns
+    -------
+    list
+        Object IDs that meet the criteria.
+    """
+    if bands is not None:
+        counts = counts.reindex(columns=list(bands), fill_value=0)
+    eligible = set(counts.index[(counts >= min_points).all(axis=1)])
+    return [obj_id for obj_id in object_ids if obj_id in eligible]
+
 
 class DataManager:
     """
@@ -18,6 +180,12 @@ class DataManager:
         DataFrame containing object data.
     td_objects : pd.DataFrame or None
         DataFrame containing time-domain objects.
+    lc_index : LightCurveIndex or None
+        Optional columnar light curve index used for fast per-object extraction.
+    outlier_params : dict or None
+        Parameters of the bulk outlier removal applied to fs_df, or None if it was not applied.
+    lc_cache : LightCurveCache or None
+        Optional LRU cache of cleaned light curves, enabled with `enable_cache`.
     """
 
     def __init__(self):
@@ -28,15 +196,67 @@ class DataManager:
         self.fs_gp = None
         self.object_df = None
         self.td_objects = None
+        self.lc_index = None
+        self.outlier_params = None
+        self.lc_cache = None
 
-    def load_fs_df(self, path_source: str) -> pd.DataFrame:
+    def enable_cache(self, max_bytes: int = DEFAULT_CACHE_BYTES) -> LightCurveCache:
+        """
+        Enable an LRU cache of cleaned light curves used by `get_lc22` and `get_lc_dyn`.
+
+        Entries are keyed by (object ID, include_errors, cleaning parameters) and hold the
+        cleaned arrays before noise is added, so repeated extractions of the same object skip
+        the pandas groupby and outlier cleaning. The cache is cleared whenever the data changes.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Maximum total size of the cached arrays in bytes (default is 256 MiB).
+
+        Returns
+        -------
+        LightCurveCache
+            The enabled cache, whose `stats()` report hits, misses and evictions.
+
+        Examples
+        --------
+        >>> dm = DataManager()
+        >>> dm.enable_cache(max_bytes=64 * 1024 ** 2)
+        >>> lc = get_lc22(dm, set_id)
+        >>> lc = get_lc22(dm, set_id)
+        >>> dm.lc_cache.stats()['hits']
+        1
+        """
+        self.lc_cache = LightCurveCache(max_bytes)
+        return self.lc_cache
+
+    def clear_cache(self):
+        """
+        Drop all cached light curves, if the cache is enabled.
+        """
+        if self.lc_cache is not None:
+            self.lc_cache.clear()
+
+    def load_fs_df(self, path_source: str, object_ids: list = None, filters: list = None,
+                   columns: list = None, compact: bool = False) -> pd.DataFrame:
         """
         Load forced source data from a file.
 
+        If any of `object_ids`, `filters` or `columns` is given, the selection is pushed
+        down to the Parquet reader, so only the matching row groups and columns are read.
+
         Parameters
         ----------
         path_source : str
             The path to the source data file.
+        object_ids : list, optional
+            Object IDs to load. Default is all objects.
+        filters : list, optional
+            Filter values to load. Default is all filters.
+        columns : list of str, optional
+            Columns to load in addition to 'objectId' and 'filter'. Default is all columns.
+        compact : bool, optional
+            Downcast the loaded data with `compact_dtypes` (default is False).
 
         Returns
         -------
@@ -48,9 +268,21 @@ class DataManager:
         >>> dm = DataManager()
         >>> dm.load_fs_df('path_to_fs_df.parquet')
         Forced source data loaded successfully.
+        >>> dm.load_fs_df('path_to_fs_df.parquet', object_ids=shard_ids, columns=['mjd', 'psMag', 'psMagErr'])
+        Forced source data loaded successfully.
         """
         try:
-            self.fs_df = pd.read_parquet(path_source)
+            if object_ids is None and filters is None and columns is None:
+                self.fs_df = pd.read_parquet(path_source)
+            else:
+                self.fs_df = read_parquet_subset(path_source, object_ids, filters, columns)
+            if compact:
+                self.fs_df = compact_dtypes(self.fs_df)
+            # The grouping, the light curve index and the bulk cleaning describe the previous table
+            self.fs_gp = None
+            self.lc_index = None
+            self.outlier_params = None
+            self.clear_cache()
             logging.info("Forced source data loaded successfully.")
             return self.fs_df
         except Exception as e:
@@ -81,6 +313,140 @@ class DataManager:
             logging.warning("fs_df is not available for grouping.")
             return None
 
+    def build_lc_index(self) -> LightCurveIndex:
+        """
+        Build a columnar light curve index from the forced source data.
+
+        Once built, `get_lc22` and `get_lc_dyn` slice light curves from the index
+        instead of going through the pandas groupby.
+
+        Returns
+        -------
+        LightCurveIndex or None
+            The built index or None if fs_df is not available.
+
+        Examples
+        --------
+        >>> dm = DataManager()
+        >>> dm.load_fs_df('path_to_fs_df.parquet')
+        >>> dm.build_lc_index()
+        Light curve index built for 1000 objects and 4 filters.
+        """
+        if self.fs_df is None:
+            logging.warning("fs_df is not available for indexing.")
+            return None
+        self.lc_index = LightCurveIndex.from_frame(self.fs_df, group_by_key='objectId')
+        self.lc_index.cleaning = self.outlier_params
+        return self.lc_index
+
+    def remove_outliers(self, threshold_factor: float = 3.0, use_errors: bool = False) -> pd.DataFrame:
+        """
+        Remove MAD outliers from every (object, filter) light curve in one vectorized pass.
+
+        The cleaned table replaces fs_df and the grouping and light curve index are rebuilt if
+        they existed. `get_lc22` and `get_lc_dyn` then skip their per-object outlier cleaning.
+        The cleaning is recorded in exported light curve stores, so attached workers skip it too.
+
+        Parameters
+        ----------
+        threshold_factor : float, optional
+            Multiplier of the MAD used as threshold (default is 3.0).
+        use_errors : bool, optional
+            Add the median magnitude error of each light curve to the threshold (default is False,
+            as the per-object cleaning of the fixed mode, which runs without errors).
+
+        Returns
+        -------
+        pd.DataFrame or None
+            The cleaned DataFrame or None if fs_df is not available.
+
+        Examples
+        --------
+        >>> dm = DataManager()
+        >>> dm.load_fs_df('path_to_fs_df.parquet')
+        >>> dm.remove_outliers()
+        Outliers removed from all light curves.
+        """
+        if self.fs_df is None:
+            logging.warning("fs_df is not available for outlier removal.")
+            return None
+
+        # Imported here because light_curve depends on this module
+        from QhX.light_curve import outliers_mad_frame
+
+        self.fs_df = outliers_mad_frame(self.fs_df, ['objectId', 'filter'], threshold_factor, use_errors)
+        self.outlier_params = {'threshold_factor': threshold_factor, 'use_errors': use_errors}
+        self.clear_cache()
+        if self.fs_gp is not None:
+            self.fs_gp = None
+            self.group_fs_df()
+        if self.lc_index is not None:
+            self.build_lc_index()
+        logging.info("Outliers removed from all light curves.")
+        return self.fs_df
+
+    def export_lc_store(self, path: str) -> LightCurveIndex:
+        """
+        Write the cleaned, sorted light curves to an on-disk store that can be memory-mapped.
+
+        Builds the light curve index first if it does not exist yet.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store.
+
+        Returns
+        -------
+        LightCurveIndex or None
+            The exported index or None if no data is available.
+
+        Examples
+        --------
+        >>> dm = DataManager()
+        >>> dm.load_fs_df('ForcedSourceTable.parquet')
+        >>> dm.export_lc_store('lc_store')
+        Light curve store written to lc_store.
+        """
+        if self.lc_index is None and self.build_lc_index() is None:
+            return None
+        self.lc_index.save(path)
+        return self.lc_index
+
+    def load_lc_store(self, path: str, mmap_mode: str = 'r') -> LightCurveIndex:
+        """
+        Attach to an on-disk light curve store written by `export_lc_store`.
+
+        The store is memory-mapped, so processes attaching to the same store share its pages
+        through the OS cache instead of holding private copies of the forced source table.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store.
+        mmap_mode : str or None, optional
+            Memory-map mode (default is 'r'). Use None to read the store into memory.
+
+        Returns
+        -------
+        LightCurveIndex or None
+            The attached index or None in case of an error.
+
+        Examples
+        --------
+        >>> dm = DataManager()
+        >>> dm.load_lc_store('lc_store')
+        Light curve store opened from lc_store.
+        """
+        try:
+            self.lc_index = LightCurveIndex.load(path, mmap_mode=mmap_mode)
+            self.outlier_params = None  # The store records its own cleaning
+            self.clear_cache()
+            return self.lc_index
+        except Exception as e:
+            logging.error(f"Error loading light curve store: {e}")
+            return None
+
     def load_object_df(self, path_obj: str) -> pd.DataFrame:
         """
         Load object data and filter for time-domain objects.
@@ -111,16 +477,37 @@ class DataManager:
             logging.error(f"Error loading object_df: {e}")
             return None
 
-    def get_qso(self, object_ids: list, min_points: int = 100) -> list:
+    def point_counts(self) -> pd.DataFrame:
+        """
+        Return valid point counts per object and filter.
+
+        Uses the light curve index when available, otherwise a single groupby over fs_df.
+
+        Returns
+        -------
+        pd.DataFrame
+            Point counts indexed by object ID with one column per filter.
+        """
+        if self.lc_index is not None:
+            return self.lc_index.point_counts()
+        return count_points(self.fs_df, 'objectId')
+
+    def get_qso(self, object_ids: list, min_points: int = 100, bands=range(1, 5)) -> list:
         """
         Get QSOs with complete u,g,r,i light curves with at least 'min_points' points.
 
+        Point counts for all objects and filters are computed in one vectorized pass
+        (see `point_counts`) instead of one groupby lookup per object.
+
         Parameters
         ----------
         object_ids : list
             List of object IDs to check.
         min_points : int, optional
             Minimum number of points required in each light curve (default is 100).
+        bands : iterable or None, optional
+            Filters that must be complete (default is filters 1 to 4). None requires all
+            filters present in the data.
 
         Returns
         -------
@@ -136,13 +523,7 @@ class DataManager:
         >>> object_ids = ['id1', 'id2', 'id3']
         >>> quasar_ids = dm.get_qso(object_ids)
         """
-        valid_qsos = []
-        for obj_id in object_ids:
-            if obj_id in self.fs_gp.groups:
-                demo_lc = self.fs_gp.get_group(obj_id)
-                if all(len(demo_lc[demo_lc['filter'] == f].dropna()) >= min_points for f in range(1, 5)):
-                    valid_qsos.append(obj_id)
-        return valid_qsos
+        return select_by_counts(self.point_counts(), object_ids, min_points, bands)
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,229 @@
+"""
+data_manager_dask.py
+
+This module provides an out-of-core variant of the DataManager for forced source tables that
+do not fit in memory. The table is kept as a dask DataFrame indexed (and therefore partitioned)
+by `objectId`, so the light curve of a single object lives in exactly one partition and can be
+pulled without materializing the rest of the table.
+
+Classes:
+--------
+- DaskDataManager: DataManager whose `fs_df` is a dask DataFrame partitioned by object ID.
+- PartitionedGroupBy: Minimal stand-in for a pandas groupby that reads single objects from their partition.
+"""
+
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+import dask
+import dask.dataframe as dd
+from QhX.data_manager import DataManager
+from QhX.light_curve import outliers_mad_frame
+
+# Default number of computed partitions kept in memory
+DEFAULT_CACHED_PARTITIONS = 2
+
+
+class PartitionedGroupBy:
+    """
+    Groupby-like access to a dask DataFrame indexed by object ID.
+
+    Supports the subset of the pandas groupby interface used by QhX: `set_id in gp.groups`
+    and `gp.get_group(set_id)`. Recently used partitions are kept computed, so iterating over
+    objects partition by partition reads every partition once.
+    """
+
+    def __init__(self, data_manager, max_cached_partitions=DEFAULT_CACHED_PARTITIONS):
+        self.data_manager = data_manager
+        self.max_cached_partitions = max_cached_partitions
+        self._partitions = OrderedDict()
+
+    @property
+    def groups(self):
+        """Container supporting membership tests of object IDs."""
+        return self
+
+    def __contains__(self, obj_id):
+        partition = self._partition(obj_id)
+        return partition is not None and obj_id in partition.index
+
+    def _partition(self, obj_id):
+        i = self.data_manager.partition_of(obj_id)
+        if i is None:
+            return None
+        if i not in self._partitions:
+            self._partitions[i] = self.data_manager.fs_df.get_partition(i).compute()
+            if len(self._partitions) > self.max_cached_partitions:
+                self._partitions.popitem(last=False)
+        self._partitions.move_to_end(i)
+        return self._partitions[i]
+
+    def get_group(self, obj_id):
+        """Return the rows of one object as a pandas DataFrame with an `objectId` column."""
+        partition = self._partition(obj_id)
+        if partition is None or obj_id not in partition.index:
+            raise KeyError(obj_id)
+        return partition.loc[[obj_id]].reset_index()
+
+
+class DaskDataManager(DataManager):
+    """
+    DataManager backed by a dask DataFrame partitioned by object ID.
+
+    `fs_df` is a dask DataFrame indexed by `objectId` with known divisions, and `fs_gp` is a
+    `PartitionedGroupBy`, so `get_lc22`, `get_lc_dyn` and the process functions work unchanged
+    while only the partition holding the requested object is read.
+
+    Attributes
+    ----------
+    npartitions : int or None
+        Number of partitions to shuffle the table into (default keeps dask's choice).
+    max_cached_partitions : int
+        Number of computed partitions kept in memory by `fs_gp`.
+    """
+
+    def __init__(self, npartitions=None, max_cached_partitions=DEFAULT_CACHED_PARTITIONS):
+        super().__init__()
+        self.npartitions = npartitions
+        self.max_cached_partitions = max_cached_partitions
+        self._layout = None
+
+    def load_fs_df(self, path_source: str, object_ids: list = None, filters: list = None,
+                   columns: list = None, compact: bool = False) -> dd.DataFrame:
+        """
+        Lazily load forced source data and shuffle it by object ID.
+
+        Parameters
+        ----------
+        path_source : str
+            Path (or glob) of the Parquet source data.
+        object_ids, filters : list, optional
+            Object IDs and filter values to keep, pushed down to the Parquet reader.
+        columns : list of str, optional
+            Columns to load in addition to 'objectId' and 'filter'.
+        compact : bool, optional
+            Downcast 'psMag' and 'psMagErr' to float32 (default is False). The other conversions
+            of `compact_dtypes` depend on the values of the whole table and are not applied.
+
+        Returns
+        -------
+        dd.DataFrame or None
+            The partitioned DataFrame or None in case of an error.
+        """
+        try:
+            selection = []
+            if object_ids is not None:
+                selection.append(('objectId', 'in', list(object_ids)))
+            if filters is not None:
+                selection.append(('filter', 'in', list(filters)))
+            if columns is not None:
+                columns = list(dict.fromkeys(['objectId', 'filter'] + list(columns)))
+
+            ddf = dd.read_parquet(path_source, columns=columns, filters=selection or None)
+            if compact:
+                ddf = ddf.astype({col: 'float32' for col in ('psMag', 'psMagErr') if col in ddf.columns})
+            if self.npartitions is not None:
+                self.fs_df = ddf.set_index('objectId', npartitions=self.npartitions)
+            else:
+                self.fs_df = ddf.set_index('objectId')
+            self.fs_gp = None
+            self.outlier_params = None  # The new table is not cleaned yet
+            self._layout = None
+            self.clear_cache()
+            logging.info(f"Forced source data partitioned into {self.fs_df.npartitions} partitions by objectId.")
+            return self.fs_df
+        except Exception as e:
+            logging.error(f"Error loading fs_df: {e}")
+            return None
+
+    def group_fs_df(self) -> PartitionedGroupBy:
+        """
+        Create the partition-aware groupby used to pull single objects.
+        """
+        if self.fs_df is not None and self.fs_gp is None:
+            self.fs_gp = PartitionedGroupBy(self, self.max_cached_partitions)
+            logging.info("Forced source data grouped successfully.")
+            return self.fs_gp
+        else:
+            logging.warning("fs_df is not available for grouping.")
+            return None
+
+    def build_lc_index(self):
+        """
+        Not supported: the whole point of this backend is to never materialize the full table.
+        Logs an error and returns None, so `export_lc_store` and shared memory fall back cleanly.
+        Build a `LightCurveIndex` per partition with `get_partition` if needed.
+        """
+        logging.error("DaskDataManager does not build a light curve index, it would materialize the full table.")
+        return None
+
+    def export_lc_store(self, path: str):
+        """
+        Not supported, see `build_lc_index`. Export the table to Parquet and load it into a
+        DataManager to write a light curve store.
+        """
+        logging.error(f"DaskDataManager cannot export a light curve store to {path}.")
+        return None
+
+    def partition_of(self, obj_id):
+        """
+        Return the index of the partition that can hold `obj_id`, or None if it is out of range.
+        """
+        divisions = self.fs_df.divisions
+        try:
+            if obj_id < divisions[0] or obj_id > divisions[-1]:
+                return None
+            return min(bisect_right(divisions, obj_id) - 1, self.fs_df.npartitions - 1)
+        except TypeError:
+            return None
+
+    def partition_layout(self) -> dict:
+        """
+        Return a dict mapping each partition index to the object IDs it holds.
+
+        The layout is computed once (reading only the index) and cached. Solvers can use it to
+        schedule objects partition by partition, so every partition is read once.
+        """
+        if self._layout is None:
+            ids = dask.compute(*[self.fs_df.get_partition(i).index.unique()
+                                 for i in range(self.fs_df.npartitions)])
+            self._layout = {i: list(part_ids) for i, part_ids in enumerate(ids)}
+        return self._layout
+
+    def order_by_partition(self, object_ids: list) -> list:
+        """
+        Reorder object IDs so that objects from the same partition are processed together.
+        """
+        last = self.fs_df.npartitions
+        return sorted(object_ids, key=lambda obj_id: last if self.partition_of(obj_id) is None
+                      else self.partition_of(obj_id))
+
+    def point_counts(self):
+        """
+        Return valid point counts per object and filter, computed partition by partition with dask.
+        """
+        return (self.fs_df.dropna().reset_index()
+                .groupby(['objectId', 'filter']).size().compute().unstack(fill_value=0))
+
+    def remove_outliers(self, threshold_factor: float = 3.0, use_errors: bool = False):
+        """
+        Remove MAD outliers lazily, partition by partition.
+
+        Every object lives in a single partition, so the vectorized cleaning of
+        `outliers_mad_frame` can run on each partition independently.
+        """
+        if self.fs_df is None:
+            logging.warning("fs_df is not available for outlier removal.")
+            return None
+
+        def clean_partition(partition):
+            cleaned = outliers_mad_frame(partition.reset_index(), ['objectId', 'filter'], threshold_factor, use_errors)
+            return cleaned.set_index('objectId')
+
+        self.fs_df = self.fs_df.map_partitions(clean_partition)
+        self.outlier_params = {'threshold_factor': threshold_factor, 'use_errors': use_errors}
+        self.clear_cache()
+        if self.fs_gp is not None:
+            self.fs_gp = None
+            self.group_fs_df()
+        return self.fs_df
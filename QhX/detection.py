@@ -1,10 +1,14 @@
 # detection.py
 
 import numpy as np
-from QhX.light_curve import  get_lc22
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from QhX.light_curve import get_lc22, has_object
 # Ensure to import or define other necessary functions like hybrid2d, periods, same_periods, etc.
 from QhX.algorithms.wavelets.wwtz import *
 from QhX.calculation import *
+from QhX.results import as_results
+from QhX.utils.stage_timing import stage
 
 # Example ntau parameter
 DEFAULT_NTAU = 80
@@ -17,7 +21,79 @@ DEFAULT_PROVIDED_MAXFQ = 10
 
 #from QhX.algorithms.wavelets.wwt import estimate_wavelet_periods
 
-def process1_new(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None, provided_maxfq=None, include_errors=True, parallel=False):
+def no_detection_results(set1, sampling_rates, labels):
+    """
+    Build the per-pair result rows for an object in which no common period was searched for or found.
+
+    Parameters
+    ----------
+    set1 : int
+        Identifier of the object.
+    sampling_rates : list of float
+        Mean sampling rate of each band, in the same order as `labels`.
+    labels : list of str
+        Band labels.
+
+    Returns
+    -------
+    np.ndarray
+        Result records (see `QhX.results.RESULT_DTYPE`), one per band pair with NaN period,
+        errors and significance.
+    """
+    det_periods = []
+    for i in range(len(labels)):
+        for j in range(i + 1, len(labels)):
+            det_periods.append({
+                "objectid": set1,
+                "sampling_i": sampling_rates[i],
+                "sampling_j": sampling_rates[j],
+                "period": np.nan,
+                "upper_error": np.nan,
+                "lower_error": np.nan,
+                "significance": np.nan,
+                "label": f"{labels[i]}-{labels[j]}"
+            })
+    return as_results(det_periods)
+
+
+def band_periods(set1, light_curves, ntau=None, ngrid=None, minfq=None, maxfq=None, parallel=False, band_workers=None):
+    """
+    Runs the wavelet analysis (`hybrid2d`) and the period search (`periods`) of each band of an object.
+
+    The bands are independent, so with `band_workers` > 1 they are analyzed concurrently on a thread
+    pool, NumPy and libwwz releasing the GIL in their array operations. The results are the same as
+    with the serial loop and in the same order. Threads add to the BLAS threads of the process and
+    should not be combined with libwwz's own parallel mode (`parallel=True`).
+
+    Parameters
+    ----------
+    set1 : int or str
+        Identifier of the object, used in messages.
+    light_curves : list of (tt, yy) tuples
+        Light curve of each band.
+    band_workers : int, optional
+        Number of threads analyzing bands at once, None or 1 to analyze them one after another.
+
+    Returns
+    -------
+    list of (r_periods, up, low, peaks, hh) tuples, one per band.
+    """
+    def analyze(light_curve):
+        tt, yy = light_curve
+        wwz_matrix, corr, extent = hybrid2d(tt, yy, ntau=ntau, ngrid=ngrid, minfq=minfq, maxfq=maxfq, parallel=parallel)
+        with stage('periods'):
+            peaks, hh, r_periods, up, low = periods(set1, corr, ngrid=ngrid, plot=False, minfq=minfq, maxfq=maxfq)
+        return r_periods, up, low, peaks, hh
+
+    if band_workers is None or band_workers <= 1 or len(light_curves) <= 1:
+        return [analyze(light_curve) for light_curve in light_curves]
+    with ThreadPoolExecutor(max_workers=min(band_workers, len(light_curves))) as executor:
+        # Each band runs in its own copy of the caller's context, so its stages are recorded for the object
+        contexts = [copy_context() for _ in light_curves]
+        return list(executor.map(lambda context, light_curve: context.run(analyze, light_curve), contexts, light_curves))
+
+
+def process1_new(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None, provided_maxfq=None, include_errors=True, parallel=False, screen=None, bands=None, band_workers=None):
     """
     Processes and analyzes light curve data from a single object to detect common periods across different bands.
     The process involves:
@@ -40,11 +116,21 @@ def process1_new(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None,
         Period corresponding to the Maximum frequency for analysis, default is calculated from data.
     include_errors : bool, optional
         Include magnitude errors in analysis. Defaults to True.
+    screen : callable, optional
+        Cheap pre-stage (e.g. `LombScargleScreen`) called with the list of (tt, yy) band light curves
+        and the frequency window. If it returns None the WWZ stage is skipped and NaN rows are returned,
+        otherwise the returned (minfq, maxfq) window is used for the WWZ analysis.
+    bands : dict, optional
+        The cleaned bands of the object as returned by `get_clean_bands`, e.g. loaded ahead by a `Prefetcher`.
+        Fetched from the data manager if not given.
+    band_workers : int, optional
+        Number of threads analyzing the bands concurrently (see `band_periods`), None for one band at a time.
     Returns
     -------
-    A list of dictionaries representing the results of the analysis performed on light curve data. Each dictionary contains:
+    A structured array of result records (see `QhX.results.RESULT_DTYPE`), one per band pair and common period,
+    with the fields:
 
-        - objectid (int): Identifier of the object ID.
+        - objectid (str): The object ID in its string form (e.g. 1234 gives '1234'), at most 64 characters.
         - sampling_i (float): Mean sampling rate in the first band of the pair where a common period is detected.
         - sampling_j (float): Mean sampling rate in the second band in the pair.
         - period (float): Detected common period between the two bands. NaN if no period is detected.
@@ -53,26 +139,30 @@ def process1_new(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None,
         - significance (float): Measure of the statistical significance of the detected period. NaN if no period is detected.
         - label (str): Label identifying the pair of bands where the period was detected (e.g., '0-1', '1-2').
     """
-    # Check if set1 exists
-    if set1 not in data_manager.fs_gp.groups:
+    # Check if set1 exists, unless its light curves were loaded ahead
+    if bands is None and not has_object(data_manager, set1):
         print(f"Set ID {set1} not found.")
         return None
     # Retrieve light curves for different bands
-    light_curves_data = get_lc22(data_manager, set1, include_errors)
+    light_curves_data = get_lc22(data_manager, set1, include_errors, bands=bands)
     if any(len(data) == 0 for data in light_curves_data if isinstance(data, np.ndarray)):
         print(f"Insufficient data for set ID {set1}.")
         return None
     # Unpack light curve data and sampling rates
     tt0, yy0, tt1, yy1, tt2, yy2, tt3, yy3, sampling0, sampling1, sampling2, sampling3 = light_curves_data
-    results = []
-    # Process each band's light curve with hybrid2d and collect periods
-    for tt, yy in [(tt0, yy0), (tt1, yy1), (tt2, yy2), (tt3, yy3)]:
-        wwz_matrix, corr, extent = hybrid2d(tt, yy, ntau=ntau, ngrid=ngrid, minfq=provided_minfq, maxfq=provided_maxfq, parallel=parallel)
-        peaks, hh, r_periods, up, low = periods(set1, corr, ngrid=ngrid, plot=False, minfq=provided_minfq, maxfq=provided_maxfq)
-        results.append((r_periods, up, low, peaks, hh))
     # Define sampling rates and labels for bands
     sampling_rates = [sampling0, sampling1, sampling2, sampling3]
     light_curve_labels = ['0', '1', '2', '3']
+    # Optional cheap screen: skip WWZ entirely or narrow the frequency window
+    if screen is not None:
+        window = screen([(tt0, yy0), (tt1, yy1), (tt2, yy2), (tt3, yy3)], provided_minfq, provided_maxfq)
+        if window is None:
+            print(f"No candidate periods for set ID {set1}, skipping WWZ.")
+            return no_detection_results(set1, sampling_rates, light_curve_labels)
+        provided_minfq, provided_maxfq = window
+    # Process each band's light curve with hybrid2d and collect periods
+    results = band_periods(set1, [(tt0, yy0), (tt1, yy1), (tt2, yy2), (tt3, yy3)], ntau=ntau, ngrid=ngrid,
+                           minfq=provided_minfq, maxfq=provided_maxfq, parallel=parallel, band_workers=band_workers)
     det_periods = []
     # Loop through all pairs of filters, ensuring no redundancy
     for i in range(len(results)):
@@ -108,7 +198,7 @@ def process1_new(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None,
                         "significance": round(sig_common[k], 2),  # Ensure two decimal places for significance
                         "label": f"{light_curve_labels[i]}-{light_curve_labels[j]}"
                     })
-    return det_periods
+    return as_results(det_periods)
 
 
 
@@ -149,7 +239,7 @@ def process1(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None, pro
     - Comparing periods detected in different bands to find common periods, ensuring they do not differ more than 10%.
     - Compiling results into a structured format, including periods, errors, and significance for the baseline comparison band.
     """
-    if set1 not in data_manager.fs_gp.groups:
+    if not has_object(data_manager, set1):
         print(f"Set ID {set1} not found.")
         return None
 
@@ -221,16 +311,18 @@ def same_periods(r_periods0, r_periods1, up0, low0, up1, low1, peaks0, hh0, tt0,
     # Function to find common periods and calculate significance
     def find_common_periods_and_significance(rp0, rp1, up, low, peaks, hh, tt, yy, ntau, ngrid, minfq, maxfq):
         # Find common periods using np.isclose, handling NaN values safely
-        common_indices = np.where(np.isclose(rp0, rp1, rtol=1e-01, equal_nan=True))[0]
-        r_periods = np.take(rp0, common_indices)
-        up, low = np.take(up, common_indices), np.take(low, common_indices)
+        with stage('matching'):
+            common_indices = np.where(np.isclose(rp0, rp1, rtol=1e-01, equal_nan=True))[0]
+            r_periods = np.take(rp0, common_indices)
+            up, low = np.take(up, common_indices), np.take(low, common_indices)
         sig = []
 
         if len(r_periods) > 0:
             for peak_of_interest in common_indices:
                 try:
                     # Calculate significance using the 'signif_johnson' function
-                    _, _, _, siger = signif_johnson(number_of_lcs, peak_of_interest, peaks, hh, tt, yy, ntau=ntau, ngrid=ngrid, f=2, peakHeight=0.6, minfq=minfq, maxfq=maxfq)
+                    with stage('significance'):
+                        _, _, _, siger = signif_johnson(number_of_lcs, peak_of_interest, peaks, hh, tt, yy, ntau=ntau, ngrid=ngrid, f=2, peakHeight=0.6, minfq=minfq, maxfq=maxfq)
                     sig_value = 1. - siger if siger is not None else np.nan
                     sig.append(sig_value)
                 except Exception as e:
@@ -25,18 +25,22 @@ Dependencies:
 """
 
 import logging
-from io import BytesIO
-import requests
 import pandas as pd
 import numpy as np
-from QhX.light_curve import outliers_mad, outliers
+from QhX.light_curve import outliers_mad, outliers, outliers_mad_frame, has_object, get_object_bands, is_precleaned, \
+    get_clean_bands
+from QhX.lc_index import LightCurveIndex
+from QhX.lc_cache import LightCurveCache, DEFAULT_CACHE_BYTES
+from QhX.data_manager import read_parquet_subset, compact_dtypes, count_points, select_by_counts
+from QhX.utils.remote_cache import fetch
 from QhX.calculation import *
 from QhX.detection import *
+from QhX.results import as_results
 from QhX.algorithms.wavelets.wwtz import *
 
 
 class DataManagerDynamical:
-    def __init__(self, column_mapping=None, group_by_key='objectId', filter_mapping=None):
+    def __init__(self, column_mapping=None, group_by_key='objectId', filter_mapping=None, cache_dir=None):
         """
         Initializes the DataManager with optional column and filter mappings.
 
@@ -48,33 +52,81 @@ class DataManagerDynamical:
             The key by which to group the dataset (e.g., 'source_id' or 'objectId').
         filter_mapping : dict, optional
             A dictionary to map filter values in the dataset (e.g., {'BP': 1, 'G': 2, 'RP': 3}).
+        cache_dir : str, optional
+            Directory where remote files are cached (default is `QhX.utils.remote_cache.default_cache_dir()`).
         """
         self.column_mapping = column_mapping or {}
         self.group_by_key = group_by_key
         self.filter_mapping = filter_mapping or {}
+        self.cache_dir = cache_dir
         self.data_df = None
         self.fs_gp = None
+        self.lc_index = None
+        self.outlier_params = None
+        self.lc_cache = None
 
-    def load_data(self, path_source: str) -> pd.DataFrame:
+    def enable_cache(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        Enable an LRU cache of cleaned light curves used by `get_lc_dyn` (see `LightCurveCache`).
+        The cache is bounded by `max_bytes` and cleared whenever the data changes.
+        """
+        self.lc_cache = LightCurveCache(max_bytes)
+        return self.lc_cache
+
+    def clear_cache(self):
+        """
+        Drop all cached light curves, if the cache is enabled.
+        """
+        if self.lc_cache is not None:
+            self.lc_cache.clear()
+
+    def load_data(self, path_source: str, object_ids=None, filters=None, columns=None, compact=False) -> pd.DataFrame:
         """
         Load data from a file or a URL, apply any necessary column mappings and filter transformations.
+        With `compact=True` the result is downcast with `compact_dtypes` (float32 photometry,
+        int8 or categorical filters, int64 object IDs).
+
+        Object IDs, filter values and column names are given as they appear after the mappings are
+        applied. If any of them is set, the selection is pushed down to the Parquet reader, so only
+        matching row groups and the requested columns are read.
+
+        Remote files (URLs starting with 'http') are streamed into a local content-addressed cache
+        and revalidated with ETag/Last-Modified, so they are only downloaded again when they change.
         """
         try:
             if path_source.startswith('http'):
-                response = requests.get(path_source)
-                response.raise_for_status()
-                raw_data = BytesIO(response.content)
+                raw_data = fetch(path_source, cache_dir=self.cache_dir)
+            else:
+                raw_data = path_source
+
+            if object_ids is None and filters is None and columns is None:
                 df = pd.read_parquet(raw_data)
             else:
-                df = pd.read_parquet(path_source)
+                # Translate the selection back to the names and values used in the file
+                source_names = {v: k for k, v in self.column_mapping.items()}
+                if filters is not None and self.filter_mapping:
+                    filters = [k for k, v in self.filter_mapping.items() if v in set(filters)]
+                if columns is not None:
+                    columns = [source_names.get(c, c) for c in columns]
+                df = read_parquet_subset(raw_data, object_ids, filters, columns,
+                                         id_column=source_names.get(self.group_by_key, self.group_by_key),
+                                         filter_column=source_names.get('filter', 'filter'))
 
             if self.column_mapping:
                 df.rename(columns=self.column_mapping, inplace=True)
 
             if 'filter' in df.columns and self.filter_mapping:
                 df['filter'] = df['filter'].map(self.filter_mapping)
-                
+
+            if compact:
+                df = compact_dtypes(df, group_by_key=self.group_by_key)
+
             self.data_df = df
+            # The grouping, the light curve index and the bulk cleaning describe the previous table
+            self.fs_gp = None
+            self.lc_index = None
+            self.outlier_params = None
+            self.clear_cache()
             logging.info("Data loaded and processed successfully.")
             return df
         except Exception as e:
@@ -93,42 +145,117 @@ class DataManagerDynamical:
         logging.error("Data is not available for grouping.")
         return None
 
+    def build_lc_index(self):
+        """
+        Build a columnar light curve index (see `LightCurveIndex`) keyed by `group_by_key`,
+        so that `get_lc_dyn` can slice light curves without pandas.
+        """
+        if self.data_df is not None:
+            self.lc_index = LightCurveIndex.from_frame(self.data_df, group_by_key=self.group_by_key)
+            self.lc_index.cleaning = self.outlier_params
+            return self.lc_index
+
+        logging.error("Data is not available for indexing.")
+        return None
+
+    def remove_outliers(self, threshold_factor=3.0, use_errors=True):
+        """
+        Remove MAD outliers from all light curves at once (see `outliers_mad_frame`).
+
+        The cleaned table replaces `data_df`, the grouping and light curve index are rebuilt if
+        they existed, and `get_lc_dyn` stops cleaning each object again.
+
+        Parameters:
+        -----------
+        threshold_factor : float, optional
+            Multiplier of the MAD used as threshold (default is 3.0).
+        use_errors : bool, optional
+            Add the median magnitude error to the threshold (default is True, as the per-object
+            cleaning of the dynamical mode of the solvers, which runs with errors).
+        """
+        if self.data_df is None:
+            logging.error("Data is not available for outlier removal.")
+            return None
+
+        self.data_df = outliers_mad_frame(self.data_df, [self.group_by_key, 'filter'], threshold_factor, use_errors)
+        self.outlier_params = {'threshold_factor': threshold_factor, 'use_errors': use_errors}
+        self.clear_cache()
+        if self.fs_gp is not None:
+            self.group_data()
+        if self.lc_index is not None:
+            self.build_lc_index()
+        logging.info("Outliers removed from all light curves.")
+        return self.data_df
+
+    def get_qso(self, object_ids, min_points=100, bands=None):
+        """
+        Get objects whose light curves have at least `min_points` valid points in every band.
+
+        Parameters:
+        -----------
+        object_ids : list
+            Object IDs to check.
+        min_points : int, optional
+            Minimum number of points required per band (default is 100).
+        bands : iterable, optional
+            Bands that must be complete, after filter mapping. Default is all bands in the data.
+        """
+        return select_by_counts(self.point_counts(), object_ids, min_points, bands)
+
+    def point_counts(self):
+        """
+        Return valid point counts per object and filter, from the light curve index if available.
+        """
+        if self.lc_index is not None:
+            return self.lc_index.point_counts()
+        return count_points(self.data_df, self.group_by_key)
+
+    def export_lc_store(self, path: str):
+        """
+        Write the light curve index to an on-disk store that can be memory-mapped by other runs and workers.
+        """
+        if self.lc_index is None and self.build_lc_index() is None:
+            return None
+        self.lc_index.save(path)
+        return self.lc_index
+
+    def load_lc_store(self, path: str, mmap_mode='r'):
+        """
+        Attach to an on-disk light curve store written by `export_lc_store`.
+        """
+        try:
+            self.lc_index = LightCurveIndex.load(path, mmap_mode=mmap_mode)
+            self.outlier_params = None  # The store records its own cleaning
+            self.clear_cache()
+            return self.lc_index
+        except Exception as e:
+            logging.error(f"Error loading light curve store: {e}")
+            return None
 
-def get_lc_dyn(data_manager, set1, include_errors=False):
+
+def get_lc_dyn(data_manager, set1, include_errors=False, bands=None):
     """
     Process and return light curves with an option to include magnitude errors (psMagErr) for a given set ID.
     This function dynamically handles different numbers of filters based on the dataset.
+    `bands` are the cleaned bands of the object as returned by `get_clean_bands`, fetched if not given.
     """
     max_seed_value = 2**32 - 1
     seed_value = abs(hash(int(set1))) % max_seed_value
     np.random.seed(seed_value)
 
-    if set1 not in data_manager.fs_gp.groups:
-        print(f"Set ID {set1} not found.")
-        return None
-
-    demo_lc = data_manager.fs_gp.get_group(set1)
-    available_filters = sorted(demo_lc['filter'].unique())
+    if bands is None:
+        if not has_object(data_manager, set1):
+            print(f"Set ID {set1} not found.")
+            return None
+        bands = get_clean_bands(data_manager, set1, include_errors)
     tt_with_errors = {}
     ts_with_errors = {}
     sampling_rates = {}
 
-    for filter_value in available_filters:
-        d = demo_lc[demo_lc['filter'] == filter_value].sort_values(by=['mjd']).dropna()
-        if d.empty:
-            print(f"No data for filter {filter_value} in set {set1}.")
-            continue
-        tt, yy = d['mjd'].to_numpy(), d['psMag'].to_numpy()
-        err_mag = d['psMagErr'].to_numpy() if 'psMagErr' in d.columns and include_errors else None
-
-        if include_errors and err_mag is not None:
-            tt, yy, err_mag = outliers_mad(tt, yy, err_mag)
-        else:
-            tt, yy = outliers_mad(tt, yy)
-
+    for filter_value, (tt, yy, err_mag) in bands.items():
         ts_with_or_without_errors = yy
         if include_errors and err_mag is not None:
-            ts_with_or_without_errors += np.random.normal(0, err_mag, len(tt))
+            ts_with_or_without_errors = yy + np.random.normal(0, err_mag, len(tt))
 
         tt_with_errors[filter_value] = tt
         ts_with_errors[filter_value] = ts_with_or_without_errors
@@ -137,32 +264,45 @@ def get_lc_dyn(data_manager, set1, include_errors=False):
     return tt_with_errors, ts_with_errors, sampling_rates
 
 
-def process1_new_dyn(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None, provided_maxfq=None, include_errors=False, parallel=False):
+def process1_new_dyn(data_manager, set1, ntau=None, ngrid=None, provided_minfq=None, provided_maxfq=None, include_errors=False, parallel=False, screen=None, bands=None, band_workers=None):
     """
     Processes and analyzes light curve data from a single object to detect common periods across different bands.
     Supports datasets with different numbers of filters (e.g., 3 for Gaia, 5 for AGN DC).
+
+    If a `screen` callable (e.g. `LombScargleScreen`) is given, it is run on all bands first: objects without
+    candidate peaks skip the WWZ stage, the others are analyzed within the returned (minfq, maxfq) window.
+
+    `bands` are the cleaned bands of the object as returned by `get_clean_bands`, e.g. loaded ahead by a
+    `Prefetcher`; they are fetched from the data manager if not given. With `band_workers` > 1 the bands
+    are analyzed concurrently on a thread pool (see `band_periods`).
+
+    Returns result records (see `QhX.results.RESULT_DTYPE`), one per band pair and common period,
+    or None if the object is missing or has insufficient data.
     """
-    if set1 not in data_manager.fs_gp.groups:
+    if bands is None and not has_object(data_manager, set1):
         print(f"Set ID {set1} not found.")
         return None
 
-    light_curves_data = get_lc_dyn(data_manager, set1, include_errors)
+    light_curves_data = get_lc_dyn(data_manager, set1, include_errors, bands=bands)
     if light_curves_data is None:
         print(f"Insufficient data for set ID {set1}.")
         return None
 
     tt_with_errors, ts_with_errors, sampling_rates = light_curves_data
     available_filters = list(tt_with_errors.keys())
-    results = []
 
-    for filter_value in available_filters:
-        tt = tt_with_errors.get(filter_value)
-        yy = ts_with_errors.get(filter_value)
-        if tt is None or yy is None:
-            continue
-        wwz_matrix, corr, extent = hybrid2d(tt, yy, ntau=ntau, ngrid=ngrid, minfq=provided_minfq, maxfq=provided_maxfq, parallel=parallel)
-        peaks, hh, r_periods, up, low = periods(set1, corr, ngrid=ngrid, plot=False, minfq=provided_minfq, maxfq=provided_maxfq)
-        results.append((r_periods, up, low, peaks, hh))
+    if screen is not None:
+        window = screen([(tt_with_errors[f], ts_with_errors[f]) for f in available_filters], provided_minfq, provided_maxfq)
+        if window is None:
+            print(f"No candidate periods for set ID {set1}, skipping WWZ.")
+            return no_detection_results(set1, [sampling_rates[f] for f in available_filters],
+                                        [str(f) for f in available_filters])
+        provided_minfq, provided_maxfq = window
+
+    light_curves = [(tt_with_errors.get(f), ts_with_errors.get(f)) for f in available_filters]
+    light_curves = [(tt, yy) for tt, yy in light_curves if tt is not None and yy is not None]
+    results = band_periods(set1, light_curves, ntau=ntau, ngrid=ngrid, minfq=provided_minfq, maxfq=provided_maxfq,
+                           parallel=parallel, band_workers=band_workers)
 
     if not results:
         return None
@@ -214,4 +354,4 @@ def process1_new_dyn(data_manager, set1, ntau=None, ngrid=None, provided_minfq=N
                         "label": f"{light_curve_labels[i]}-{light_curve_labels[j]}"
                     })
 
-    return det_periods
+    return as_results(det_periods)
@@ -12,11 +12,95 @@ Astroinformatics student
 Faculty of Mathematics, University of Belgrade
 """
 
-from multiprocessing import Process
-from multiprocessing import Queue
+import os
+import copy
+import time
+import signal
+import threading
+from collections import deque, Counter
+from contextlib import contextmanager
+from QhX.journal import RunJournal, QUEUED, DONE, FAILED, JOURNAL_SUFFIX
+from QhX.job_queue import LeaseHeartbeat, new_owner, LEASED
+from QhX.resources import CpuBudget, pin_blas_threads, rss_bytes
+from QhX.prefetch import Prefetcher
+from QhX.worker_pool import WorkerPool
+from QhX.utils.stage_timing import record_stages, stage
 
 # Default number of processes to spawn
 DEFAULT_NUM_WORKERS = 4
+# Default number of set IDs sent to a pool worker at once
+DEFAULT_CHUNKSIZE = 1
+# Default number of times a set ID is resubmitted after its worker crashed
+DEFAULT_MAX_RETRIES = 2
+# Seconds between checks for dead and stuck workers while waiting for results
+RESULTS_POLL_SECONDS = 1.0
+# Supported execution backends
+BACKENDS = ('pool', 'processes', 'dask')
+# Seconds between claims while other instances hold the remaining jobs of a job queue
+QUEUE_POLL_SECONDS = 5.0
+
+
+class ObjectTimeout(Exception):
+    """Raised in a worker when processing a set ID takes longer than the per-object timeout."""
+
+
+def _raise_object_timeout(signum, frame):
+    raise ObjectTimeout()
+
+
+@contextmanager
+def object_timeout(seconds):
+    """
+    Raises ObjectTimeout in the block after `seconds` of wall-clock time, using SIGALRM.
+
+    The timeout is soft: the exception is raised the next time the interpreter runs Python
+    code, so a single long call into compiled code finishes first (the 'pool' and 'processes'
+    backends kill such a worker from the parent process). Does nothing if `seconds`
+    is None, outside the main thread, or on platforms without `signal.setitimer`.
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_object_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def import_distributed():
+    """Imports dask.distributed, which the 'dask' backend needs but QhX does not require."""
+    try:
+        import dask.distributed
+    except ImportError as e:
+        raise ImportError("The 'dask' backend requires dask.distributed, install it with "
+                          "`pip install 'dask[distributed]'` or use the 'pool' backend.") from e
+    return dask.distributed
+
+
+def _process_dask_chunk(solver, set_ids, data = None):
+    """
+    Processes a chunk of set IDs in a dask worker.
+
+    The solver is scattered to the workers once and shared by their tasks, so it is initialized
+    once per worker and copied before `data` (e.g. the partition holding the chunk) is attached.
+
+    Returns (set ID, result, seconds, error, stages) tuples.
+    """
+    if not getattr(solver, 'worker_ready_', False):
+        solver.setup_worker()
+    if data is not None:
+        solver = copy.copy(solver)
+        solver.attach_task_data(data)
+    results = []
+    for set_id, data in solver.iter_loaded(set_ids):
+        start = time.perf_counter()
+        res, error = solver.process_one(set_id, data)
+        results.append((set_id, res, time.perf_counter() - start, error, solver.stages_))
+    return results
+
 
 class IParallelSolver():
     """
@@ -24,97 +108,553 @@ class IParallelSolver():
 
     Attributes:
         num_workers (int): Number of worker processes to spawn.
+        backend (str): 'pool' runs set IDs on supervised worker processes fed in chunks (see
+            `QhX.worker_pool`) and streams each result to the results output as it completes;
+            'processes' hands the same workers one set ID at a time, as if they drained a
+            shared queue; 'dask' submits chunks to a dask.distributed cluster (see `process_ids_dask`).
+        chunksize (int): Number of set IDs sent to a pool worker at once.
+        max_in_flight (int): Maximum number of chunks sent to the pool workers and not yet
+            collected, defaults to twice the number of workers. Each worker still holds one
+            set ID more than it prefetches.
+        timeout (float): Wall-clock limit in seconds for processing one set ID, None for no limit.
+            Workers raise ObjectTimeout when it expires while they run Python code; the 'pool' and
+            'processes' backends also kill and replace a worker still running the set ID shortly
+            after (e.g. stuck in compiled code). The 'dask' backend does not apply it.
+        max_tasks_per_worker (int): Number of set IDs after which workers are replaced by fresh
+            processes, None to keep them for the whole run.
+        max_rss_mb (float): Resident memory ceiling of a worker in MiB. A worker above it is
+            replaced after its current set ID.
+        max_retries (int): Number of times set IDs are resubmitted after their worker crashed.
+        client: dask.distributed Client or scheduler address used by the 'dask' backend. By default
+            a LocalCluster with num_workers single-threaded worker processes is started for each run.
+        blas_threads (int): Size of the BLAS/OpenMP thread pools of each worker, None to leave them as is.
+        cpu_budget (CpuBudget): Core budget of the run, see `QhX.resources`. When given (or given as a
+            number of cores, split over num_workers processes), it sets num_workers and blas_threads.
+        prefetch (int): Number of set IDs whose data each worker loads ahead in a background thread
+            (see `load_set`), 0 to load each set ID when it is processed.
+        prefetch_mb (float): Memory in MiB the data loaded ahead may hold, None for no limit.
+        record_stages (bool): Record the duration of the stages of each set ID and its memory use
+            (see `QhX.utils.stage_timing`), handed to `maybe_record_stages` in the parent process.
+        failures_ (list): (set ID, error) pairs of the set IDs that failed in the last run.
     """
     def __init__(self,
                  num_workers = DEFAULT_NUM_WORKERS,
+                 backend = 'pool',
+                 chunksize = DEFAULT_CHUNKSIZE,
+                 max_in_flight = None,
+                 timeout = None,
+                 max_tasks_per_worker = None,
+                 max_rss_mb = None,
+                 max_retries = DEFAULT_MAX_RETRIES,
+                 client = None,
+                 blas_threads = None,
+                 cpu_budget = None,
+                 prefetch = 0,
+                 prefetch_mb = None,
+                 record_stages = False
                 ):
         """Initialize the ParallelSolver with the specified configuration."""
 
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
         self.num_workers = num_workers
+        self.backend = backend
+        self.chunksize = chunksize
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_rss_mb = max_rss_mb
+        self.max_retries = max_retries
+        self.client = client
+        self.blas_threads = blas_threads
+        if cpu_budget is not None and not isinstance(cpu_budget, CpuBudget):
+            cpu_budget = CpuBudget(total_cores=cpu_budget, processes=num_workers)
+        self.cpu_budget = cpu_budget
+        if cpu_budget is not None:
+            # The budget decides the processes x threads split
+            self.num_workers = cpu_budget.processes
+            self.blas_threads = cpu_budget.threads_per_process
+        self.prefetch = prefetch
+        self.prefetch_mb = prefetch_mb
+        self.record_stages = record_stages
+        self.stages_ = None
+        self.parent_pid_ = os.getpid()
+        self.failures_ = []
+        self.track_saved_ = False
+        self.saved_ = []
 
-    def process_wrapper(self):
-        """
-        Wrapper for the process function to integrate logging and result handling.
+    def __getstate__(self):
+        """The dask client and the worker setup stay in their process"""
+        state = self.__dict__.copy()
+        state['client'] = None
+        state.pop('blas_limits_', None)
+        state.pop('worker_ready_', None)
+        return state
+
+    def process_one(self, set_id, data = None):
         """
+        Processes a single set ID with logging and the per-object timeout.
+        `data` is the data of the set ID loaded ahead by `load_set`, if any. With record_stages,
+        the stage timings of the set ID are left in `stages_`.
 
+        Returns:
+            tuple: The aggregated result (None on error), and None or a description of the error.
+        """
+        if not self.record_stages:
+            self.stages_ = None
+            return self._process_one(set_id, data)
+        with record_stages() as recorder:
+            res, error = self._process_one(set_id, data)
+        self.stages_ = recorder.as_dict()
+        return res, error
 
-        # Event used for stopping background log thread
-        stopper_event = None
+    def _process_one(self, set_id, data):
+        # If a throw happens before setting result
+        res = None
+        error = None
 
-        # Go through unprocessed sets
-        while not self.set_ids_.empty():
-            # Safely pop from queue
-            try:
-                set_id = self.set_ids_.get()
-            except Exception as e:
-                break
+        try:
+            # Maybe start logging
+            self.maybe_begin_logging(set_id)
 
-            # If a throw happens before setting result
-            res_string = ""
+            with object_timeout(self.timeout):
+                # Call main processing function, with the data loaded ahead if there is any
+                if data is None:
+                    result = self.get_process_function_result(set_id)
+                else:
+                    result = self.get_process_function_result(set_id, data)
 
+                # Get results into rows for the result writer
+                res = self.aggregate_process_function_result(result)
+        except ObjectTimeout:
+            error = f'Timeout after {self.timeout} s'
+            print(f'Error processing set ID {set_id} : {error}\n')
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            print('Error processing/saving data : ' + str(e) + '\n')
+        finally:
             try:
-                # Maybe start logging
-                self.maybe_begin_logging(set_id)
+                # Maybe stop logging
+                self.maybe_stop_logging()
 
-                # Call main processing function
-                result = self.get_process_function_result(set_id)
+                # Maybe save local results
+                with stage('write'):
+                    self.maybe_save_local_results(set_id, res)
+            except Exception as e:
+                print('Error stopping logs : ' + str(e))
+        return res, error
 
-                # Get results into formatted string
-                res_string = self.aggregate_process_function_result(result)
+    def setup_worker(self):
+        """
+        Runs once in every worker process before it processes set IDs: pins the BLAS thread
+        pools (not in the parent process, whose workers may be threads), then calls the
+        `initialize_worker` hook, where solvers open their data and warm per-configuration
+        caches so that processing a set ID is only the computation itself.
+        """
+        if self.blas_threads is not None and os.getpid() != self.parent_pid_:
+            self.blas_limits_ = pin_blas_threads(self.blas_threads)
+        self.initialize_worker()
+        self.worker_ready_ = True
 
-                # Put results in unified results queue if flag is set
-                if self.save_all_results_:
-                    self.results_.put(res_string)
-            except Exception as e:
-                print('Error processing/saving data : ' + str(e) + '\n')
-            finally:
-                try:
-                    # Maybe stop logging
-                    self.maybe_stop_logging()
+    def prefetcher(self, set_ids):
+        """Returns a Prefetcher loading the data of set IDs ahead of their processing"""
+        max_bytes = int(self.prefetch_mb * 1024 * 1024) if self.prefetch_mb is not None else None
+        return Prefetcher(self.load_set, set_ids, depth=self.prefetch, max_bytes=max_bytes)
 
-                    # Maybe save local results
-                    self.maybe_save_local_results(set_id, res_string)
-                except Exception as e:
-                    print('Error stopping logs : ' + str(e))
+    def iter_loaded(self, set_ids):
+        """
+        Yields (set ID, data) pairs, the data loaded ahead in a background thread if prefetch
+        is set, otherwise None (the process function loads it).
+        """
+        if not self.prefetch:
+            for set_id in set_ids:
+                yield set_id, None
+            return
+        with self.prefetcher(set_ids) as prefetcher:
+            yield from prefetcher
 
-    def process_ids(self, set_ids, results_file = None):
+    def over_memory_limit(self):
+        """Checks whether the current process uses more resident memory than max_rss_mb."""
+        if self.max_rss_mb is None:
+            return False
+        rss = rss_bytes()
+        return rss is not None and rss > self.max_rss_mb * 1024 * 1024
+
+    def process_ids(self, set_ids, results_file = None, resume = False, journal_file = None):
         """
         Processes a list of set IDs using the configured process function in parallel.
 
+        Completed set IDs are appended to a run journal as their results are saved. With
+        `resume=True`, set IDs the journal records as done are skipped, set IDs that were
+        in flight when a previous run stopped or failed are processed again, and the results
+        file is appended to instead of overwritten. Failed set IDs are listed in `failures_`.
+
         Parameters:
             set_ids (list of str): List of set IDs to process.
             results_file (str, optional): Path to save aggregated results.
+            resume (bool, optional): Resume an interrupted run from its journal.
+            journal_file (str, optional): Path of the run journal, defaults to the results
+                file path with a '.journal' suffix (no journal if neither is set).
+        """
+
+        # Set flag to save all results
+        self.save_all_results_ = results_file is not None
+        self.failures_ = []
+
+        # Open the run journal, starting a fresh one unless resuming
+        self.open_journal(results_file, resume, journal_file)
+        if resume and self.journal_ is not None:
+            set_ids = self.journal_.pending(list(set_ids))
+
+        # Publish shared state before the workers start
+        self.prepare_workers()
+
+        try:
+            if self.backend == 'pool':
+                self.process_ids_pool(self.order_set_ids(set_ids), results_file)
+            elif self.backend == 'dask':
+                self.process_ids_dask(self.order_set_ids(set_ids), results_file)
+            else:
+                self.process_ids_processes(self.order_set_ids(set_ids), results_file)
+        finally:
+            self.release_workers()
+            if self.journal_ is not None:
+                self.journal_.close()
+        if self.failures_:
+            print(f'{len(self.failures_)} set IDs failed.')
+
+    def open_journal(self, results_file = None, resume = False, journal_file = None):
+        """
+        Opens the run journal of a run, see `process_ids`. Unless resuming, an existing journal
+        is removed to start a fresh one.
         """
+        if journal_file is None and results_file is not None:
+            journal_file = results_file + JOURNAL_SUFFIX
+        self.journal_ = RunJournal(journal_file) if journal_file is not None else None
+        if resume and self.journal_ is None:
+            print('No journal to resume from, processing all set IDs.')
+        elif not resume and self.journal_ is not None and os.path.exists(journal_file):
+            os.remove(journal_file)
+        self.resume_ = resume
+
+    def process_queue(self, job_queue, results_file = None, lease_size = None, resume = False, owner = None):
+        """
+        Pulls set IDs from a shared job queue and processes them until the queue is exhausted.
+
+        Set IDs are claimed in small leases, kept alive by a heartbeat thread while they run,
+        and marked failed as they fail and done once their results are on disk. Other solver
+        instances, on this machine or on other nodes, can pull from the same queue; each should
+        write its own results file. When no job is available but other instances still hold
+        leases, the queue is polled, so the jobs of an instance that died are claimed once their
+        leases expire.
 
+        With the 'pool' and 'processes' backends, one worker pool and one results output serve
+        all leases, and the next lease is claimed as soon as every set ID of the current one was
+        handed to a worker, so the workers never wait for a claim. The 'dask' backend runs each
+        lease as a separate `process_ids` run.
 
-        # Unified output queue and input queue
-        self.results_ = Queue()
-        self.set_ids_ = Queue()
+        Parameters:
+            job_queue (JobQueue): The job queue, see `QhX.job_queue`.
+            results_file (str, optional): Path to save aggregated results, appended to by every lease.
+            lease_size (int, optional): Set IDs claimed at once, defaults to 2 * num_workers * chunksize.
+            resume (bool, optional): Resume from the journal of the results file, see `process_ids`.
+            owner (str, optional): Name of this instance in the queue, unique by default.
+        """
+        owner = owner or new_owner()
+        lease_size = lease_size or 2 * self.num_workers * self.chunksize
+        if self.backend != 'dask':
+            self.stream_queue(job_queue, results_file, lease_size, resume, owner)
+            print(f'Job queue exhausted: {job_queue.counts()}')
+            return
+        failures = []
+        append = resume
+        try:
+            while True:
+                set_ids = job_queue.claim(owner, lease_size)
+                if not set_ids:
+                    if job_queue.counts()[LEASED] == 0:
+                        break
+                    time.sleep(min(QUEUE_POLL_SECONDS, job_queue.lease_seconds))
+                    continue
+                with LeaseHeartbeat(job_queue, owner):
+                    self.process_ids(set_ids, results_file, resume=append and results_file is not None)
+                # Set IDs skipped as done by the journal were completed by an earlier lease
+                failed = dict(self.failures_)
+                job_queue.fail(owner, list(failed.items()))
+                job_queue.done(owner, [set_id for set_id in set_ids if set_id not in failed])
+                failures.extend(self.failures_)
+                append = True
+        except BaseException:
+            # Unfinished jobs go back to the queue for the other instances
+            job_queue.release(owner)
+            raise
+        self.failures_ = failures
+        print(f'Job queue exhausted: {job_queue.counts()}')
+
+    def stream_queue(self, job_queue, results_file, lease_size, resume, owner):
+        """
+        Runs the leases of a job queue on one worker pool and results output, see `process_queue`.
+        """
+        self.save_all_results_ = results_file is not None
+        self.failures_ = []
+        self.saved_ = []
+        self.track_saved_ = True
+        self.open_journal(results_file, resume)
+        # Set IDs whose results are already saved are not run again if claimed
+        saved = self.journal_.completed() if resume and self.journal_ is not None else set()
+        n_failed = 0
+        try:
+            with LeaseHeartbeat(job_queue, owner):
+                self.prepare_workers()
+                self.maybe_open_results(results_file, append=resume)
+                try:
+                    with self.worker_pool() as pool:
+                        while True:
+                            if not pool.backlog:
+                                # Claim the next lease while the workers run the current one
+                                set_ids = job_queue.claim(owner, lease_size)
+                                skipped = [set_id for set_id in set_ids if str(set_id) in saved]
+                                if skipped:
+                                    job_queue.done(owner, skipped)
+                                set_ids = [set_id for set_id in set_ids if str(set_id) not in saved]
+                                if set_ids:
+                                    pool.submit(self.order_set_ids(set_ids))
+                                    self.journal_queued(set_ids)
+                                elif not skipped and not pool.n_unfinished:
+                                    # Our jobs are finished once their results are on disk
+                                    self.maybe_flush_results()
+                                    job_queue.done(owner, self.pop_saved())
+                                    if job_queue.counts()[LEASED] == 0:
+                                        break
+                                    time.sleep(min(QUEUE_POLL_SECONDS, job_queue.lease_seconds))
+                                    continue
+                            for set_id, res, seconds, error, stages in pool.poll(RESULTS_POLL_SECONDS):
+                                self.collect_result(set_id, res, seconds, error, stages)
+                            if len(self.failures_) > n_failed:
+                                job_queue.fail(owner, self.failures_[n_failed:])
+                                n_failed = len(self.failures_)
+                            saved_now = self.pop_saved()
+                            if saved_now:
+                                saved.update(str(set_id) for set_id in saved_now)
+                                job_queue.done(owner, saved_now)
+                finally:
+                    self.maybe_close_results()
+                    self.release_workers()
+                    if self.journal_ is not None:
+                        self.journal_.close()
+                    job_queue.done(owner, self.pop_saved())
+        except BaseException:
+            # Unfinished jobs go back to the queue for the other instances
+            job_queue.release(owner)
+            raise
+        finally:
+            self.track_saved_ = False
+        if self.failures_:
+            print(f'{len(self.failures_)} set IDs failed.')
 
-        # Set flag to save all results from unified queue
-        if results_file is not None:
-            self.save_all_results_ = True
+    def collect_result(self, set_id, res, seconds = None, error = None, stages = None):
+        """
+        Handles the result of a set ID in the parent process: hands it to the results output,
+        then journals the set ID as done (see `journal_done`). Failed set IDs are journaled as
+        failed, so a resumed run retries them. Stage timings, if recorded, are handed to
+        `maybe_record_stages` whether the set ID failed or not, the hand-off of the results
+        counted in the 'write' stage and in the seconds of the set ID.
+        """
+        write_seconds = 0.0
+        if error is None:
+            start = time.perf_counter()
+            self.maybe_write_result(set_id, res)
+            write_seconds = time.perf_counter() - start
+        if stages is not None:
+            stages = dict(stages, write=stages.get('write', 0.0) + write_seconds)
+            self.maybe_record_stages(set_id, seconds + write_seconds if seconds is not None else None, stages)
+        if error is not None:
+            self.failures_.append((set_id, error))
+            if self.journal_ is not None:
+                self.journal_.record(set_id, FAILED)
+            self.maybe_record_failure(set_id, error)
+            return
+        self.journal_done(set_id)
+        if seconds is not None:
+            self.maybe_record_timing(set_id, seconds)
+
+    def journal_done(self, set_id):
+        """
+        Records a set ID as done in the run journal. Solvers whose results output writes
+        asynchronously override this and journal set IDs once their results are on disk
+        (and report them in `pop_saved`).
+        """
+        if self.journal_ is not None:
+            self.journal_.record(set_id, DONE)
+        if self.track_saved_:
+            self.saved_.append(set_id)
+
+    def pop_saved(self):
+        """Returns the set IDs whose results were saved since the last call, while a job queue is processed."""
+        saved, self.saved_ = self.saved_, []
+        return saved
+
+    def journal_queued(self, set_ids):
+        """Records set IDs handed to the workers in the run journal."""
+        if self.journal_ is not None:
+            for set_id in set_ids:
+                self.journal_.record(set_id, QUEUED)
+
+    def process_ids_pool(self, set_ids, results_file = None):
+        """
+        Runs set IDs on a pool of supervised worker processes (see `QhX.worker_pool`), fed in
+        chunks with a bounded number in flight, writing every result to the results file as
+        soon as its set ID completes.
+
+        A worker is replaced alone after max_tasks_per_worker set IDs, above the memory ceiling,
+        or when it crashed. The set ID a crashed worker was running is resubmitted up to
+        max_retries times and then recorded as failed. A worker still running a set ID shortly
+        after the timeout is killed and replaced, and the set ID is recorded as failed.
+        """
+        self.maybe_open_results(results_file, append=self.resume_)
+        try:
+            with self.worker_pool() as pool:
+                self.run_pool(pool, set_ids)
+        finally:
+            self.maybe_close_results()
+
+    def worker_pool(self, chunksize = None, max_in_flight = None):
+        """Returns a WorkerPool of num_workers processes running the set IDs of this solver"""
+        return WorkerPool(self, self.num_workers, chunksize=chunksize or self.chunksize,
+                          max_in_flight=max_in_flight or self.max_in_flight,
+                          max_retries=self.max_retries, timeout=self.timeout)
+
+    def run_pool(self, pool, set_ids):
+        """Submits set IDs to a worker pool and collects their results as they complete"""
+        set_ids = list(set_ids)
+        pool.submit(set_ids)
+        self.journal_queued(set_ids)
+        while pool.n_unfinished:
+            for set_id, res, seconds, error, stages in pool.poll(RESULTS_POLL_SECONDS):
+                self.collect_result(set_id, res, seconds, error, stages)
+
+    def process_ids_processes(self, set_ids, results_file = None):
+        """
+        Runs set IDs on worker processes that are handed one set ID at a time as they finish
+        the previous one (one more per set ID they prefetch), as if they drained a shared queue.
+        The workers are supervised like the ones of the 'pool' backend (see `process_ids_pool`),
+        with a pipe per worker instead of a shared queue, which a killed worker could leave locked.
+        """
+        self.maybe_open_results(results_file, append=self.resume_)
+        try:
+            with self.worker_pool(chunksize=1, max_in_flight=self.num_workers) as pool:
+                self.run_pool(pool, set_ids)
+        finally:
+            self.maybe_close_results()
+
+    def process_ids_dask(self, set_ids, results_file = None):
+        """
+        Runs chunks of set IDs as tasks on a dask.distributed cluster, saving the results of
+        every task as it completes, with at most max_in_flight tasks submitted at once.
+
+        The solver is scattered to all workers once. `dask_task_inputs` may attach data to each
+        chunk, e.g. the lazy partition of a partitioned data manager. Lazy data is computed on
+        the cluster when the first task using it is submitted and released after the last one
+        completes, so only the data of the tasks in flight is held, and the scheduler runs each
+        task on the worker that holds its data. Tasks whose worker died are retried
+        by dask up to max_retries times. The per-object timeout is not applied, dask runs tasks
+        in worker threads where SIGALRM is unavailable.
+        """
+        distributed = import_distributed()
+        from dask import is_dask_collection
+        own_client = not isinstance(self.client, distributed.Client)
+        if self.client is None:
+            client = distributed.Client(distributed.LocalCluster(n_workers=self.num_workers,
+                                                                 threads_per_worker=1))
+        elif own_client:
+            client = distributed.Client(self.client)
         else:
-            self.save_all_results_ = False
+            client = self.client
+
+        self.maybe_open_results(results_file, append=self.resume_)
+        try:
+            solver = client.scatter(self, broadcast=True)
+            tasks = deque(self.dask_task_inputs(client, list(set_ids)))
+            max_in_flight = self.max_in_flight or 2 * sum(client.nthreads().values())
+            pending = {}
+            completed = distributed.as_completed()
+            # Futures of the lazy task data, and the number of tasks still to use each
+            data_futures = {}
+            data_uses = Counter(data.key for _, data in tasks if is_dask_collection(data))
+
+            def submit():
+                chunk, data = tasks.popleft()
+                data_key = None
+                if is_dask_collection(data):
+                    data_key = data.key
+                    if data_key not in data_futures:
+                        data_futures[data_key] = client.compute(data)
+                    data = data_futures[data_key]
+                future = client.submit(_process_dask_chunk, solver, chunk, data,
+                                       pure=False, retries=self.max_retries)
+                pending[future.key] = (chunk, data_key)
+                completed.add(future)
+                self.journal_queued(chunk)
+
+            while tasks and len(pending) < max_in_flight:
+                submit()
+            for future in completed:
+                chunk, data_key = pending.pop(future.key)
+                try:
+                    for set_id, res, seconds, error, stages in future.result():
+                        self.collect_result(set_id, res, seconds, error, stages)
+                except Exception as e:
+                    print('Error in dask task : ' + str(e))
+                    for set_id in chunk:
+                        self.collect_result(set_id, None, error=f'{type(e).__name__}: {e}')
+                future.release()
+                if data_key is not None:
+                    data_uses[data_key] -= 1
+                    if not data_uses[data_key]:
+                        data_futures.pop(data_key).release()
+                if tasks:
+                    submit()
+        finally:
+            self.maybe_close_results()
+            if own_client:
+                cluster = client.cluster if self.client is None else None
+                client.close()
+                if cluster is not None:
+                    cluster.close()
+
+    def dask_task_inputs(self, client, set_ids):
+        """
+        Splits set IDs into the tasks of the 'dask' backend.
+
+        Returns:
+            list: (chunk of set IDs, data) pairs, data is passed to `attach_task_data` in the worker.
+                Data may be lazy (e.g. a dask Delayed), it is then computed on the cluster while its tasks run.
+        """
+        return [(set_ids[i:i + self.chunksize], None) for i in range(0, len(set_ids), self.chunksize)]
+
+    def attach_task_data(self, data):
+        pass
+
+    def order_set_ids(self, set_ids):
+        return set_ids
 
-        # Fill input queue
-        for id in set_ids:
-            self.set_ids_.put(id)
+    def prepare_workers(self):
+        pass
 
-        # Generate and start processes
-        processes = [Process(target = self.process_wrapper) for i in range(self.num_workers)]
-        for p in processes:
-          p.start()
-        for p in processes:
-          p.join()
+    def initialize_worker(self):
+        pass
 
-        # Save results to unified results file
-        self.maybe_save_results(results_file)
+    def release_workers(self):
+        pass
 
     def aggregate_process_function_result(self, result):
         pass
 
-    def get_process_function_result(self, set_id):
+    def load_set(self, set_id):
+        """Loads the data of a set ID ahead of its processing, None if the solver does not support it"""
+        return None
+
+    def get_process_function_result(self, set_id, data = None):
         pass
 
     def maybe_begin_logging(self, set_id):
@@ -123,8 +663,26 @@ class IParallelSolver():
     def maybe_stop_logging(self):
         pass
 
-    def maybe_save_local_results(self, set_id, res_string):
+    def maybe_save_local_results(self, set_id, res):
+        pass
+
+    def maybe_open_results(self, results_file, append = False):
+        pass
+
+    def maybe_write_result(self, set_id, res):
+        pass
+
+    def maybe_flush_results(self):
+        pass
+
+    def maybe_close_results(self):
+        pass
+
+    def maybe_record_timing(self, set_id, seconds):
+        pass
+
+    def maybe_record_stages(self, set_id, seconds, stages):
         pass
 
-    def maybe_save_results(self, results_file):
+    def maybe_record_failure(self, set_id, error):
         pass
@@ -0,0 +1,276 @@
+"""
+job_queue.py
+
+This module provides a work queue of object IDs backed by a SQLite job table.
+
+Any number of solver instances, in one machine or on several nodes sharing the database file,
+pull small batches of jobs from the same table, so fast instances take more work and no instance
+is left idle while another works through an expensive shard. There is no service to run: every
+state change is one SQLite transaction. A claim gives the instance a lease on its jobs, which it
+extends with heartbeats while they run. If an instance dies, its leases expire and the jobs are
+claimed again by the others, up to `max_attempts` times.
+
+Job states are `pending`, `leased`, `done` and `failed`.
+
+Classes:
+--------
+- JobQueue: SQLite job table with transactional leases.
+- LeaseHeartbeat: Thread extending the leases of an owner while its jobs run.
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+
+# Job states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+# Seconds a claimed job stays leased without a heartbeat
+DEFAULT_LEASE_SECONDS = 300.0
+# Claims of a job before it is recorded as failed
+DEFAULT_MAX_ATTEMPTS = 3
+# Seconds to wait for a lock held by another instance
+DEFAULT_BUSY_TIMEOUT = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    set_id PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+def new_owner():
+    """Returns a unique name for a queue client: host, process ID and a random suffix."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def _plain(set_id):
+    """Converts NumPy scalars to Python values, SQLite keeps the type of the set IDs."""
+    return set_id.item() if hasattr(set_id, 'item') else set_id
+
+
+class JobQueue:
+    """
+    Work queue of set IDs in a SQLite database.
+
+    Set IDs keep their type (integers stay integers), the job table has no type affinity for them.
+    Connections are opened per process, so a queue can be pickled to worker processes.
+
+    Attributes:
+        path (str): Path of the SQLite database, created if needed.
+        lease_seconds (float): Lease duration of claimed jobs.
+        max_attempts (int): Claims of a job before it fails.
+        wal (bool): Use write-ahead logging. Faster for instances on one machine, but it must not
+            be used for databases on network file systems, where the rollback journal is used.
+        busy_timeout (float): Seconds to wait for locks held by other instances.
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 wal=False, busy_timeout=DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wal = wal
+        self.busy_timeout = busy_timeout
+        self._connection = None
+        self._pid = None
+        self._connect().executescript(_SCHEMA)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def _connect(self):
+        """Returns the connection of the current process."""
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            if self.wal:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._pid = os.getpid()
+        return self._connection
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    def close(self):
+        """Closes the connection of the current process."""
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def add(self, set_ids):
+        """
+        Adds set IDs as pending jobs. Set IDs already in the table keep their state, so every
+        instance can add the full list and the first one creates the jobs.
+
+        Returns:
+            int: Number of jobs added.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO jobs (set_id, updated) VALUES (?, ?)',
+                           ((_plain(set_id), now) for set_id in set_ids))
+            return db.total_changes - before
+
+    def claim(self, owner, n=1):
+        """
+        Leases up to `n` jobs to an owner: pending jobs first, then jobs whose lease expired.
+        Expired jobs that reached `max_attempts` are recorded as failed instead.
+
+        Returns:
+            list: The claimed set IDs, empty when no job is available.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET state = ?, error = 'Lease expired', owner = NULL, updated = ? "
+                       "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                       (FAILED, now, LEASED, now, self.max_attempts))
+            rows = db.execute("SELECT rowid, set_id FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                              "ORDER BY rowid LIMIT ?", (PENDING, LEASED, now, n)).fetchall()
+            db.executemany("UPDATE jobs SET state = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                           "updated = ? WHERE rowid = ?",
+                           ((LEASED, owner, now + self.lease_seconds, now, rowid) for rowid, _ in rows))
+        set_ids = [set_id for _, set_id in rows]
+        if set_ids:
+            logging.debug(f'{owner} claimed {len(set_ids)} jobs.')
+        return set_ids
+
+    def heartbeat(self, owner):
+        """
+        Extends the leases of all jobs held by an owner.
+
+        Returns:
+            int: Number of leases extended.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute('UPDATE jobs SET lease_expires = ?, updated = ? WHERE state = ? AND owner = ?',
+                              (now + self.lease_seconds, now, LEASED, owner)).rowcount
+
+    def done(self, owner, set_ids):
+        """
+        Marks jobs leased by an owner as done. Jobs whose lease was lost to another owner are
+        left to it.
+
+        Returns:
+            int: Number of jobs marked done.
+        """
+        return self._finish(owner, [(set_id, None) for set_id in set_ids], DONE)
+
+    def fail(self, owner, failures):
+        """
+        Marks jobs leased by an owner as failed.
+
+        Parameters:
+            owner (str): Owner of the leases.
+            failures (list): (set ID, error) pairs.
+
+        Returns:
+            int: Number of jobs marked failed.
+        """
+        return self._finish(owner, failures, FAILED)
+
+    def _finish(self, owner, results, state):
+        now = time.time()
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany('UPDATE jobs SET state = ?, error = ?, owner = NULL, lease_expires = NULL, updated = ? '
+                           'WHERE set_id = ? AND state = ? AND owner = ?',
+                           ((state, error, now, _plain(set_id), LEASED, owner) for set_id, error in results))
+            return db.total_changes - before
+
+    def release(self, owner):
+        """Returns the jobs leased by an owner to the pending state, without counting the attempt."""
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute('UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL, '
+                              'attempts = MAX(attempts - 1, 0), updated = ? WHERE state = ? AND owner = ?',
+                              (PENDING, now, LEASED, owner)).rowcount
+
+    def retry_failed(self):
+        """Returns failed jobs to the pending state with their attempts reset."""
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute('UPDATE jobs SET state = ?, attempts = 0, error = NULL, updated = ? WHERE state = ?',
+                              (PENDING, now, FAILED)).rowcount
+
+    def counts(self):
+        """Returns the number of jobs in each state."""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(self._connect().execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        return counts
+
+    def unfinished(self):
+        """Returns the number of jobs pending or leased."""
+        counts = self.counts()
+        return counts[PENDING] + counts[LEASED]
+
+    def failures(self):
+        """Returns (set ID, error) pairs of the failed jobs."""
+        return self._connect().execute('SELECT set_id, error FROM jobs WHERE state = ? ORDER BY rowid',
+                                       (FAILED,)).fetchall()
+
+
+class _Transaction:
+    """Runs a block in an immediate transaction, which takes the write lock at its start."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, *exc):
+        self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+
+
+class LeaseHeartbeat:
+    """
+    Thread extending the leases of an owner every third of the lease duration, used as a
+    context manager around the processing of claimed jobs.
+    """
+
+    def __init__(self, queue, owner, interval=None):
+        self.queue = queue
+        self.owner = owner
+        self.interval = interval or queue.lease_seconds / 3
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        # The thread uses its own connection, SQLite connections are not shared between threads
+        queue = JobQueue(self.queue.path, self.queue.lease_seconds, self.queue.max_attempts,
+                         self.queue.wal, self.queue.busy_timeout)
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    queue.heartbeat(self.owner)
+                except sqlite3.Error as e:
+                    logging.warning(f'Heartbeat of {self.owner} failed: {e}')
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='LeaseHeartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,108 @@
+"""
+journal.py
+
+This module provides an append-only journal of solver runs, used to resume interrupted runs.
+
+Every event is a single line `<event>\\t<set ID>\\n` appended with one `os.write` on a file
+opened in append mode, so a line is either fully present or (if the process dies while
+writing it) an incomplete last line that is ignored when the journal is read. The solver
+records `queued` when an object is handed to the workers and `done` once its results are
+written, so after a crash the objects without a `done` record (including those that were in
+flight) are processed again.
+
+Classes:
+--------
+- RunJournal: Append-only record of queued and completed set IDs.
+"""
+
+import os
+import logging
+
+# Events written to the journal
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+# Suffix of the journal file kept next to a results file
+JOURNAL_SUFFIX = '.journal'
+
+
+class RunJournal:
+    """
+    Append-only journal of the set IDs queued and completed by a solver run.
+
+    Set IDs are compared by their string form, so IDs read back from the journal match both
+    integer and string IDs.
+
+    Attributes:
+        path (str): Path of the journal file.
+        fsync (bool): If True, every record is flushed to disk before returning.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._fd = None
+
+    def open(self):
+        """Opens the journal for appending, creating it if needed."""
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self
+
+    def close(self):
+        """Closes the journal."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, set_id, event=DONE):
+        """Appends one event for a set ID."""
+        if self._fd is None:
+            self.open()
+        os.write(self._fd, f'{event}\t{set_id}\n'.encode('utf-8'))
+        if self.fsync:
+            os.fsync(self._fd)
+
+    def events(self):
+        """
+        Returns a dict mapping each event to the set of string IDs recorded with it.
+        An incomplete last line, left by a process killed while writing, is ignored.
+        """
+        events = {QUEUED: set(), DONE: set(), FAILED: set()}
+        if not os.path.exists(self.path):
+            return events
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                event, _, set_id = line.rstrip('\n').partition('\t')
+                events.setdefault(event, set()).add(set_id)
+        return events
+
+    def failed(self):
+        """Returns the set of string IDs recorded as failed and not done by a later attempt."""
+        events = self.events()
+        return events[FAILED] - events[DONE]
+
+    def completed(self):
+        """Returns the set of string IDs recorded as done."""
+        return self.events()[DONE]
+
+    def pending(self, set_ids):
+        """
+        Returns the set IDs not recorded as done, in their input order, and logs how many of
+        them were in flight when the previous run stopped.
+        """
+        events = self.events()
+        done = events[DONE]
+        pending = [set_id for set_id in set_ids if str(set_id) not in done]
+        in_flight = sum(str(set_id) in events[QUEUED] for set_id in pending)
+        logging.info(f"Resuming from {self.path}: {len(set_ids) - len(pending)} set IDs done, "
+                     f"{in_flight} in flight re-queued, {len(pending)} left.")
+        return pending
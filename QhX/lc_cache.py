@@ -0,0 +1,121 @@
+"""
+lc_cache.py
+
+This module provides a size-bounded LRU cache of cleaned light curves.
+
+Extracting a light curve from the pandas groupby and removing its outliers is repeated for the
+same object by selection, detection, retries and interactive re-analysis. Data managers with
+an enabled cache keep the cleaned, pre-noise NumPy arrays of recently used objects, keyed by
+(object ID, include_errors, cleaning parameters), and evict the least recently used ones once
+the total size of the cached arrays exceeds a byte budget.
+
+Classes:
+--------
+- LightCurveCache: Byte-bounded LRU cache with hit, miss and eviction counters.
+"""
+
+import logging
+from collections import OrderedDict
+import numpy as np
+
+# Default byte budget of a light curve cache
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _value_nbytes(value):
+    """Total size of the NumPy arrays in a cached {filter: (tt, yy, err)} dict."""
+    return sum(a.nbytes for band in value.values() for a in band if isinstance(a, np.ndarray))
+
+
+class LightCurveCache:
+    """
+    Least recently used cache of cleaned light curves with a byte-size bound.
+
+    Values are dicts mapping filters to (tt, yy, err) arrays. Cached arrays are made
+    read-only, since every caller receives the same objects.
+
+    Attributes
+    ----------
+    max_bytes : int
+        Maximum total size of the cached arrays in bytes.
+    nbytes : int
+        Current total size of the cached arrays in bytes.
+    hits, misses, evictions : int
+        Number of lookups served from the cache, lookups not found and entries evicted.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        Return the cached value of `key` and mark it as recently used, or None if it is not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache `value` under `key`, evicting least recently used entries to stay within `max_bytes`.
+        Values larger than the whole budget are not cached.
+        """
+        nbytes = _value_nbytes(value)
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return value
+
+        for band in value.values():
+            for a in band:
+                if isinstance(a, np.ndarray) and a.flags.writeable:
+                    a.flags.writeable = False
+
+        while self._entries and self.nbytes + nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+            self.evictions += 1
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        return value
+
+    def clear(self):
+        """
+        Drop all entries, e.g. after the underlying data changed. The counters are kept.
+        """
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        Return a dict with the counters, number of entries and cached bytes.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def log_stats(self):
+        """Log the cache statistics."""
+        logging.info(f"Light curve cache: {self.stats()}")
@@ -0,0 +1,333 @@
+"""
+lc_index.py
+
+This module provides a compact, columnar index of light curves that is built once from a forced
+source table and then serves per-object, per-filter data as zero-copy NumPy slices.
+
+The table is sorted once by (object, filter, mjd) and stored as contiguous `mjd`, `mag` and `err`
+columns. An offsets table of shape (n_objects, n_filters + 1) records where the rows of every
+(object, filter) pair start, so that extracting a light curve is a lookup and a slice instead of a
+pandas groupby, boolean mask, sort and dropna.
+
+The index can be saved as a directory of `.npy` files and re-opened with `mmap`, so that many runs
+and worker processes attach to the same light curves instantly and share pages through the OS cache.
+It can also be published in `multiprocessing.shared_memory`, so that all worker processes of a node
+read a single copy of the arrays through a small picklable handle.
+
+Classes:
+--------
+- LightCurveIndex: Ragged per-(object, filter) light-curve index with zero-copy slicing.
+- SharedIndexHandle: Picklable handle of a LightCurveIndex published in shared memory.
+"""
+
+import os
+import json
+import logging
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+
+# Version of the on-disk light curve store layout
+STORE_FORMAT_VERSION = 1
+# Name of the metadata file, written last so that its presence marks a complete store
+STORE_METADATA_FILE = 'metadata.json'
+# Arrays making up the on-disk store
+STORE_ARRAYS = ('object_ids', 'filters', 'offsets', 'mjd', 'mag', 'err')
+
+
+class SharedIndexHandle:
+    """
+    Picklable description of a LightCurveIndex published in shared memory.
+
+    The handle only carries block names, shapes and dtypes, so sending it to a worker costs
+    the same regardless of the table size. Workers call `attach` to get an index backed by
+    the shared blocks; the publishing process calls `unlink` once all workers are done.
+
+    Attributes:
+        arrays (dict): Maps array names to (block name, shape, dtype string).
+        cleaning (dict or None): Outlier cleaning parameters of the published index.
+    """
+
+    def __init__(self, arrays, cleaning=None, blocks=None):
+        self.arrays = arrays
+        self.cleaning = cleaning
+        self._blocks = blocks or []
+
+    def __getstate__(self):
+        # Only the owner keeps the blocks, the copies sent to workers carry the names
+        return {'arrays': self.arrays, 'cleaning': self.cleaning, '_blocks': []}
+
+    def attach(self):
+        """
+        Return a LightCurveIndex whose arrays are views of the shared memory blocks.
+        """
+        blocks, arrays = [], {}
+        for name, (block_name, shape, dtype) in self.arrays.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        for name in STORE_ARRAYS:
+            arrays.setdefault(name, None)
+
+        index = LightCurveIndex(cleaning=self.cleaning, **arrays)
+        # Keep the blocks alive as long as the index uses their buffers
+        index._shared_blocks = blocks
+        return index
+
+    def unlink(self):
+        """
+        Release the shared memory blocks. Only effective in the process that published them.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+class LightCurveIndex:
+    """
+    Ragged index of light curves stored in contiguous NumPy columns.
+
+    Attributes
+    ----------
+    object_ids : np.ndarray
+        Sorted unique object IDs.
+    filters : np.ndarray
+        Sorted unique filter values.
+    offsets : np.ndarray
+        Integer array of shape (n_objects, n_filters + 1). Rows of object `i` and filter `k`
+        are `offsets[i, k]:offsets[i, k + 1]`.
+    mjd, mag : np.ndarray
+        Time and magnitude columns, sorted by (object, filter, mjd).
+    err : np.ndarray or None
+        Magnitude error column, or None if the source table had no error column.
+    cleaning : dict or None
+        Parameters of the bulk outlier removal applied before indexing, or None.
+    """
+
+    def __init__(self, object_ids, filters, offsets, mjd, mag, err=None, cleaning=None):
+        self.object_ids = object_ids
+        self.filters = filters
+        self.offsets = offsets
+        self.mjd = mjd
+        self.mag = mag
+        self.err = err
+        self.cleaning = cleaning
+
+        # Slices handed out are views, so protect the shared columns from in-place edits
+        for array in (self.mjd, self.mag, self.err):
+            if array is not None and array.flags.writeable:
+                array.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, df, group_by_key='objectId', time_col='mjd', mag_col='psMag',
+                   err_col='psMagErr', filter_col='filter'):
+        """
+        Build the index from a forced source DataFrame.
+
+        Rows containing NaN in any column are dropped, matching the per-filter `dropna`
+        applied by `get_lc22` and `get_lc_dyn`.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Forced source data with object ID, filter, time and magnitude columns.
+        group_by_key : str, optional
+            Column holding the object ID (default is 'objectId').
+        time_col, mag_col, err_col, filter_col : str, optional
+            Column names of time, magnitude, magnitude error and filter.
+
+        Returns
+        -------
+        LightCurveIndex
+            The built index.
+        """
+        d = df.dropna().sort_values(by=[group_by_key, filter_col, time_col], kind='mergesort')
+
+        obj_codes, object_ids = pd.factorize(d[group_by_key], sort=True)
+        filt_codes, filters = pd.factorize(d[filter_col], sort=True)
+        n_obj, n_filt = len(object_ids), len(filters)
+
+        # Cumulative row counts over the flattened (object, filter) grid give the offsets
+        counts = np.bincount(obj_codes * n_filt + filt_codes, minlength=n_obj * n_filt)
+        flat = np.concatenate([[0], np.cumsum(counts)])
+        offsets = flat[np.arange(n_obj)[:, None] * n_filt + np.arange(n_filt + 1)]
+
+        # String IDs and filters (e.g. 'g', 'r', or categories) are held as fixed-width strings,
+        # object arrays of pointers can neither be saved nor shared between processes
+        object_ids, filters = np.asarray(object_ids), np.asarray(filters)
+        if object_ids.dtype == object:
+            object_ids = object_ids.astype(str)
+        if filters.dtype == object:
+            filters = filters.astype(str)
+
+        err = d[err_col].to_numpy() if err_col in d.columns else None
+        index = cls(object_ids, filters, offsets,
+                    d[time_col].to_numpy(), d[mag_col].to_numpy(), err)
+        logging.info(f"Light curve index built for {n_obj} objects and {n_filt} filters.")
+        return index
+
+    def __len__(self):
+        return len(self.object_ids)
+
+    def __contains__(self, obj_id):
+        return self.row(obj_id) is not None
+
+    @property
+    def nbytes(self):
+        """Total size of the index arrays in bytes."""
+        arrays = [self.object_ids, self.filters, self.offsets, self.mjd, self.mag, self.err]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def row(self, obj_id):
+        """
+        Return the row of `obj_id` in the offsets table, or None if the object is not indexed.
+        """
+        try:
+            i = int(np.searchsorted(self.object_ids, obj_id))
+        except (TypeError, ValueError):
+            return None
+        if i < len(self.object_ids) and self.object_ids[i] == obj_id:
+            return i
+        return None
+
+    def band(self, obj_id, filter_value):
+        """
+        Return (mjd, mag, err) views for one object and filter, or None if there is no data.
+        `err` is None when the index has no error column.
+        """
+        i = self.row(obj_id)
+        matches = np.flatnonzero(self.filters == filter_value)
+        if i is None or len(matches) == 0:
+            return None
+        k = matches[0]
+        start, stop = self.offsets[i, k], self.offsets[i, k + 1]
+        if start == stop:
+            return None
+        err = self.err[start:stop] if self.err is not None else None
+        return self.mjd[start:stop], self.mag[start:stop], err
+
+    def bands(self, obj_id):
+        """
+        Return a dict mapping every filter with data for `obj_id` to its (mjd, mag, err) views.
+        """
+        i = self.row(obj_id)
+        if i is None:
+            return {}
+        result = {}
+        for k, filter_value in enumerate(self.filters):
+            start, stop = self.offsets[i, k], self.offsets[i, k + 1]
+            if start < stop:
+                err = self.err[start:stop] if self.err is not None else None
+                result[filter_value] = (self.mjd[start:stop], self.mag[start:stop], err)
+        return result
+
+    def point_counts(self):
+        """
+        Return a DataFrame of point counts, indexed by object ID with one column per filter.
+        """
+        return pd.DataFrame(np.diff(self.offsets, axis=1), index=self.object_ids, columns=self.filters)
+
+    def _check_dtypes(self):
+        """Raises ValueError if an index array has object dtype."""
+        for name in STORE_ARRAYS:
+            array = getattr(self, name)
+            if array is not None and array.dtype == object:
+                raise ValueError(f"Index array '{name}' has object dtype, convert it to a fixed-width dtype.")
+
+    def save(self, path):
+        """
+        Write the index to a directory of `.npy` files that can later be memory-mapped with `load`.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store. Created if it does not exist; existing store files are replaced.
+
+        Raises
+        ------
+        ValueError
+            If an array holds Python objects, which cannot be memory-mapped. Nothing is written.
+        """
+        self._check_dtypes()
+        os.makedirs(path, exist_ok=True)
+        metadata_path = os.path.join(path, STORE_METADATA_FILE)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+
+        for name in STORE_ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+
+        metadata = {
+            'format_version': STORE_FORMAT_VERSION,
+            'n_objects': int(len(self.object_ids)),
+            'n_filters': int(len(self.filters)),
+            'n_rows': int(len(self.mjd)),
+            'has_err': self.err is not None,
+            'cleaning': self.cleaning
+        }
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f)
+        logging.info(f"Light curve store written to {path}.")
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Open a light curve store written by `save`.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store.
+        mmap_mode : str or None, optional
+            Memory-map mode passed to `np.load` (default is 'r'). Use None to read the arrays into memory.
+
+        Returns
+        -------
+        LightCurveIndex
+            Index backed by the memory-mapped store files.
+        """
+        with open(os.path.join(path, STORE_METADATA_FILE)) as f:
+            metadata = json.load(f)
+        if metadata.get('format_version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported light curve store version {metadata.get('format_version')} in {path}.")
+
+        arrays = {}
+        for name in STORE_ARRAYS:
+            if name == 'err' and not metadata['has_err']:
+                arrays[name] = None
+                continue
+            arrays[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+        logging.info(f"Light curve store opened from {path}.")
+        return cls(cleaning=metadata.get('cleaning'), **arrays)
+
+    def to_shared_memory(self):
+        """
+        Copy the index arrays into `multiprocessing.shared_memory` blocks.
+
+        Returns
+        -------
+        SharedIndexHandle
+            Handle that workers use to attach to the shared arrays. Call its `unlink`
+            method in the publishing process when the workers are done.
+
+        Raises
+        ------
+        ValueError
+            If an array holds Python objects, whose pointers are meaningless in other processes.
+        """
+        self._check_dtypes()
+        arrays, blocks = {}, []
+        for name in STORE_ARRAYS:
+            array = getattr(self, name)
+            if array is None:
+                continue
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            blocks.append(block)
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        logging.info(f"Light curve index published in shared memory ({self.nbytes} bytes).")
+        return SharedIndexHandle(arrays, self.cleaning, blocks)
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 from scipy.interpolate import interp1d
 from QhX.data_manager import DataManager
+from QhX.utils.stage_timing import stage
 
 
 def outliers(time, flux, err_flux=None):
@@ -112,12 +113,161 @@ def outliers_mad(time, flux, err_flux=None, threshold_factor=3.0):
     else:
         return clean_time, clean_flux
 
+def outliers_mad_frame(df, group_keys, threshold_factor=3.0, use_errors=True, mag_col='psMag', err_col='psMagErr'):
+    """
+    Removes MAD outliers from every light curve of a table in one vectorized pass.
+    This applies the same rule as `outliers_mad` to each group (e.g. each object and filter), using
+    groupby transforms for the median flux, the MAD and the median error instead of one NumPy call per group.
+
+    Parameters:
+    -----------
+    - df (pd.DataFrame): Forced source data. Rows containing NaN are dropped first.
+    - group_keys (list of str): Columns identifying a single light curve, e.g. ['objectId', 'filter'].
+    - threshold_factor (float, optional): Multiplier of the MAD used as threshold. Default is 3.0.
+    - use_errors (bool, optional): Add the median error of each group to the threshold. Default is True.
+    - mag_col (str, optional): Name of the magnitude column. Default is 'psMag'.
+    - err_col (str, optional): Name of the magnitude error column. Default is 'psMagErr'.
+
+    Returns:
+    --------
+    pd.DataFrame: The rows of `df` that are not outliers.
+
+    Example:
+    --------
+    >>> clean_df = outliers_mad_frame(fs_df, ['objectId', 'filter'])
+    """
+    d = df.dropna()
+    keys = [d[k] for k in group_keys]
+    median_flux = d.groupby(keys, observed=True, sort=False)[mag_col].transform('median')
+    deviation = (d[mag_col] - median_flux).abs()
+    threshold = threshold_factor * deviation.groupby(keys, observed=True, sort=False).transform('median')
+
+    # Conditionally adjust threshold based on error in flux
+    if use_errors and err_col in d.columns:
+        threshold = threshold + d.groupby(keys, observed=True, sort=False)[err_col].transform('median')
+
+    return d[deviation <= threshold]
+
+
+def is_precleaned(data_manager):
+    """
+    Check whether the outliers of a data manager's light curves were already removed in bulk
+    (see `DataManager.remove_outliers`), in which case per-object cleaning is skipped.
+    """
+    if getattr(data_manager, 'outlier_params', None) is not None:
+        return True
+    lc_index = getattr(data_manager, 'lc_index', None)
+    return lc_index is not None and lc_index.cleaning is not None
+
+
 # Example usage:
 # clean_time, clean_flux = outliers(tt, yy)
 # clean_time, clean_flux, clean_err_flux = outliers(tt, yy, err_flux=yy_err)
 
 
-def get_lc22(data_manager, set1, include_errors=True):
+def has_object(data_manager, set1):
+    """
+    Check whether a data manager holds light curves for the given object ID.
+
+    Uses the columnar light curve index if the data manager has one, otherwise the pandas groupby.
+    """
+    lc_index = getattr(data_manager, 'lc_index', None)
+    if lc_index is not None:
+        return set1 in lc_index
+    return data_manager.fs_gp is not None and set1 in data_manager.fs_gp.groups
+
+
+def get_object_bands(data_manager, set1):
+    """
+    Return the raw light curve of an object split by filter.
+
+    Parameters:
+    -----------
+    - data_manager: DataManager or DataManagerDynamical holding the data.
+    - set1 (str): The object ID.
+
+    Returns:
+    --------
+    dict: Maps each filter value to a (mjd, mag, err) tuple of arrays sorted by MJD, with rows
+    containing NaN removed. `err` is None if the data has no 'psMagErr' column. Arrays sliced
+    from a `LightCurveIndex` are read-only views and must not be modified in place.
+    """
+    lc_index = getattr(data_manager, 'lc_index', None)
+    if lc_index is not None:
+        return lc_index.bands(set1)
+
+    demo_lc = data_manager.fs_gp.get_group(set1)
+    bands = {}
+    for filter_value in sorted(demo_lc['filter'].unique()):
+        d = demo_lc[demo_lc['filter'] == filter_value].sort_values(by=['mjd']).dropna()
+        if d.empty:
+            continue
+        err_mag = d['psMagErr'].to_numpy() if 'psMagErr' in d.columns else None
+        bands[filter_value] = (d['mjd'].to_numpy(), d['psMag'].to_numpy(), err_mag)
+    return bands
+
+
+def cleaning_key(data_manager):
+    """
+    Return a hashable description of the outlier cleaning applied to a data manager's light curves,
+    used to key cached cleaned light curves.
+    """
+    params = getattr(data_manager, 'outlier_params', None)
+    if params is None and getattr(data_manager, 'lc_index', None) is not None:
+        params = data_manager.lc_index.cleaning
+    if params is None:
+        return ('outliers_mad',)
+    return ('bulk',) + tuple(sorted(params.items()))
+
+
+def get_clean_bands(data_manager, set1, include_errors=True):
+    """
+    Return the outlier-cleaned light curve of an object split by filter, before any noise is added.
+
+    If the data manager has an enabled light curve cache (see `DataManager.enable_cache`), results
+    are looked up and stored there, keyed by (object ID, include_errors, cleaning parameters).
+
+    Parameters:
+    -----------
+    - data_manager: DataManager or DataManagerDynamical holding the data.
+    - set1 (str): The object ID.
+    - include_errors (bool, optional): Whether the magnitude errors are used in the cleaning and returned.
+
+    Returns:
+    --------
+    dict: Maps each filter value to a (tt, yy, err) tuple. `err` is None if errors are not included
+    or not available. Returned arrays may be shared and must not be modified in place.
+    """
+    lc_cache = getattr(data_manager, 'lc_cache', None)
+    if lc_cache is not None:
+        key = (set1, bool(include_errors), cleaning_key(data_manager))
+        cached = lc_cache.get(key)
+        if cached is not None:
+            return cached
+
+    bands = {}
+    precleaned = is_precleaned(data_manager)
+    with stage('load'):
+        object_bands = get_object_bands(data_manager, set1)
+    for filter_value, (tt, yy, err_mag) in object_bands.items():
+        err_mag = err_mag if include_errors else None
+
+        # Handle outliers, unless they were already removed for the whole table
+        with stage('cleaning'):
+            if precleaned:
+                pass
+            elif err_mag is not None:
+                tt, yy, err_mag = outliers_mad(tt, yy, err_mag)
+            else:
+                tt, yy = outliers_mad(tt, yy)
+        bands[filter_value] = (tt, yy, err_mag)
+
+    if lc_cache is not None:
+        lc_cache.put(key, bands)
+    return bands
+
+
+def get_lc22(data_manager, set1, include_errors=True, bands=None):
     """
     Process and return light curves with an option to include magnitude errors for a given set ID.
     This version is for fixed filters ranging from 0 to 3 and preserves MJD precision.
@@ -126,18 +276,21 @@ def get_lc22(data_manager, set1, include_errors=True):
     -----------
     - set1 (str): The object ID for which light curves are to be processed.
     - include_errors (bool, optional): Flag to include magnitude errors in the time series. Defaults to True.
+    - bands (dict, optional): The cleaned bands of the object as returned by `get_clean_bands`, e.g. loaded
+      ahead by a `Prefetcher`. Fetched from the data manager if not given.
 
     Returns:
     --------
     tuple: Contains the processed time series with or without magnitude errors for each filter (0 to 3),
            along with their respective sampling rates.
     """
-    if set1 not in data_manager.fs_gp.groups:
-        print(f"Set ID {set1} not found.")
-        return None
+    if bands is None:
+        if not has_object(data_manager, set1):
+            print(f"Set ID {set1} not found.")
+            return None
 
-    # Fetch data for the given object ID
-    demo_lc = data_manager.fs_gp.get_group(set1)
+        # Fetch cleaned data for the given object ID, split by filter
+        bands = get_clean_bands(data_manager, set1, include_errors)
 
     # Initialize containers for time series data and sampling rates
     tt_with_errors = {0: None, 1: None, 2: None, 3: None}
@@ -145,25 +298,18 @@ def get_lc22(data_manager, set1, include_errors=True):
     sampling_rates = {0: None, 1: None, 2: None, 3: None}
 
     for filter_value in range(4):  # Fixed filters from 0 to 3
-        d = demo_lc[demo_lc['filter'] == filter_value].sort_values(by=['mjd']).dropna()
-        if d.empty or ('psMagErr' not in d.columns and include_errors):
+        band = bands.get(filter_value)
+        if band is None or (band[2] is None and include_errors):
             print(f"No data or 'psMagErr' column not found for filter {filter_value} in set {set1}.")
             continue
 
         # Extract MJD, magnitude, and errors
-        tt, yy = d['mjd'].to_numpy(), d['psMag'].to_numpy()
-        err_mag = d['psMagErr'].to_numpy() if 'psMagErr' in d.columns and include_errors else None
-
-        # Handle outliers
-        if include_errors and err_mag is not None:
-            tt, yy, err_mag = outliers_mad(tt, yy, err_mag)
-        else:
-            tt, yy = outliers_mad(tt, yy)
+        tt, yy, err_mag = band
 
         # Create the time series with or without errors
         ts_with_or_without_errors = yy
         if include_errors and err_mag is not None:
-            ts_with_or_without_errors += np.random.normal(0, err_mag, len(tt))
+            ts_with_or_without_errors = yy + np.random.normal(0, err_mag, len(tt))
 
         # Store time series and sampling rates
         tt_with_errors[filter_value] = tt
@@ -2,20 +2,26 @@
 import math
 import pandas as pd
 import numpy as np
+from QhX.results import to_dataframe, RESULT_FIELDS
 
 
 
 
 
 def flatten_detected_periods(detected_periods):
-    """Flatten the nested list of dictionaries and insert NaN for empty lists."""
+    """
+    Flatten the detector outputs (record arrays as returned by `process1_new`, or lists of
+    dictionaries) into a list of dictionaries and insert NaN for empty or missing outputs.
+    """
     flat_list = []
     for sublist in detected_periods:
-        if sublist:  # Check if the sublist is not empty
+        if sublist is not None and len(sublist) > 0:  # Check if the sublist is not empty
+            if isinstance(sublist, np.ndarray):
+                sublist = to_dataframe(sublist).to_dict('records')
             flat_list.extend(sublist)
         else:
             # Append a dictionary with NaN values if the sublist is empty
-            flat_list.append({key: np.nan for key in ['objectid', 'sampling_i', 'sampling_j', 'period', 'upper_error', 'lower_error', 'significance', 'label']})
+            flat_list.append({key: np.nan for key in RESULT_FIELDS})
     return flat_list
 
 
@@ -27,7 +33,8 @@ def classify_periods(detected_periods):
 
     Parameters:
     -----------
-    detected_periods (list of dict): List of dictionaries containing detected period data.
+    detected_periods (list): Detector outputs, one per object: record arrays as returned by
+        `process1_new`/`process1_new_dyn`, or lists of dictionaries with the same keys.
 
     Returns:
     --------
@@ -47,6 +47,14 @@ Functions:
 import math
 import pandas as pd
 import numpy as np
+from QhX.results import to_dataframe, RESULT_FIELDS, CSV_COLUMNS
+
+# Columns of the detected periods classified by this module
+PERIOD_COLUMNS = ('ID', 'Sampling_1', 'Sampling_2', 'Common period (Band1 & Band1)',
+                  'Upper error bound', 'Lower error bound', 'Significance', 'Band1-Band2')
+# Result record fields and results file columns, by the column of this module they hold
+RECORD_COLUMNS = dict(zip(RESULT_FIELDS, PERIOD_COLUMNS))
+CSV_COLUMN_NAMES = dict(zip(CSV_COLUMNS, PERIOD_COLUMNS))
 
 
 def flatten_detected_periods(detected_periods):
@@ -55,8 +63,10 @@ def flatten_detected_periods(detected_periods):
     
     Parameters:
     -----------
-    detected_periods : list of dict
-        A list of dictionaries, each representing a detected period with keys such as 'ID', 'Sampling_1', etc.
+    detected_periods : list
+        Dictionaries, each representing a detected period with keys such as 'ID', 'Sampling_1', etc.
+        (e.g. rows of a results CSV file), or detector outputs (record arrays as returned by
+        `process1_new`), which are expanded with the CSV column names.
     
     Returns:
     --------
@@ -64,15 +74,28 @@ def flatten_detected_periods(detected_periods):
         A flattened list of dictionaries, excluding records with NaN values.
     """
     flat_list = []
-    for record in detected_periods:
-        complete_record = {key: record.get(key, np.nan) for key in [
-            'ID', 'Sampling_1', 'Sampling_2', 'Common period (Band1 & Band1)',
-            'Upper error bound', 'Lower error bound', 'Significance', 'Band1-Band2']}
+    for record in _iter_records(detected_periods):
+        complete_record = {key: record.get(key, np.nan) for key in PERIOD_COLUMNS}
         
         if all(value == value for value in complete_record.values()):  # NaN does not equal itself
             flat_list.append(complete_record)
     return flat_list
 
+def _iter_records(detected_periods):
+    """
+    Yields the detected periods as dictionaries keyed by `PERIOD_COLUMNS`, expanding record arrays
+    and nested lists. Rows of results files, whose period column is 'Common period (Band1 & Band2)',
+    are renamed too.
+    """
+    for item in detected_periods:
+        if isinstance(item, np.ndarray):
+            yield from to_dataframe(item).rename(columns=RECORD_COLUMNS).to_dict('records')
+        elif isinstance(item, list):
+            yield from ({CSV_COLUMN_NAMES.get(key, key): value for key, value in record.items()} for record in item)
+        elif item is not None:
+            yield {CSV_COLUMN_NAMES.get(key, key): value for key, value in dict(item).items()}
+
+
 def calculate_iou(radius1, radius2, distance):
     """
     Calculates the Intersection over Union (IoU) for two circles given their radii and the distance between their centers.
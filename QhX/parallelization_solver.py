@@ -1,10 +1,18 @@
+import os
+import csv
 import sys
 import time
 from multiprocessing import Process, Queue
 from QhX.detection import process1_new  # Fixed mode
 from QhX.dynamical_mode import process1_new_dyn  # Dynamical mode
-from QhX.iparallelization_solver import IParallelSolver
+from QhX.iparallelization_solver import IParallelSolver, DEFAULT_CHUNKSIZE, DEFAULT_MAX_RETRIES
+from QhX.data_manager import DataManager
+from QhX.algorithms.wavelets.wwtz import frequency_axes
+from QhX.result_writer import ResultWriter, DEFAULT_BATCH_ROWS, DEFAULT_FLUSH_SECONDS
+from QhX.results import as_results, to_csv_lines, CSV_COLUMNS
+from QhX.light_curve import get_clean_bands, has_object
 from QhX.utils.logger import Logger
+from QhX.utils.stage_timing import STAGES
 
 DEFAULT_NTAU = None
 DEFAULT_NGRID = None
@@ -14,7 +22,13 @@ DEFAULT_LOG_PERIOD = 10.0  # Placeholder for log period
 DEFAULT_NUM_WORKERS = 4  # Placeholder for the number of workers
 
 # CSV format results header
-HEADER = "ID,Sampling_1,Sampling_2,Common period (Band1 & Band2),Upper error bound,Lower error bound,Significance,Band1-Band2\n"
+HEADER = ','.join(CSV_COLUMNS) + "\n"
+# Failed set IDs are listed next to the results file
+FAILURES_SUFFIX = '.failures.csv'
+FAILURES_HEADER = ("ID", "Error")
+# Stage timings are written next to the results file with record_stages
+STAGES_SUFFIX = '.stages.csv'
+STAGES_HEADER = ("ID", "seconds") + STAGES + ("rss_mb", "maxrss_growth_mb")
 
 class ParallelSolver(IParallelSolver):
     """
@@ -26,27 +40,68 @@ class ParallelSolver(IParallelSolver):
                  data_manager=None,
                  log_time=True,
                  log_files=False,
-                 save_results=True,
+                 save_results=False,  # Also save one <set_id>-result.csv file per object
                  process_function=process1_new,  # Default is fixed mode
                  parallel_arithmetic=False,
                  ntau=DEFAULT_NTAU,
                  ngrid=DEFAULT_NGRID,
                  provided_minfq=DEFAULT_PROVIDED_MINFQ,
                  provided_maxfq=DEFAULT_PROVIDED_MAXFQ,
-                 mode='fixed'  # New mode parameter, default to 'fixed'
+                 mode='fixed',  # New mode parameter, default to 'fixed'
+                 screen=None,  # Optional cheap pre-stage, e.g. LombScargleScreen()
+                 share_memory=False,  # Publish the light curve index in shared memory for the workers
+                 backend='pool',  # 'pool' streams results as objects complete, 'processes' hands workers one object at a time, 'dask' runs on a dask.distributed cluster
+                 chunksize=DEFAULT_CHUNKSIZE,  # Set IDs sent to a pool worker at once
+                 max_in_flight=None,  # Chunks submitted to the pool at once, defaults to 2 * num_workers
+                 cost_model=None,  # Optional CostModel, dispatches objects longest-first and learns from timings
+                 timeout=None,  # Wall-clock limit in seconds per object, workers stuck past it are killed
+                 max_tasks_per_worker=None,  # Replace workers after this many objects
+                 max_rss_mb=None,  # Replace workers above this resident memory in MiB
+                 max_retries=DEFAULT_MAX_RETRIES,  # Resubmissions of objects lost with a crashed worker
+                 result_format=None,  # 'csv' or 'parquet', inferred from the results file name by default
+                 writer_batch_rows=DEFAULT_BATCH_ROWS,  # Rows buffered by the result writer before a write
+                 writer_flush_seconds=DEFAULT_FLUSH_SECONDS,  # Maximum time rows stay buffered in the result writer
+                 client=None,  # dask.distributed Client or scheduler address for the 'dask' backend, LocalCluster by default
+                 store_path=None,  # Light curve store opened (memory-mapped) by each worker instead of pickling the data manager
+                 blas_threads=None,  # BLAS/OpenMP threads per worker, None to leave the libraries' default unless cpu_budget is given
+                 cpu_budget=None,  # CpuBudget or total cores, sets num_workers and blas_threads
+                 prefetch=0,  # Objects whose light curves each worker extracts and cleans ahead in a background thread
+                 prefetch_mb=None,  # Memory in MiB the light curves loaded ahead may hold
+                 band_workers=None,  # Threads analyzing the bands of an object concurrently, None for one band at a time
+                 record_stages=False  # Write the stage timings and memory use of each object next to the results file
                 ):
         """Initialize the ParallelSolver with the specified configuration."""
-        super().__init__(num_workers)
-        print(f"Initializing ParallelSolver with mode '{mode}' and {num_workers} workers.")
+        super().__init__(num_workers, backend, chunksize, max_in_flight,
+                         timeout, max_tasks_per_worker, max_rss_mb, max_retries, client, blas_threads, cpu_budget,
+                         prefetch, prefetch_mb, record_stages)
+        print(f"Initializing ParallelSolver with mode '{mode}' and {self.num_workers} workers.")
         self.delta_seconds = delta_seconds
         self.data_manager = data_manager
         self.save_results = save_results
         self.parallel_arithmetic = parallel_arithmetic
+        if parallel_arithmetic and self.cpu_budget is not None and not self.cpu_budget.allows_parallel_wwz():
+            # libwwz would start one job per core in every worker
+            print(f"Parallel arithmetic disabled, it does not fit {self.cpu_budget}.")
+            self.parallel_arithmetic = False
         self.ntau = ntau
         self.ngrid = ngrid
         self.provided_minfq = provided_minfq
         self.provided_maxfq = provided_maxfq
         self.mode = mode  # Set the mode
+        self.screen = screen
+        self.band_workers = band_workers
+        self.share_memory = share_memory
+        # Absolute, workers may open it after the caller changed directory (e.g. process_batches)
+        self.store_path = os.path.abspath(store_path) if store_path is not None else None
+        self.shared_handle_ = None
+        self.result_format = result_format
+        self.writer_batch_rows = writer_batch_rows
+        self.writer_flush_seconds = writer_flush_seconds
+        self.writer_ = None
+        self.failures_file_ = None
+        self.stages_file_ = None
+        self.cost_model = cost_model
+        self.point_counts_ = None
         self.logger = Logger(log_files, log_time, delta_seconds)
 
         # Determine the processing function based on the mode
@@ -59,18 +114,132 @@ class ParallelSolver(IParallelSolver):
         else:
             raise ValueError(f"Unknown mode: {self.mode}")
 
+    def order_set_ids(self, set_ids):
+        """
+        Groups set IDs by partition when the data manager is partitioned (e.g. DaskDataManager),
+        otherwise sorts them longest-first by predicted runtime if a cost model is set
+        """
+        if hasattr(self.data_manager, 'order_by_partition'):
+            return self.data_manager.order_by_partition(set_ids)
+        if self.cost_model is not None and self.data_manager is not None:
+            self.point_counts_ = self.data_manager.point_counts()
+            return self.cost_model.order(set_ids, self.point_counts_)
+        return set_ids
+
+    def __getstate__(self):
+        """Workers attach to the shared light curve index or open the store, so the data manager is not pickled"""
+        state = super().__getstate__()
+        state['writer_'] = None  # Only the parent process sends results to the writer
+        state['journal_'] = None  # and the run journal
+        if state.get('shared_handle_') is not None or state.get('store_path') is not None:
+            state['data_manager'] = None
+        return state
+
+    def dask_task_inputs(self, client, set_ids):
+        """
+        With a partitioned data manager (DaskDataManager), makes one chunk sequence per partition,
+        each chunk carrying its lazy partition. The table is never persisted as a whole: a partition
+        is read on the cluster when its first chunk is submitted and released after its last one
+        (see `process_ids_dask`), and the tasks of a partition run on the worker holding it.
+        Otherwise chunks set IDs by chunksize.
+        """
+        if not hasattr(self.data_manager, 'partition_of') or getattr(self.data_manager, 'fs_df', None) is None:
+            return super().dask_task_inputs(client, set_ids)
+        partitions = self.data_manager.fs_df.to_delayed()
+        by_partition = {}
+        for set_id in set_ids:
+            by_partition.setdefault(self.data_manager.partition_of(set_id), []).append(set_id)
+        tasks = []
+        for i, ids in by_partition.items():
+            for start in range(0, len(ids), self.chunksize):
+                tasks.append((ids[start:start + self.chunksize], partitions[i] if i is not None else None))
+        return tasks
+
+    def attach_task_data(self, partition):
+        """Replaces the data manager with one holding only the partition of the task"""
+        data_manager = DataManager()
+        data_manager.fs_df = partition.reset_index()
+        data_manager.outlier_params = self.data_manager.outlier_params  # The partition may be cleaned already
+        data_manager.group_fs_df()
+        self.data_manager = data_manager
+
+    def check_cleaning(self):
+        """
+        Warns if the light curves were cleaned in bulk (see `DataManager.remove_outliers`) with or
+        without errors while the per-object cleaning of the mode, which the bulk cleaning replaces,
+        does the opposite: errors are used in dynamical mode only.
+        """
+        params = getattr(self.data_manager, 'outlier_params', None)
+        lc_index = getattr(self.data_manager, 'lc_index', None)
+        if params is None and lc_index is not None:
+            params = lc_index.cleaning
+        if params is not None and params.get('use_errors') != (self.mode == 'dynamical'):
+            print(f"Warning: light curves were cleaned in bulk with use_errors={params.get('use_errors')}, "
+                  f"the per-object cleaning of mode '{self.mode}' would use "
+                  f"{'errors' if self.mode == 'dynamical' else 'no errors'}.")
+
+    def prepare_workers(self):
+        """Checks the bulk cleaning and publishes the light curve index in shared memory if share_memory is set"""
+        self.check_cleaning()
+        if self.share_memory and self.data_manager is not None:
+            lc_index = self.data_manager.lc_index
+            if lc_index is None:
+                lc_index = self.data_manager.build_lc_index()
+            if lc_index is None:
+                # e.g. DaskDataManager, whose table is never materialized
+                print("No light curve index to share, workers use their own copy of the data manager.")
+                return
+            self.shared_handle_ = lc_index.to_shared_memory()
+
+    def initialize_worker(self):
+        """
+        Attaches the worker to its data: the shared light curve index if share_memory is set,
+        otherwise the memory-mapped light curve store if store_path is set (pages are shared
+        between workers by the OS cache). Then computes the frequency axes of the configured
+        grid once, so objects only pay for their own computation.
+
+        Raises:
+            RuntimeError: If the light curve store cannot be opened, so the worker fails its setup
+                instead of failing every set ID.
+        """
+        if self.shared_handle_ is not None:
+            data_manager = DataManager()
+            data_manager.lc_index = self.shared_handle_.attach()
+            self.data_manager = data_manager
+        elif self.store_path is not None:
+            data_manager = DataManager()
+            if data_manager.load_lc_store(self.store_path) is None:
+                raise RuntimeError(f"Light curve store {self.store_path} could not be opened")
+            self.data_manager = data_manager
+        if self.ngrid is not None and self.provided_minfq is not None and self.provided_maxfq is not None:
+            frequency_axes(self.ngrid, self.provided_minfq, self.provided_maxfq)
+
+    def release_workers(self):
+        """Frees the shared memory published for the workers"""
+        if self.shared_handle_ is not None:
+            self.shared_handle_.unlink()
+            self.shared_handle_ = None
+
     def aggregate_process_function_result(self, result):
-        """Places the result dict into a string"""
-        res = ""
-        print("Aggregating results...")
-        for row in result:
-            row_values = row.values() if isinstance(row, dict) else row
-            res += ','.join([str(v) for v in row_values]) + "\n"
-        print("Aggregation complete.")
-        return res
-
-    def get_process_function_result(self, set_id):
-        """Run the detection function and return the result based on the mode"""
+        """Converts the result rows to result records, the result writer formats them"""
+        return as_results(result)
+
+    def load_set(self, set_id):
+        """
+        Extracts and cleans the light curves of a set ID, run ahead of its processing when
+        prefetch is set. Noise is added to them later by the process function, in the thread
+        computing the object, so the random draws do not depend on the prefetching.
+        """
+        if not has_object(self.data_manager, set_id):
+            return None
+        # Errors are only included in dynamical mode, as in get_process_function_result
+        return get_clean_bands(self.data_manager, set_id, include_errors=self.mode == 'dynamical')
+
+    def get_process_function_result(self, set_id, data=None):
+        """
+        Run the detection function and return the result based on the mode.
+        `data` are the cleaned light curves of the set ID if they were loaded ahead.
+        """
         print(f"Processing set ID: {set_id} in mode '{self.mode}'.")
 
         if self.mode == 'fixed':
@@ -82,7 +251,10 @@ class ParallelSolver(IParallelSolver):
                                            provided_minfq=self.provided_minfq,
                                            provided_maxfq=self.provided_maxfq,
                                            parallel=self.parallel_arithmetic,
-                                           include_errors=False)
+                                           include_errors=False,
+                                           screen=self.screen,
+                                           bands=data,
+                                           band_workers=self.band_workers)
         elif self.mode == 'dynamical':
             # Call the dynamical mode function with parameters specific to dynamical mode
             result = self.process_function(self.data_manager,
@@ -92,10 +264,15 @@ class ParallelSolver(IParallelSolver):
                                            provided_minfq=self.provided_minfq,
                                            provided_maxfq=self.provided_maxfq,
                                            parallel=self.parallel_arithmetic,
-                                           include_errors=True)  # Or other mode-specific parameters
+                                           include_errors=True,  # Or other mode-specific parameters
+                                           screen=self.screen,
+                                           bands=data,
+                                           band_workers=self.band_workers)
         else:
             raise ValueError(f"Unknown mode: {self.mode}")
 
+        if result is None:
+            raise ValueError(f"No results for set ID {set_id}, object not found or insufficient data")
         print(f"Processing for set ID {set_id} in mode '{self.mode}' completed.")
         return result
 
@@ -109,27 +286,105 @@ class ParallelSolver(IParallelSolver):
         print("Stopping logger.")
         self.logger.stop()
 
-    def maybe_save_local_results(self, set_id, res_string):
-        """Saves local results of set ID formed into a string"""
-        if self.save_results:
+    def maybe_save_local_results(self, set_id, res):
+        """Saves the result records of a set ID to its own CSV file, if save_results is set"""
+        if self.save_results and res is not None:
             print(f"Saving local results for set ID {set_id}")
             try:
                 with open(f'{set_id}-result.csv', 'w') as saving_file:
-                    saving_file.write(HEADER + res_string)
+                    saving_file.write(HEADER + to_csv_lines(res))
                 print(f"Results saved successfully for set ID {set_id}.")
             except Exception as e:
                 print(f"Error saving results for set ID {set_id}: {e}")
 
-    def maybe_save_results(self, results_file):
-        """If results file is set, saves the full results queue to it."""
+    def maybe_open_results(self, results_file, append=False):
+        """
+        Starts the result writer process for the unified results, if a results file is set.
+        A results file ending with '.parquet' is written as a Parquet dataset directory,
+        otherwise as a CSV file with the header. With append, results are added to existing
+        ones (when resuming a run). The writer journals set IDs as done once their rows are written.
+        """
+        self.failures_file_ = results_file + FAILURES_SUFFIX if results_file is not None else None
+        if self.failures_file_ is not None and not append and os.path.isfile(self.failures_file_):
+            os.remove(self.failures_file_)
+        self.stages_file_ = results_file + STAGES_SUFFIX if results_file is not None and self.record_stages else None
+        if self.stages_file_ is not None and not append and os.path.isfile(self.stages_file_):
+            os.remove(self.stages_file_)
         if results_file is not None:
             print(f"Saving all results to {results_file}.")
             try:
-                with open(results_file, 'w') as f:
-                    f.write(HEADER)
-                    while not self.results_.empty():
-                        result = self.results_.get()
-                        f.write(result)
-                print("All results saved successfully.")
+                self.writer_ = ResultWriter(results_file,
+                                            result_format=self.result_format,
+                                            header=HEADER,
+                                            append=append,
+                                            batch_rows=self.writer_batch_rows,
+                                            flush_seconds=self.writer_flush_seconds,
+                                            journal_path=self.journal_.path if self.journal_ is not None else None,
+                                            acknowledge=self.track_saved_).start()
+            except Exception as e:
+                self.writer_ = None
+                print(f"Error while opening {results_file}: {e}")
+
+    def maybe_write_result(self, set_id, res):
+        """Sends the result records of one set ID to the result writer."""
+        if self.writer_ is not None:
+            try:
+                self.writer_.put(set_id, res)
             except Exception as e:
-                print(f"Error while saving to {results_file}: {e}")
+                print(f"Error while saving results of set ID {set_id} to {self.writer_.path}: {e}")
+
+    def journal_done(self, set_id):
+        """The result writer journals set IDs once their rows are written"""
+        if self.writer_ is None:
+            super().journal_done(set_id)
+
+    def pop_saved(self):
+        """Adds the set IDs the result writer reported written to the saved set IDs"""
+        if self.writer_ is not None and self.writer_.acknowledge:
+            self.saved_.extend(self.writer_.written())
+        return super().pop_saved()
+
+    def maybe_flush_results(self):
+        """Makes the result writer write its buffered rows and waits for them, see `pop_saved`"""
+        if self.writer_ is not None and self.writer_.acknowledge:
+            self.writer_.flush()
+
+    def maybe_record_timing(self, set_id, seconds):
+        """Refines the cost model with the observed runtime of a set ID"""
+        if self.cost_model is not None and self.point_counts_ is not None:
+            self.cost_model.record(set_id, self.point_counts_, seconds)
+
+    def maybe_record_stages(self, set_id, seconds, stages):
+        """Appends the stage timings (seconds) and memory use (MiB) of a set ID to the stages file next to the results file"""
+        if self.stages_file_ is not None:
+            try:
+                write_header = not os.path.isfile(self.stages_file_)
+                with open(self.stages_file_, 'a') as f:
+                    writer = csv.DictWriter(f, fieldnames=STAGES_HEADER, extrasaction='ignore')
+                    if write_header:
+                        writer.writeheader()
+                    writer.writerow(dict(stages, ID=set_id, seconds=seconds))
+            except Exception as e:
+                print(f"Error while saving stage timings of set ID {set_id}: {e}")
+
+    def maybe_record_failure(self, set_id, error):
+        """Appends a failed set ID and its error to the failures file next to the results file"""
+        if self.failures_file_ is not None:
+            try:
+                write_header = not os.path.isfile(self.failures_file_)
+                with open(self.failures_file_, 'a') as f:
+                    writer = csv.writer(f)
+                    if write_header:
+                        writer.writerow(FAILURES_HEADER)
+                    writer.writerow([set_id, error])
+            except Exception as e:
+                print(f"Error while saving failure of set ID {set_id}: {e}")
+
+    def maybe_close_results(self):
+        """Writes the remaining results and stops the result writer."""
+        if self.writer_ is not None:
+            self.writer_.close()
+            if self.writer_.acknowledge:
+                self.saved_.extend(self.writer_.written())
+            self.writer_ = None
+            print("All results saved successfully.")
@@ -0,0 +1,142 @@
+"""
+prefetch.py
+
+This module overlaps the loading of light curves with the computation in a worker.
+
+Extracting and cleaning the light curve of an object (pandas selection, outlier removal) is
+done while the worker waits, before the wavelet analysis can start. A `Prefetcher` runs the
+loading in a background thread that stays a few objects ahead of the computation, so the
+extraction of the next objects is hidden behind the transform of the current one. The
+thread stops loading when `depth` objects are waiting or when the waiting light curves hold
+more than `max_bytes`, and resumes as the computation takes them.
+
+Classes:
+--------
+- Prefetcher: Background thread loading the data of the next set IDs into a bounded buffer.
+
+Functions:
+----------
+- nbytes_of: Size in bytes of the arrays held by a loaded object.
+"""
+
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+# Default number of set IDs loaded ahead of the computation
+DEFAULT_PREFETCH_DEPTH = 2
+
+
+def nbytes_of(data):
+    """Returns the size in bytes of the NumPy arrays in `data`, searching dicts, lists and tuples."""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, dict):
+        return sum(nbytes_of(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(nbytes_of(value) for value in data)
+    return 0
+
+
+class Prefetcher:
+    """
+    Loads the data of set IDs in a background thread, ahead of their processing.
+
+    Iterating yields (set ID, data) pairs in the order of `set_ids`. If loading a set ID
+    raises, it is yielded with None as data, so the caller loads it again itself and handles
+    the error as usual. `set_ids` may be a generator (e.g. draining a queue), it is only
+    advanced by the loading thread when there is room in the buffer.
+
+    Attributes:
+        load (callable): Returns the data of a set ID.
+        depth (int): Maximum number of loaded set IDs waiting to be processed.
+        max_bytes (int): Maximum size of the waiting data, None for no limit. The next set ID
+            is always loaded when the buffer is empty, whatever its size.
+    """
+
+    def __init__(self, load, set_ids, depth=DEFAULT_PREFETCH_DEPTH, max_bytes=None):
+        self.load = load
+        self.depth = max(int(depth), 1)
+        self.max_bytes = max_bytes
+        self._set_ids = iter(set_ids)
+        self._buffer = deque()
+        self._bytes = 0
+        self._finished = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _full(self):
+        if not self._buffer:
+            return False
+        return len(self._buffer) >= self.depth or (self.max_bytes is not None and self._bytes >= self.max_bytes)
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while self._full() and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                try:
+                    set_id = next(self._set_ids)
+                except StopIteration:
+                    return
+                try:
+                    data = self.load(set_id)
+                except Exception as e:
+                    logging.warning(f'Prefetching set ID {set_id} failed: {e}')
+                    data = None
+                size = nbytes_of(data)
+                with self._condition:
+                    self._buffer.append((set_id, data, size))
+                    self._bytes += size
+                    self._condition.notify_all()
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def start(self):
+        """Starts the loading thread."""
+        self._thread = threading.Thread(target=self._run, name='Prefetcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def __iter__(self):
+        while True:
+            with self._condition:
+                while not self._buffer and not self._finished:
+                    self._condition.wait()
+                if not self._buffer:
+                    return
+                set_id, data, size = self._buffer.popleft()
+                self._bytes -= size
+                self._condition.notify_all()
+            yield set_id, data
+
+    def close(self):
+        """
+        Stops the loading thread.
+
+        Returns:
+            list: The set IDs taken from `set_ids` but not yielded, e.g. to return them to a queue.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        with self._condition:
+            pending = [set_id for set_id, _, _ in self._buffer]
+            self._buffer.clear()
+            self._bytes = 0
+        return pending
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
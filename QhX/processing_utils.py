@@ -43,6 +43,7 @@ from multiprocessing.dummy import Pool as ThreadPool
 # Import functions for both fixed and dynamical modes
 from QhX.detection import process1_new
 from QhX.dynamical_mode import process1_new_dyn
+from QhX.resources import CpuBudget, threadpool_limits
 
 def process_pool(args):
     """
@@ -75,7 +76,7 @@ def process_pool(args):
     else:
         raise ValueError(f"Unknown mode: {mode}")
 
-def parallel_pool(setids, data_manager, ntau, ngrid, provided_minfq, provided_maxfq, include_errors, mode='fixed', num_threads=2):
+def parallel_pool(setids, data_manager, ntau, ngrid, provided_minfq, provided_maxfq, include_errors, mode='fixed', num_threads=2, cpu_budget=None):
     """
     Sets up the thread pool and manages the parallel execution of the processing function.
 
@@ -89,6 +90,9 @@ def parallel_pool(setids, data_manager, ntau, ngrid, provided_minfq, provided_ma
         include_errors (bool): Flag to indicate whether to include error of magnitudes handling.
         mode (str): Either 'fixed' or 'dynamical' to select which processing function to use.
         num_threads (int): Number of threads to use for parallel processing.
+        cpu_budget (CpuBudget or int, optional): Core budget (or total cores) shared by the pool threads
+                      and the BLAS threads they start. The pool gets `processes` threads and the BLAS
+                      pools of the process are limited to `threads_per_process` while it runs.
 
     Returns:
         list: A list of results from processing each dataset identifier.
@@ -96,8 +100,15 @@ def parallel_pool(setids, data_manager, ntau, ngrid, provided_minfq, provided_ma
     # Create a tuple for each set_id, pairing it with all other necessary parameters
     args = [(set_id, data_manager, ntau, ngrid, provided_minfq, provided_maxfq, include_errors, mode) for set_id in setids]
 
+    limit = None
+    if cpu_budget is not None:
+        if not isinstance(cpu_budget, CpuBudget):
+            cpu_budget = CpuBudget(total_cores=cpu_budget, processes=num_threads)
+        num_threads = cpu_budget.processes
+        limit = cpu_budget.threads_per_process
+
     # Initialize the ThreadPool with the specified number of threads
-    with ThreadPool(num_threads) as pool:
+    with threadpool_limits(limits=limit), ThreadPool(num_threads) as pool:
         # Map the process_pool function to each tuple of arguments
         results = pool.map(process_pool, args)
 
@@ -0,0 +1,213 @@
+"""
+resources.py
+
+This module keeps the processes and threads of a run within a CPU core budget.
+
+Every solver worker runs NumPy (whose BLAS, e.g. in `correlation_nd`, starts one thread per core
+by default) and optionally libwwz in parallel mode (which starts one job per core), so a node
+running one worker per core can end up with hundreds of runnable threads competing for the same
+cores. `CpuBudget` splits a total number of cores into worker processes times threads per process,
+and `pin_blas_threads` enforces the thread part in each worker through threadpoolctl and the
+usual environment variables (OpenMP, OpenBLAS, MKL, Accelerate, numexpr, numba).
+
+`benchmark_splits` measures the throughput of every split of a budget on a representative task,
+`benchmark_grid` runs it on the wavelet analysis of a synthetic light curve for given grid sizes.
+
+Classes:
+--------
+- CpuBudget: Split of a core budget into processes and threads per process.
+
+Functions:
+----------
+- available_cores: Number of cores the current process may run on.
+- rss_bytes: Resident set size of the current process.
+- max_rss_bytes: Largest resident set size the current process reached.
+- pin_blas_threads: Limits the BLAS/OpenMP thread pools of the current process.
+- benchmark_splits: Measures the throughput of the splits of a core budget.
+- benchmark_grid: Benchmarks the splits on the wavelet analysis of a synthetic light curve.
+"""
+
+import os
+import sys
+import time
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+# Environment variables read by the thread pools of native libraries when they are loaded
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'NUMBA_NUM_THREADS')
+
+
+def available_cores():
+    """Returns the number of cores the current process may run on (its CPU affinity if known)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS and Windows
+        return os.cpu_count() or 1
+
+
+def rss_bytes():
+    """Returns the resident set size of the current process in bytes, or None if unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def max_rss_bytes():
+    """Returns the largest resident set size the current process reached in bytes, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def pin_blas_threads(n_threads):
+    """
+    Limits the BLAS/OpenMP thread pools of the current process to `n_threads`.
+
+    The environment variables are set for libraries loaded later and for child processes, and the
+    pools of libraries already loaded are limited with threadpoolctl.
+
+    Returns:
+        The threadpoolctl limiter, whose `restore_original_limits` undoes the limit.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    return threadpool_limits(limits=n_threads)
+
+
+class CpuBudget:
+    """
+    Split of a core budget into worker processes and threads per process.
+
+    Given only the total, the budget runs one single-threaded process per core, which is the
+    fastest split for many small objects. Given the processes or the threads per process, the
+    other is derived from the total.
+
+    Attributes:
+        total_cores (int): Cores the run may use, defaults to the available cores.
+        processes (int): Number of worker processes.
+        threads_per_process (int): BLAS/OpenMP threads of each worker process.
+    """
+
+    def __init__(self, total_cores=None, processes=None, threads_per_process=None):
+        self.total_cores = int(total_cores or available_cores())
+        if processes is None and threads_per_process is None:
+            processes, threads_per_process = self.total_cores, 1
+        elif processes is None:
+            processes = max(self.total_cores // threads_per_process, 1)
+        elif threads_per_process is None:
+            threads_per_process = max(self.total_cores // processes, 1)
+        self.processes = int(processes)
+        self.threads_per_process = int(threads_per_process)
+        if self.processes * self.threads_per_process > self.total_cores:
+            logging.warning(f"{self.processes} processes x {self.threads_per_process} threads exceed "
+                            f"the budget of {self.total_cores} cores.")
+
+    def __repr__(self):
+        return (f"CpuBudget(total_cores={self.total_cores}, processes={self.processes}, "
+                f"threads_per_process={self.threads_per_process})")
+
+    def splits(self):
+        """Returns the (processes, threads per process) pairs that use the whole budget."""
+        return [(self.total_cores // threads, threads) for threads in range(1, self.total_cores + 1)
+                if self.total_cores % threads == 0]
+
+    def allows_parallel_wwz(self):
+        """
+        Whether libwwz may run in parallel mode. It starts one job per core of the machine
+        regardless of any limit, which only fits the budget with a single worker process
+        that owns all the cores.
+        """
+        return self.processes == 1 and self.threads_per_process >= available_cores()
+
+    def apply(self):
+        """Limits the thread pools of the current process to the threads per process."""
+        return pin_blas_threads(self.threads_per_process)
+
+
+def _init_benchmark_worker(n_threads):
+    pin_blas_threads(n_threads)
+
+
+def benchmark_splits(task, n_tasks, total_cores=None, splits=None):
+    """
+    Measures the throughput of splits of a core budget.
+
+    For every split, `n_tasks` calls of `task()` are run on a pool of `processes` workers,
+    each limited to `threads` BLAS/OpenMP threads.
+
+    Parameters:
+        task (callable): Picklable function without arguments, e.g. the analysis of one object.
+        n_tasks (int): Number of calls per split, at least the largest number of processes.
+        total_cores (int, optional): Core budget, defaults to the available cores.
+        splits (list, optional): (processes, threads) pairs, defaults to `CpuBudget.splits`.
+
+    Returns:
+        list of dict: One entry per split with 'processes', 'threads', 'seconds' and
+        'tasks_per_second', sorted by decreasing throughput.
+    """
+    budget = CpuBudget(total_cores)
+    results = []
+    for processes, threads in splits or budget.splits():
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_benchmark_worker,
+                                 initargs=(threads,)) as executor:
+            # Start the workers before timing
+            list(executor.map(_noop, range(processes)))
+            start = time.perf_counter()
+            for future in [executor.submit(task) for _ in range(n_tasks)]:
+                future.result()
+            seconds = time.perf_counter() - start
+        results.append({'processes': processes, 'threads': threads, 'seconds': seconds,
+                        'tasks_per_second': n_tasks / seconds})
+        logging.info(f"{processes} processes x {threads} threads: {n_tasks / seconds:.2f} tasks/s")
+    return sorted(results, key=lambda r: -r['tasks_per_second'])
+
+
+def _noop(_):
+    return None
+
+
+def _wavelet_task(ntau, ngrid, minfq, maxfq, n_points, seed=0):
+    """Wavelet analysis and period search of a synthetic light curve, as done for one band."""
+    from QhX.algorithms.wavelets.wwtz import hybrid2d
+    from QhX.calculation import periods
+    rng = np.random.default_rng(seed)
+    tt = np.sort(rng.uniform(0, 3650, n_points))
+    yy = np.sin(2 * np.pi * tt / 500) + rng.normal(0, 0.3, n_points)
+    _, corr, _ = hybrid2d(tt, yy, ntau=ntau, ngrid=ngrid, minfq=minfq, maxfq=maxfq)
+    return periods(0, corr, ngrid=ngrid, minfq=minfq, maxfq=maxfq)
+
+
+def benchmark_grid(ntau=80, ngrid=100, minfq=2000, maxfq=10, n_points=200, n_tasks=None, total_cores=None):
+    """
+    Benchmarks the splits of a core budget on the wavelet analysis of a synthetic light curve
+    with the given grid sizes, to choose the processes x threads split of a run.
+
+    Returns:
+        list of dict: As `benchmark_splits`, the first entry is the throughput-optimal split.
+
+    Example:
+        >>> best = benchmark_grid(ntau=80, ngrid=100)[0]
+        >>> budget = CpuBudget(processes=best['processes'], threads_per_process=best['threads'])
+    """
+    budget = CpuBudget(total_cores)
+    task = partial(_wavelet_task, ntau, ngrid, minfq, maxfq, n_points)
+    return benchmark_splits(task, n_tasks or 2 * budget.total_cores, budget.total_cores)
+
+
+if __name__ == "__main__":
+    import sys
+    ntau = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    ngrid = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    for result in benchmark_grid(ntau, ngrid):
+        print(f"{result['processes']:4d} processes x {result['threads']:3d} threads: "
+              f"{result['tasks_per_second']:.2f} light curves/s")
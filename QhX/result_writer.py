@@ -0,0 +1,239 @@
+"""
+result_writer.py
+
+This module provides a dedicated writer process for solver results.
+
+Workers send the result records (see `QhX.results`) of every processed object over a queue to a
+single writer process, which buffers them and appends them in batches either to one CSV file or to a Parquet dataset
+(a directory with one file per flushed batch). Batches are flushed when they reach a number of
+rows or after a number of seconds, whichever comes first, so results reach the disk regularly
+without creating one small file per object. Once a batch is on disk, the writer records its
+objects as done in the run journal, so a resumed run never skips an object whose results were lost.
+With `acknowledge`, it also reports them back to the solver (see `ResultWriter.written`), which
+can then mark them done elsewhere, e.g. in a job queue.
+
+Classes:
+--------
+- ResultWriter: Handle of the writer process, used by the solver to send result rows.
+"""
+
+import os
+import time
+import queue
+import logging
+import multiprocessing
+import pyarrow.parquet as pq
+from QhX.journal import RunJournal, DONE
+from QhX.results import as_results, concat_results, to_csv_lines, to_arrow
+
+# Default number of rows buffered before they are written
+DEFAULT_BATCH_ROWS = 10000
+# Default number of seconds after which buffered rows are written anyway
+DEFAULT_FLUSH_SECONDS = 30.0
+# Supported output formats
+FORMATS = ('csv', 'parquet')
+# Message asking the writer process to write its buffered rows now
+FLUSH = 'flush'
+# Seconds between checks that the writer process is alive while waiting for it
+WAIT_SECONDS = 0.5
+
+
+def infer_format(path):
+    """Returns 'parquet' for paths ending with '.parquet', otherwise 'csv'."""
+    return 'parquet' if str(path).rstrip('/').endswith('.parquet') else 'csv'
+
+
+class _CsvSink:
+    """Appends batches of records to a single CSV file."""
+
+    def __init__(self, path, header, append):
+        append = append and os.path.isfile(path)
+        self.file = open(path, 'a' if append else 'w')
+        if not append and header:
+            self.file.write(header)
+            self.file.flush()
+
+    def write(self, records):
+        self.file.write(to_csv_lines(records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink:
+    """Writes every batch of records as a new file of a Parquet dataset directory."""
+
+    def __init__(self, path, append):
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for name in os.listdir(path):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(path, name))
+        self.path = path
+        self.session = f'{int(time.time())}-{os.getpid()}'
+        self.sequence = 0
+
+    def write(self, records):
+        name = f'part-{self.session}-{self.sequence:05d}.parquet'
+        tmp_path = os.path.join(self.path, f'.{name}.tmp')
+        pq.write_table(to_arrow(records), tmp_path)
+        # Renamed once complete, so readers of the dataset never see a partial file
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self.sequence += 1
+
+    def close(self):
+        pass
+
+
+def _writer_loop(messages, path, result_format, header, append, batch_rows, flush_seconds, journal_path,
+                 acks=None):
+    """
+    Body of the writer process: buffers records and writes them in batches until it gets None.
+    The set IDs of every batch written are sent on `acks`, if given, with whether FLUSH asked for it.
+    """
+    sink = _ParquetSink(path, append) if result_format == 'parquet' else _CsvSink(path, header, append)
+    journal = RunJournal(journal_path).open() if journal_path is not None else None
+    batches, set_ids = [], []
+    n_rows = 0
+    last_flush = time.monotonic()
+
+    def flush(requested=False):
+        if n_rows:
+            sink.write(concat_results(batches))
+        # Only objects whose rows are on disk are recorded as done
+        if journal is not None:
+            for set_id in set_ids:
+                journal.record(set_id, DONE)
+        if acks is not None and (set_ids or requested):
+            acks.put((list(set_ids), requested))
+        batches.clear()
+        set_ids.clear()
+
+    try:
+        while True:
+            try:
+                message = messages.get(timeout=max(flush_seconds - (time.monotonic() - last_flush), 0.01))
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            if message == FLUSH:
+                flush(requested=True)
+                n_rows = 0
+                last_flush = time.monotonic()
+                continue
+            if message:
+                set_id, records = message
+                set_ids.append(set_id)
+                batches.append(records)
+                n_rows += len(records)
+            if n_rows >= batch_rows or time.monotonic() - last_flush >= flush_seconds:
+                flush()
+                n_rows = 0
+                last_flush = time.monotonic()
+        flush()
+    finally:
+        sink.close()
+        if journal is not None:
+            journal.close()
+
+
+class ResultWriter:
+    """
+    Handle of a process writing result records to a CSV file or a Parquet dataset.
+
+    Attributes:
+        path (str): CSV file, or directory of the Parquet dataset.
+        result_format (str): 'csv' or 'parquet', inferred from the path if not given.
+        header (str): Header line of a new CSV file.
+        append (bool): Append to existing results instead of replacing them.
+        batch_rows (int): Number of buffered rows that triggers a write.
+        flush_seconds (float): Maximum time rows stay buffered.
+        journal_path (str): Run journal in which written objects are recorded as done.
+        acknowledge (bool): Report the set IDs of the rows written, see `written` and `flush`.
+    """
+
+    def __init__(self, path, result_format=None, header='', append=False, batch_rows=DEFAULT_BATCH_ROWS,
+                 flush_seconds=DEFAULT_FLUSH_SECONDS, journal_path=None, acknowledge=False):
+        self.path = path
+        self.result_format = result_format or infer_format(path)
+        if self.result_format not in FORMATS:
+            raise ValueError(f"Unknown result format: {self.result_format}")
+        self.header = header
+        self.append = append
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.journal_path = journal_path
+        self.acknowledge = acknowledge
+        self.messages_ = None
+        self.acks_ = None
+        self.written_ = []
+        self.process_ = None
+
+    def start(self):
+        """Starts the writer process."""
+        self.messages_ = multiprocessing.Queue()
+        self.acks_ = multiprocessing.Queue() if self.acknowledge else None
+        self.process_ = multiprocessing.Process(
+            target=_writer_loop,
+            args=(self.messages_, self.path, self.result_format, self.header, self.append,
+                  self.batch_rows, self.flush_seconds, self.journal_path, self.acks_),
+            daemon=True)
+        self.process_.start()
+        logging.info(f"Result writer started for {self.path} ({self.result_format}).")
+        return self
+
+    def put(self, set_id, rows):
+        """Sends the result records (or rows accepted by `as_results`) of one object to the writer."""
+        self.messages_.put((set_id, as_results(rows)))
+
+    def _receive_acks(self, until_flush=False):
+        """Collects the set IDs reported written, waiting for the answer to FLUSH if `until_flush`."""
+        while True:
+            try:
+                set_ids, requested = self.acks_.get(timeout=WAIT_SECONDS if until_flush else 0)
+            except queue.Empty:
+                if not until_flush or not self.process_.is_alive():
+                    return
+                continue
+            self.written_.extend(set_ids)
+            if until_flush and requested:
+                return
+
+    def written(self):
+        """
+        Returns the set IDs whose rows were written (and journaled) since the last call.
+        Requires `acknowledge`.
+        """
+        if self.acks_ is not None and self.process_ is not None:
+            self._receive_acks()
+        written, self.written_ = self.written_, []
+        return written
+
+    def flush(self):
+        """Writes the buffered rows now and waits until they are on disk. Requires `acknowledge`."""
+        if self.acks_ is None:
+            raise ValueError("Flushing a result writer requires acknowledge=True")
+        if self.process_ is not None:
+            self.messages_.put(FLUSH)
+            self._receive_acks(until_flush=True)
+
+    def close(self):
+        """Writes the remaining rows and stops the writer process."""
+        if self.process_ is not None:
+            if self.acks_ is not None:
+                # The writer reports its last rows before it exits, see `written`
+                self.flush()
+            self.messages_.put(None)
+            self.process_.join()
+            if self.process_.exitcode != 0:
+                logging.error(f"Result writer for {self.path} exited with code {self.process_.exitcode}.")
+            self.process_ = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
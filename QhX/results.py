@@ -0,0 +1,118 @@
+"""
+results.py
+
+This module defines the columnar record type of detection results.
+
+The detectors return one record per band pair (and per common period) as a NumPy structured
+array of dtype `RESULT_DTYPE`. Records are cheap to concatenate, pickle as a single buffer when
+they are sent between processes, and convert to CSV lines, DataFrames or Arrow tables without
+parsing. CSV output keeps the historical column names of `CSV_COLUMNS`, Parquet output uses
+the field names of `RESULT_FIELDS`.
+
+Functions:
+----------
+- as_results: Converts result rows (dicts, tuples or records) to a record array.
+- concat_results: Concatenates record arrays.
+- to_csv_lines: Formats records as CSV lines.
+- to_dataframe: Converts records to a DataFrame with field or CSV column names.
+- to_arrow: Converts records to an Arrow table.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Field names of result records, in column order
+RESULT_FIELDS = ('objectid', 'sampling_i', 'sampling_j', 'period', 'upper_error', 'lower_error', 'significance', 'label')
+# Column names of the CSV results, in the same order
+CSV_COLUMNS = ('ID', 'Sampling_1', 'Sampling_2', 'Common period (Band1 & Band2)', 'Upper error bound',
+               'Lower error bound', 'Significance', 'Band1-Band2')
+# Maximum length of an object ID in result records
+OBJECTID_LENGTH = 64
+# Object IDs are stored as strings, they are integers in some catalogs and strings in others
+RESULT_DTYPE = np.dtype([
+    ('objectid', f'U{OBJECTID_LENGTH}'),
+    ('sampling_i', 'f8'),
+    ('sampling_j', 'f8'),
+    ('period', 'f8'),
+    ('upper_error', 'f8'),
+    ('lower_error', 'f8'),
+    ('significance', 'f8'),
+    ('label', 'U16'),
+])
+
+
+def _check_objectids(objectids):
+    """Raises ValueError if an object ID is longer than the objectid field, instead of truncating it."""
+    too_long = [objectid for objectid in objectids if len(objectid) > OBJECTID_LENGTH]
+    if too_long:
+        raise ValueError(f"Object ID {too_long[0]!r} is longer than {OBJECTID_LENGTH} characters.")
+
+
+def as_results(rows):
+    """
+    Converts result rows to a record array of dtype `RESULT_DTYPE`.
+
+    Object IDs are stored in their string form, e.g. 1234 becomes '1234', whatever their type in
+    the catalog.
+
+    Parameters:
+        rows: A record array, or an iterable of dicts keyed by `RESULT_FIELDS` or of tuples
+            in field order. None gives an empty array.
+
+    Returns:
+        np.ndarray: Structured array of dtype `RESULT_DTYPE`.
+
+    Raises:
+        ValueError: If an object ID is longer than `OBJECTID_LENGTH` characters.
+    """
+    if rows is None:
+        return np.empty(0, dtype=RESULT_DTYPE)
+    if isinstance(rows, np.ndarray) and rows.dtype.names is not None:
+        if rows.dtype == RESULT_DTYPE:
+            return rows
+        _check_objectids([str(objectid) for objectid in rows['objectid']])
+        return rows.astype(RESULT_DTYPE)
+    values = [tuple(row[field] for field in RESULT_FIELDS) if isinstance(row, dict) else tuple(row)
+              for row in rows]
+    # Object IDs may be integers, they are stored as their string form
+    objectids = [str(row[0]) for row in values]
+    _check_objectids(objectids)
+    return np.array([(objectid,) + row[1:] for objectid, row in zip(objectids, values)], dtype=RESULT_DTYPE)
+
+
+def concat_results(records):
+    """Concatenates an iterable of record arrays (or rows accepted by `as_results`)."""
+    records = [as_results(r) for r in records]
+    return np.concatenate(records) if records else as_results(None)
+
+
+def to_csv_lines(records):
+    """
+    Formats records as CSV lines, without a header, in the format of the historical results files.
+    """
+    return ''.join(','.join(str(v) for v in row) + '\n' for row in as_results(records).tolist())
+
+
+def to_dataframe(records, csv_columns=False):
+    """
+    Converts records to a DataFrame.
+
+    Parameters:
+        records: Rows accepted by `as_results`.
+        csv_columns (bool): Name the columns with `CSV_COLUMNS` instead of `RESULT_FIELDS`.
+
+    Returns:
+        pd.DataFrame: One row per record.
+    """
+    records = as_results(records)
+    df = pd.DataFrame({field: records[field] for field in RESULT_FIELDS})
+    if csv_columns:
+        df.columns = list(CSV_COLUMNS)
+    return df
+
+
+def to_arrow(records):
+    """Converts records to an Arrow table with the `RESULT_FIELDS` column names."""
+    records = as_results(records)
+    return pa.table({field: pa.array(records[field]) for field in RESULT_FIELDS})
@@ -0,0 +1,170 @@
+"""
+scheduling.py
+
+This module provides cost-aware scheduling of objects for the parallel solvers.
+
+The runtime of an object is dominated by the wavelet transform of each band, which scales with
+the number of points times the size of the (tau, frequency) grid, and by the correlation of the
+wavelet maps, which scales with the grid size alone. `CostModel` predicts runtimes from these
+features, computed from the point counts per band of a data manager, so solvers can dispatch
+the longest objects first and no long light curve is left running alone at the end of a batch.
+Runtimes observed during a run refine the model by least squares.
+
+Classes:
+--------
+- CostModel: Linear runtime model of an object's point counts, number of bands and grid size.
+"""
+
+import json
+import logging
+from collections import deque
+import numpy as np
+
+# Grid sizes assumed when the solver leaves them to the defaults of the process function
+DEFAULT_NTAU = 80
+DEFAULT_NGRID = 800
+# Feature names of the linear model
+FEATURES = ('constant', 'bands', 'wwz', 'correlation')
+# Initial coefficients in seconds per feature unit, refined by `CostModel.refine`
+DEFAULT_COEFFICIENTS = (0.1, 0.5, 2e-7, 5e-8)
+# Number of most recent observations kept for inspection and saving, the fit uses all of them
+DEFAULT_MAX_OBSERVATIONS = 10000
+
+
+class CostModel:
+    """
+    Linear model predicting the processing time of an object.
+
+    The features of an object with point counts n_b in its bands are:
+
+    - constant: 1
+    - bands: number of bands with data
+    - wwz: sum(n_b) * ntau * ngrid, the cost of the wavelet transforms
+    - correlation: number of bands * ntau * ngrid ** 2, the cost of correlating the wavelet maps
+
+    Attributes:
+        ntau (int): Number of time divisions used by the solver.
+        ngrid (int): Number of frequency grid points used by the solver.
+        coefficients (np.ndarray): Seconds per unit of each feature.
+        observations (deque): The most recent (features, seconds) pairs recorded from processed objects.
+        max_observations (int): Number of observations kept.
+        n_observations (int): Number of observations the coefficients are fitted to.
+    """
+
+    def __init__(self, ntau=None, ngrid=None, coefficients=DEFAULT_COEFFICIENTS,
+                 max_observations=DEFAULT_MAX_OBSERVATIONS):
+        self.ntau = ntau or DEFAULT_NTAU
+        self.ngrid = ngrid or DEFAULT_NGRID
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.max_observations = max_observations
+        self.observations = deque(maxlen=max_observations)
+        self.n_observations = 0
+        # Normal equations of the least squares fit, accumulated as observations are recorded
+        self._xtx = np.zeros((len(FEATURES), len(FEATURES)))
+        self._xty = np.zeros(len(FEATURES))
+        self._scale = np.zeros(len(FEATURES))
+
+    def features(self, counts):
+        """
+        Return the feature matrix of objects given their point counts per band.
+
+        Parameters:
+            counts (pd.DataFrame): Point counts indexed by object ID with one column per band,
+                as returned by `DataManager.point_counts`.
+
+        Returns:
+            np.ndarray: Array of shape (n_objects, len(FEATURES)).
+        """
+        points = counts.to_numpy(dtype=float)
+        n_bands = (points > 0).sum(axis=1)
+        grid = self.ntau * self.ngrid
+        return np.column_stack([np.ones(len(points)), n_bands, points.sum(axis=1) * grid,
+                                n_bands * grid * self.ngrid])
+
+    def predict(self, object_ids, counts):
+        """
+        Return the predicted runtime in seconds of each object, 0 for objects without data.
+        """
+        counts = counts.reindex(list(object_ids), fill_value=0)
+        features = self.features(counts)
+        return np.where(features[:, 1] > 0, features @ self.coefficients, 0.0)
+
+    def order(self, object_ids, counts):
+        """
+        Return the object IDs sorted by decreasing predicted runtime (longest first).
+        Objects with equal predictions keep their input order.
+        """
+        object_ids = list(object_ids)
+        predicted = self.predict(object_ids, counts)
+        return [object_ids[i] for i in np.argsort(-predicted, kind='stable')]
+
+    def record(self, object_id, counts, seconds):
+        """
+        Record the observed runtime of an object and refine the model.
+
+        Parameters:
+            object_id: The processed object ID.
+            counts (pd.DataFrame): Point counts per band, see `features`.
+            seconds (float): Observed processing time.
+        """
+        if object_id not in counts.index:
+            return
+        self._add(self.features(counts.loc[[object_id]])[0], float(seconds))
+        self.refine()
+
+    def _add(self, features, seconds):
+        """Adds an observation to the normal equations and to the kept observations."""
+        self.observations.append((features, seconds))
+        self.n_observations += 1
+        self._xtx += np.outer(features, features)
+        self._xty += features * seconds
+        self._scale = np.maximum(self._scale, np.abs(features))
+
+    def refine(self):
+        """
+        Refit the coefficients to all recorded runtimes by least squares.
+
+        The fit solves the accumulated normal equations, so its cost does not grow with the
+        number of observations. Nothing changes until there are at least as many observations
+        as features. Negative coefficients are clipped to zero, so predictions grow with the features.
+        """
+        if self.n_observations < len(FEATURES):
+            return self.coefficients
+        # Scale the columns, the raw features span many orders of magnitude
+        scale = np.where(self._scale > 0, self._scale, 1.0)
+        solution = np.linalg.lstsq(self._xtx / np.outer(scale, scale), self._xty / scale, rcond=None)[0] / scale
+        self.coefficients = np.clip(solution, 0, None)
+        return self.coefficients
+
+    def save(self, path):
+        """
+        Save the grid sizes, coefficients, kept observations and normal equations to a JSON file.
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                'ntau': self.ntau,
+                'ngrid': self.ngrid,
+                'coefficients': self.coefficients.tolist(),
+                'observations': [(features.tolist(), seconds) for features, seconds in self.observations],
+                'n_observations': self.n_observations,
+                'xtx': self._xtx.tolist(),
+                'xty': self._xty.tolist(),
+                'scale': self._scale.tolist()
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a cost model saved with `save`.
+        """
+        with open(path) as f:
+            state = json.load(f)
+        model = cls(state['ntau'], state['ngrid'], state['coefficients'])
+        for features, seconds in state['observations']:
+            model._add(np.asarray(features, dtype=float), seconds)
+        if 'xtx' in state:
+            # The fit covers all observations, not only the kept ones
+            model.n_observations = state['n_observations']
+            model._xtx, model._xty, model._scale = (np.asarray(state[key]) for key in ('xtx', 'xty', 'scale'))
+        logging.info(f"Cost model loaded from {path} with {len(model.observations)} observations.")
+        return model
@@ -0,0 +1,264 @@
+"""
+sharding.py
+
+This module provides static sharding of a catalogue for multi-node runs without a coordinator.
+
+Every object ID is assigned to one of K shards by a stable hash of its string form, so each node
+running shard `i/K` can compute its objects on its own, load only them from the Parquet file
+(filter pushdown) and process them. When a shard completes, it writes a manifest with its object
+IDs, the IDs completed and failed, the checksums of its result files and its timings. The merge
+step reads the manifests of all K shards and refuses to merge unless every object is accounted for
+and every result file is intact.
+
+Functions:
+----------
+- parse_shard: Parses a 'i/K' shard specification.
+- shard_of: Returns the shard of an object ID.
+- select_shard: Returns the object IDs assigned to a shard.
+- read_object_ids: Reads the unique object IDs of a Parquet file, reading only the ID column.
+- result_files_of: Lists the files of a results path (CSV file or Parquet dataset directory).
+- write_manifest: Writes the manifest of a completed shard.
+- verify_manifests: Checks the manifests of all shards for completeness and integrity.
+- merge_shards: Verifies the manifests and merges the result files of all shards.
+- find_manifests: Finds the shard manifests below a directory.
+
+Example usage as a script:
+    $ python sharding.py runs merged_result.csv ForcedSourceTable.parquet
+    Verifies the manifests found below 'runs' against the object IDs of the catalogue and merges
+    the results of all shards. The catalogue defaults to 'ForcedSourceTable.parquet'.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Name of the manifest written in the directory of a shard
+MANIFEST_FILE = 'manifest.json'
+# Version of the manifest format
+MANIFEST_VERSION = 1
+# Block size used to checksum result files
+CHECKSUM_BLOCK_BYTES = 1 << 20
+
+
+def parse_shard(spec):
+    """
+    Parses a shard specification 'i/K' (shard i of K, 0 <= i < K).
+
+    Returns:
+        tuple: (i, K) as integers.
+
+    Raises:
+        ValueError: If the specification is malformed or out of range.
+    """
+    try:
+        index, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected 'i/K'") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', expected 0 <= i < K")
+    return index, count
+
+
+def shard_of(object_id, n_shards):
+    """
+    Returns the shard of an object ID. The hash depends only on the string form of the ID,
+    so it is the same on every node, Python version and run (unlike the built-in `hash`).
+    """
+    digest = hashlib.blake2b(str(object_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % n_shards
+
+
+def select_shard(object_ids, shard, n_shards):
+    """Returns the object IDs assigned to a shard, in their input order."""
+    return [object_id for object_id in object_ids if shard_of(object_id, n_shards) == shard]
+
+
+def read_object_ids(path, key='objectId'):
+    """
+    Reads the unique object IDs of a Parquet file in order of first appearance.
+    Only the ID column is read.
+    """
+    return pd.unique(pq.read_table(path, columns=[key]).column(key).to_pandas()).tolist()
+
+
+def file_checksum(path):
+    """Returns the SHA-256 hex digest of a file."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_BYTES), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def result_files_of(path):
+    """
+    Returns the files holding the results written to `path`: the file itself for CSV results,
+    the part files of the dataset for Parquet results (a directory), nothing if it does not exist.
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet'))
+    return [path] if os.path.isfile(path) else []
+
+
+def _read_results(path):
+    """Reads a CSV or Parquet result file."""
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+
+
+def _result_entry(path):
+    """Checksum, size and number of data rows of a CSV or Parquet result file."""
+    if path.endswith('.parquet'):
+        rows = pq.ParquetFile(path).metadata.num_rows
+    else:
+        with open(path, 'rb') as f:
+            rows = max(sum(1 for _ in f) - 1, 0)  # Without the header
+    return {'sha256': file_checksum(path), 'bytes': os.path.getsize(path), 'rows': rows}
+
+
+def write_manifest(directory, shard, n_shards, object_ids, completed, failed, result_files, timings):
+    """
+    Writes the manifest of a shard to `directory/MANIFEST_FILE`.
+
+    Parameters:
+        directory (str): Directory of the shard, result file paths are stored relative to it.
+        shard (int), n_shards (int): The shard and the number of shards.
+        object_ids (list): Object IDs assigned to the shard.
+        completed (iterable): Object IDs whose results were written.
+        failed (iterable): Object IDs that failed.
+        result_files (list): Paths of the result files of the shard (CSV files or Parquet part files).
+        timings (dict): Timings of the shard, e.g. start and end times and seconds per batch.
+
+    Returns:
+        str: Path of the manifest.
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'shard': shard,
+        'n_shards': n_shards,
+        'host': socket.gethostname(),
+        'n_objects': len(object_ids),
+        'object_ids': [str(object_id) for object_id in object_ids],
+        'completed': sorted(str(object_id) for object_id in completed),
+        'failed': sorted(str(object_id) for object_id in failed),
+        'results': {os.path.relpath(path, directory): _result_entry(path) for path in result_files},
+        'timings': timings,
+    }
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    # The manifest marks a finished shard, so it must never be seen half written
+    os.replace(tmp_path, path)
+    return path
+
+
+def verify_manifests(manifest_paths, object_ids=None, check_files=True):
+    """
+    Checks the manifests of all shards of a run.
+
+    The checks are: all K shards are present once, every object ID belongs to the shard that
+    lists it, every object of a shard is completed or failed, result files have the recorded
+    checksums, and (if `object_ids` is given) the shards together cover exactly these objects.
+
+    Returns:
+        list of str: Problems found, empty if the run is complete and intact.
+    """
+    problems = []
+    manifests = []
+    for path in manifest_paths:
+        with open(path) as f:
+            manifests.append((path, json.load(f)))
+    if not manifests:
+        return ['No manifests found']
+
+    n_shards = {manifest['n_shards'] for _, manifest in manifests}
+    if len(n_shards) != 1:
+        return [f'Manifests disagree on the number of shards: {sorted(n_shards)}']
+    n_shards = n_shards.pop()
+    shards = [manifest['shard'] for _, manifest in manifests]
+    missing = sorted(set(range(n_shards)) - set(shards))
+    if missing:
+        problems.append(f'Missing shards {missing} of {n_shards}')
+    duplicated = sorted({shard for shard in shards if shards.count(shard) > 1})
+    if duplicated:
+        problems.append(f'Shards {duplicated} have several manifests')
+
+    assigned = set()
+    for path, manifest in manifests:
+        shard = manifest['shard']
+        ids = manifest['object_ids']
+        misplaced = [object_id for object_id in ids if shard_of(object_id, n_shards) != shard]
+        if misplaced:
+            problems.append(f'Shard {shard}: {len(misplaced)} object IDs belong to other shards')
+        unfinished = set(ids) - set(manifest['completed']) - set(manifest['failed'])
+        if unfinished:
+            problems.append(f'Shard {shard}: {len(unfinished)} object IDs neither completed nor failed')
+        assigned.update(ids)
+        if check_files:
+            directory = os.path.dirname(path)
+            for name, entry in manifest['results'].items():
+                result_path = os.path.join(directory, name)
+                if not os.path.isfile(result_path):
+                    problems.append(f'Shard {shard}: result file {name} is missing')
+                elif file_checksum(result_path) != entry['sha256']:
+                    problems.append(f'Shard {shard}: result file {name} does not match its checksum')
+
+    if object_ids is not None:
+        expected = {str(object_id) for object_id in object_ids}
+        if expected - assigned:
+            problems.append(f'{len(expected - assigned)} object IDs are not in any shard')
+        if assigned - expected:
+            problems.append(f'{len(assigned - expected)} object IDs in the shards are not in the catalogue')
+    return problems
+
+
+def merge_shards(manifest_paths, output_file, object_ids=None):
+    """
+    Verifies the manifests of all shards and merges their result files into one CSV file.
+
+    Raises:
+        ValueError: If the verification finds problems, listed in the message.
+
+    Returns:
+        pd.DataFrame: The merged results.
+    """
+    problems = verify_manifests(manifest_paths, object_ids)
+    if problems:
+        raise ValueError('Shards are incomplete:\n' + '\n'.join(problems))
+    frames = []
+    for path in sorted(manifest_paths):
+        with open(path) as f:
+            manifest = json.load(f)
+        for name in sorted(manifest['results']):
+            frames.append(_read_results(os.path.join(os.path.dirname(path), name)))
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    merged.to_csv(output_file, index=False)
+    print(f"Merged {len(frames)} result files of {len(manifest_paths)} shards into '{output_file}'.")
+    return merged
+
+
+def find_manifests(directory='.'):
+    """Returns the paths of all shard manifests below a directory."""
+    return sorted(os.path.join(root, MANIFEST_FILE) for root, _, files in os.walk(directory)
+                  if MANIFEST_FILE in files)
+
+
+if __name__ == "__main__":
+    # Verify and merge the shards found below a directory
+    directory = sys.argv[1] if len(sys.argv) > 1 else '.'
+    output_file = sys.argv[2] if len(sys.argv) > 2 else 'merged_result.csv'
+    catalogue = sys.argv[3] if len(sys.argv) > 3 else 'ForcedSourceTable.parquet'
+    if not os.path.isfile(catalogue):
+        # Without the catalogue, objects missing from every shard could not be detected
+        sys.exit(f"Catalogue '{catalogue}' not found, pass its path as the third argument.")
+    start = time.perf_counter()
+    try:
+        merge_shards(find_manifests(directory), output_file, read_object_ids(catalogue))
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Done in {time.perf_counter() - start:.1f} s.")
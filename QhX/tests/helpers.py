@@ -0,0 +1,23 @@
+"""
+Shared fixtures of the test suite, so test modules do not import from each other.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def create_forced_source_data(num_objects=5, num_measurements=120, seed=42):
+    """Synthetic forced source table with shuffled rows and a few NaN magnitudes."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for obj in range(num_objects):
+        frames.append(pd.DataFrame({
+            'objectId': obj + 1,
+            'mjd': rng.uniform(50000, 53000, num_measurements),
+            'psMag': rng.normal(20.0, 0.3, num_measurements),
+            'psMagErr': rng.uniform(0.02, 0.1, num_measurements),
+            'filter': rng.integers(0, 4, num_measurements)
+        }))
+    df = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+    df.loc[df.index[::37], 'psMag'] = np.nan
+    return df
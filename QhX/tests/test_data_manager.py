@@ -0,0 +1,171 @@
+import io
+import os
+import contextlib
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from QhX.data_manager import DataManager
+from QhX.dynamical_mode import DataManagerDynamical
+from QhX.data_manager_dask import DaskDataManager
+from QhX.parallelization_solver import ParallelSolver
+from QhX.light_curve import get_lc22, is_precleaned
+from QhX.tests.helpers import create_forced_source_data
+
+
+class TestDataManagerLoading(unittest.TestCase):
+    """
+    Test suite for DataManager and DataManagerDynamical loading and selection.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = create_forced_source_data(num_objects=8)
+        self.path = os.path.join(self.tmp_dir, 'fs.parquet')
+        self.df.sort_values('objectId').to_parquet(self.path, row_group_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pushdown_subset(self):
+        data_manager = DataManager()
+        fs_df = data_manager.load_fs_df(self.path, object_ids=[2, 5], filters=[1, 3], columns=['mjd', 'psMag'])
+        self.assertListEqual(list(fs_df.columns), ['objectId', 'filter', 'mjd', 'psMag'])
+        self.assertSetEqual(set(fs_df['objectId']), {2, 5})
+        self.assertSetEqual(set(fs_df['filter']), {1, 3})
+        expected = self.df[self.df['objectId'].isin([2, 5]) & self.df['filter'].isin([1, 3])]
+        self.assertEqual(len(fs_df), len(expected))
+
+    def test_pushdown_with_mappings(self):
+        self.df.rename(columns={'psMag': 'flux', 'objectId': 'source_id'}).to_parquet(self.path)
+        data_manager = DataManagerDynamical(column_mapping={'flux': 'psMag', 'source_id': 'objectId'},
+                                            filter_mapping={0: 'u', 1: 'g', 2: 'r', 3: 'i'})
+        df = data_manager.load_data(self.path, object_ids=[7], filters=['g'], columns=['mjd', 'psMag'])
+        self.assertListEqual(list(df.columns), ['objectId', 'filter', 'mjd', 'psMag'])
+        self.assertTrue((df['objectId'] == 7).all())
+        self.assertTrue((df['filter'] == 'g').all())
+
+    def test_compact_dtypes(self):
+        self.df.assign(objectId=self.df['objectId'].astype(str)).to_parquet(self.path)
+        data_manager = DataManager()
+        fs_df = data_manager.load_fs_df(self.path, compact=True)
+        self.assertEqual(fs_df['psMag'].dtype, np.float32)
+        self.assertEqual(fs_df['psMagErr'].dtype, np.float32)
+        self.assertEqual(fs_df['mjd'].dtype, np.float64)
+        self.assertEqual(fs_df['filter'].dtype, np.int8)
+        self.assertEqual(fs_df['objectId'].dtype, np.int64)
+        self.assertLess(fs_df.memory_usage(deep=True).sum(), self.df.memory_usage(deep=True).sum())
+
+        data_manager = DataManagerDynamical(filter_mapping={0: 'u', 1: 'g', 2: 'r', 3: 'i'})
+        df = data_manager.load_data(self.path, compact=True)
+        self.assertIsInstance(df['filter'].dtype, pd.CategoricalDtype)
+
+    def test_reload(self):
+        # Light curves come from the new table after a reload, not from the index of the old one
+        shifted_path = os.path.join(self.tmp_dir, 'shifted.parquet')
+        self.df.assign(psMag=self.df['psMag'] + 100).to_parquet(shifted_path)
+        data_manager = DataManager()
+        data_manager.load_fs_df(self.path)
+        data_manager.group_fs_df()
+        data_manager.build_lc_index()
+        data_manager.load_fs_df(shifted_path)
+        data_manager.group_fs_df()
+        self.assertIsNone(data_manager.lc_index)
+        self.assertGreater(np.mean(get_lc22(data_manager, 3, include_errors=False)[1]), 110)
+
+        # Bulk cleaning of the old table does not carry over, the new one is cleaned per object
+        data_manager.remove_outliers()
+        self.assertTrue(is_precleaned(data_manager))
+        data_manager.load_fs_df(self.path)
+        self.assertFalse(is_precleaned(data_manager))
+
+        data_manager = DataManagerDynamical()
+        data_manager.load_data(self.path)
+        data_manager.group_data()
+        data_manager.build_lc_index()
+        data_manager.load_data(shifted_path)
+        data_manager.group_data()
+        self.assertIsNone(data_manager.lc_index)
+        self.assertGreater(np.mean(get_lc22(data_manager, 3, include_errors=False)[1]), 110)
+        data_manager.remove_outliers()
+        data_manager.load_data(self.path)
+        self.assertFalse(is_precleaned(data_manager))
+
+    def test_bulk_cleaning_default(self):
+        # By default the bulk cleaning rejects the points the per-object cleaning of the fixed mode rejects
+        data_manager = DataManager()
+        data_manager.load_fs_df(self.path)
+        data_manager.group_fs_df()
+        expected = get_lc22(data_manager, 3, include_errors=False)
+        data_manager.remove_outliers()
+        self.assertTrue(is_precleaned(data_manager))
+        for e, a in zip(expected, get_lc22(data_manager, 3, include_errors=False)):
+            np.testing.assert_array_equal(e, a)
+
+        # A cleaning that does not match the mode of the solver is reported
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ParallelSolver(num_workers=1, data_manager=data_manager).check_cleaning()
+        self.assertNotIn('Warning', output.getvalue())
+        with contextlib.redirect_stdout(output):
+            ParallelSolver(num_workers=1, data_manager=data_manager, mode='dynamical').check_cleaning()
+        self.assertIn('use_errors=False', output.getvalue())
+
+    def test_get_qso(self):
+        data_manager = DataManager()
+        data_manager.load_fs_df(self.path)
+        data_manager.group_fs_df()
+        object_ids = [5, 3, 1, 99]
+        for min_points in (15, 25, 30):
+            expected = [obj_id for obj_id in object_ids if obj_id in data_manager.fs_gp.groups and all(
+                len(data_manager.fs_gp.get_group(obj_id).query('filter == @f').dropna()) >= min_points
+                for f in range(1, 4))]
+            self.assertListEqual(data_manager.get_qso(object_ids, min_points, bands=range(1, 4)), expected)
+            data_manager.build_lc_index()
+            self.assertListEqual(data_manager.get_qso(object_ids, min_points, bands=range(1, 4)), expected)
+            data_manager.lc_index = None
+        self.assertListEqual(data_manager.get_qso(object_ids, 1), [])
+
+        dynamical = DataManagerDynamical()
+        dynamical.load_data(self.path)
+        self.assertListEqual(dynamical.get_qso(object_ids, 1), [5, 3, 1])
+
+    def test_dask_backend(self):
+        data_manager = DaskDataManager(npartitions=3)
+        data_manager.load_fs_df(self.path)
+        data_manager.group_fs_df()
+        self.assertEqual(data_manager.fs_df.npartitions, 3)
+
+        layout = data_manager.partition_layout()
+        self.assertListEqual(sorted(sum(layout.values(), [])), list(range(1, 9)))
+        for i, ids in layout.items():
+            self.assertTrue(all(data_manager.partition_of(obj_id) == i for obj_id in ids))
+        ordered = [data_manager.partition_of(obj_id) for obj_id in data_manager.order_by_partition([8, 2, 5, 1, 3])]
+        self.assertListEqual(ordered, sorted(ordered))
+
+        reference = DataManager()
+        reference.fs_df = self.df
+        reference.group_fs_df()
+        for e, a in zip(get_lc22(reference, 6, include_errors=False), get_lc22(data_manager, 6, include_errors=False)):
+            np.testing.assert_array_equal(e, a)
+        self.assertIsNone(get_lc22(data_manager, 42))
+
+        data_manager.remove_outliers(use_errors=False)
+        reference.remove_outliers(use_errors=False)
+        for e, a in zip(get_lc22(reference, 6, include_errors=False), get_lc22(data_manager, 6, include_errors=False)):
+            np.testing.assert_array_equal(e, a)
+
+        # No full light curve index: exporting a store and sharing memory are refused cleanly
+        self.assertIsNone(data_manager.build_lc_index())
+        self.assertIsNone(data_manager.export_lc_store(os.path.join(self.tmp_dir, 'lc_store')))
+        solver = ParallelSolver(num_workers=1, data_manager=data_manager, share_memory=True)
+        solver.prepare_workers()
+        self.assertIsNone(solver.shared_handle_)
+
+        compact = DaskDataManager().load_fs_df(self.path, compact=True)
+        self.assertEqual(compact['psMag'].dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import time
+import shutil
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from QhX.job_queue import JobQueue, LeaseHeartbeat, PENDING, LEASED, DONE, FAILED
+
+
+class TestJobQueue(unittest.TestCase):
+    """
+    Test suite for the SQLite job queue.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'jobs.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_claim_and_finish(self):
+        queue = JobQueue(self.path)
+        self.assertEqual(queue.add([1, 2, np.int64(3), 'a']), 4)
+        self.assertEqual(JobQueue(self.path).add([1, 5]), 1)  # Existing jobs are kept
+
+        self.assertListEqual(queue.claim('w1', 2), [1, 2])
+        self.assertListEqual(queue.claim('w2', 2), [3, 'a'])
+        self.assertEqual(queue.done('w1', [1, 3]), 1)  # 3 is leased by w2
+        self.assertEqual(queue.fail('w2', [('a', 'ValueError: no data')]), 1)
+        self.assertEqual(queue.release('w2'), 1)
+        self.assertDictEqual(queue.counts(), {PENDING: 2, LEASED: 1, DONE: 1, FAILED: 1})
+        self.assertListEqual(queue.failures(), [('a', 'ValueError: no data')])
+
+        # The queue is usable after pickling to another process
+        queue = pickle.loads(pickle.dumps(queue))
+        self.assertListEqual(queue.claim('w3', 10), [3, 5])
+
+    def test_expired_leases(self):
+        queue = JobQueue(self.path, lease_seconds=0.2, max_attempts=2)
+        queue.add(['x', 'y'])
+        self.assertListEqual(queue.claim('dead', 1), ['x'])
+        with LeaseHeartbeat(queue, 'alive', interval=0.05):
+            self.assertListEqual(queue.claim('alive', 1), ['y'])
+            time.sleep(0.5)
+            # The lease of 'dead' expired and is claimed again, 'alive' kept its lease
+            self.assertListEqual(queue.claim('other', 5), ['x'])
+        time.sleep(0.3)
+        self.assertListEqual(queue.claim('other', 5), ['y'])
+        time.sleep(0.3)
+        # After max_attempts the jobs fail instead of being claimed again
+        self.assertListEqual(queue.claim('other', 5), [])
+        self.assertListEqual(queue.failures(), [('x', 'Lease expired'), ('y', 'Lease expired')])
+        self.assertEqual(queue.retry_failed(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+from QhX.journal import RunJournal, QUEUED, DONE
+
+
+class TestRunJournal(unittest.TestCase):
+    """
+    Test suite for the append-only run journal used to resume solver runs.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'result.csv.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pending_after_crash(self):
+        with RunJournal(self.path) as journal:
+            for set_id in [1, 2, 3]:
+                journal.record(set_id, QUEUED)
+            journal.record(1, DONE)
+            journal.record('3', DONE)
+        # A record cut short by a crash is ignored
+        with open(self.path, 'a') as f:
+            f.write('done\t2')
+
+        journal = RunJournal(self.path)
+        self.assertSetEqual(journal.completed(), {'1', '3'})
+        self.assertListEqual(journal.pending([4, 3, 2, 1]), [4, 2])
+        self.assertListEqual(RunJournal(os.path.join(self.tmp_dir, 'missing')).pending([1]), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
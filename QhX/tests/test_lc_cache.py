@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+from QhX.data_manager import DataManager
+from QhX.light_curve import get_lc22
+from QhX.dynamical_mode import DataManagerDynamical, get_lc_dyn
+from QhX.lc_cache import LightCurveCache
+from QhX.tests.helpers import create_forced_source_data
+
+
+class TestLightCurveCache(unittest.TestCase):
+    """
+    Test suite for the LRU cache of cleaned light curves.
+    """
+
+    def setUp(self):
+        self.df = create_forced_source_data()
+
+    def test_lru_eviction(self):
+        value = {0: (np.zeros(10), np.zeros(10), None)}  # 160 bytes
+        lc_cache = LightCurveCache(max_bytes=400)
+        lc_cache.put('a', value)
+        lc_cache.put('b', {0: (np.zeros(10), np.zeros(10), None)})
+        self.assertIs(lc_cache.get('a'), value)
+        lc_cache.put('c', {0: (np.zeros(10), np.zeros(10), None)})
+        self.assertNotIn('b', lc_cache)
+        self.assertIn('a', lc_cache)
+        self.assertIsNone(lc_cache.get('b'))
+        self.assertFalse(value[0][0].flags.writeable)
+
+        stats = lc_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 1, 1))
+        self.assertEqual(stats['nbytes'], 320)
+
+        lc_cache.put('d', {0: (np.zeros(100), np.zeros(100), None)})
+        self.assertNotIn('d', lc_cache)
+
+    def test_cached_light_curves(self):
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        data_manager.group_fs_df()
+        expected = get_lc22(data_manager, 2, include_errors=False)
+
+        data_manager.enable_cache()
+        for _ in range(3):
+            for e, a in zip(expected, get_lc22(data_manager, 2, include_errors=False)):
+                np.testing.assert_array_equal(e, a)
+        self.assertEqual(data_manager.lc_cache.stats()['hits'], 2)
+        self.assertEqual(data_manager.lc_cache.stats()['misses'], 1)
+
+        # Errors are part of the key, and bulk cleaning drops the stale entries
+        get_lc22(data_manager, 2, include_errors=True)
+        self.assertEqual(len(data_manager.lc_cache), 2)
+        data_manager.remove_outliers()
+        self.assertEqual(len(data_manager.lc_cache), 0)
+
+    def test_cached_light_curves_dynamical(self):
+        data_manager = DataManagerDynamical()
+        data_manager.data_df = self.df
+        data_manager.group_data()
+        data_manager.enable_cache()
+        first = get_lc_dyn(data_manager, 4, include_errors=True)
+        second = get_lc_dyn(data_manager, 4, include_errors=True)
+        self.assertEqual(data_manager.lc_cache.hits, 1)
+        for key in first[0]:
+            np.testing.assert_array_equal(first[0][key], second[0][key])
+            np.testing.assert_array_equal(first[1][key], second[1][key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from QhX.data_manager import DataManager
+from QhX.lc_index import LightCurveIndex
+from QhX.light_curve import get_lc22
+from QhX.dynamical_mode import DataManagerDynamical, get_lc_dyn
+from QhX.tests.helpers import create_forced_source_data
+
+
+def _attached_bands(handle, obj_id):
+    """Attaches to a shared index in a worker process and returns the point counts of an object"""
+    attached = handle.attach()
+    return {str(f): len(mjd) for f, (mjd, _, _) in attached.bands(obj_id).items()}
+
+
+class TestLightCurveIndex(unittest.TestCase):
+    """
+    Test suite checking that the columnar light curve index returns the same
+    light curves as the pandas groupby path.
+    """
+
+    def setUp(self):
+        self.df = create_forced_source_data()
+
+    def test_index_matches_groupby_fixed(self):
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        data_manager.group_fs_df()
+        expected = get_lc22(data_manager, 3, include_errors=False)
+
+        data_manager.build_lc_index()
+        data_manager.fs_gp = None
+        actual = get_lc22(data_manager, 3, include_errors=False)
+
+        for e, a in zip(expected, actual):
+            np.testing.assert_array_equal(e, a)
+        self.assertIsNone(get_lc22(data_manager, 99))
+
+    def test_index_matches_groupby_dynamical(self):
+        data_manager = DataManagerDynamical()
+        data_manager.data_df = self.df
+        data_manager.group_data()
+        expected = get_lc_dyn(data_manager, 2, include_errors=True)
+
+        data_manager.build_lc_index()
+        actual = get_lc_dyn(data_manager, 2, include_errors=True)
+
+        for e, a in zip(expected, actual):
+            self.assertEqual(list(e.keys()), list(a.keys()))
+            for key in e:
+                np.testing.assert_array_equal(e[key], a[key])
+
+    def test_views_are_read_only(self):
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        lc_index = data_manager.build_lc_index()
+        mjd, mag, _ = lc_index.band(1, 0)
+        self.assertTrue(np.all(np.diff(mjd) >= 0))
+        with self.assertRaises(ValueError):
+            mag[0] = 0.
+        counts = lc_index.point_counts()
+        self.assertEqual(counts.values.sum(), len(self.df.dropna()))
+
+    def test_bulk_outlier_removal(self):
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        data_manager.group_fs_df()
+        expected = get_lc22(data_manager, 5, include_errors=False)
+
+        data_manager.remove_outliers(use_errors=False)
+        self.assertLess(len(data_manager.fs_df), len(self.df.dropna()))
+        actual = get_lc22(data_manager, 5, include_errors=False)
+        for e, a in zip(expected, actual):
+            np.testing.assert_array_equal(e, a)
+
+        data_manager.build_lc_index()
+        self.assertEqual(data_manager.lc_index.cleaning, {'threshold_factor': 3.0, 'use_errors': False})
+        for e, a in zip(expected, get_lc22(data_manager, 5, include_errors=False)):
+            np.testing.assert_array_equal(e, a)
+
+        dynamical = DataManagerDynamical()
+        dynamical.data_df = self.df
+        dynamical.group_data()
+        expected = get_lc_dyn(dynamical, 2, include_errors=True)
+        dynamical.remove_outliers(use_errors=True)
+        for e, a in zip(expected, get_lc_dyn(dynamical, 2, include_errors=True)):
+            for key in e:
+                np.testing.assert_array_equal(e[key], a[key])
+
+    def test_store_round_trip(self):
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        store_path = tempfile.mkdtemp()
+        try:
+            data_manager.export_lc_store(store_path)
+            self.assertTrue(os.path.isfile(os.path.join(store_path, 'metadata.json')))
+
+            attached = DataManager()
+            lc_index = attached.load_lc_store(store_path)
+            self.assertIsInstance(lc_index.mjd, np.memmap)
+            expected = data_manager.lc_index.bands(4)
+            actual = lc_index.bands(4)
+            for key in expected:
+                for e, a in zip(expected[key], actual[key]):
+                    np.testing.assert_array_equal(e, a)
+            self.assertIsNotNone(get_lc22(attached, 4, include_errors=True))
+            self.assertIsNone(lc_index.cleaning)
+        finally:
+            shutil.rmtree(store_path)
+
+    def test_store_string_filters(self):
+        df = self.df.assign(filter=self.df['filter'].map({0: 'u', 1: 'g', 2: 'r', 3: 'i'}))
+        lc_index = LightCurveIndex.from_frame(df)
+        store_path = os.path.join(tempfile.mkdtemp(), 'store')
+        try:
+            lc_index.save(store_path)
+            loaded = LightCurveIndex.load(store_path)
+            self.assertListEqual(loaded.filters.tolist(), ['g', 'i', 'r', 'u'])
+            for key, (mjd, mag, err) in lc_index.bands(2).items():
+                np.testing.assert_array_equal(loaded.band(2, key)[1], mag)
+
+            # Object arrays are refused before anything is written
+            lc_index.filters = lc_index.filters.astype(object)
+            shutil.rmtree(store_path)
+            with self.assertRaises(ValueError):
+                lc_index.save(store_path)
+            self.assertFalse(os.path.exists(store_path))
+        finally:
+            shutil.rmtree(os.path.dirname(store_path))
+
+    def test_shared_memory_round_trip(self):
+        import pickle
+        data_manager = DataManager()
+        data_manager.fs_df = self.df
+        lc_index = data_manager.build_lc_index()
+        handle = lc_index.to_shared_memory()
+        try:
+            attached = pickle.loads(pickle.dumps(handle)).attach()
+            self.assertEqual(len(attached), len(lc_index))
+            expected = lc_index.bands(3)
+            actual = attached.bands(3)
+            for key in expected:
+                for e, a in zip(expected[key], actual[key]):
+                    np.testing.assert_array_equal(e, a)
+            with self.assertRaises(ValueError):
+                attached.mag[0] = 0.
+            del attached, actual
+        finally:
+            handle.unlink()
+
+    def test_shared_memory_string_filters(self):
+        import multiprocessing
+        df = self.df.assign(filter=self.df['filter'].map({0: 'u', 1: 'g', 2: 'r', 3: 'i'}).astype('category'))
+        lc_index = LightCurveIndex.from_frame(df)
+        self.assertEqual(lc_index.filters.dtype.kind, 'U')
+        handle = lc_index.to_shared_memory()
+        try:
+            # A spawned worker reads the filters from the shared block, not from the parent's objects
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                counts = pool.apply_async(_attached_bands, (handle, 3)).get(timeout=60)
+            self.assertDictEqual(counts, {str(f): len(v[0]) for f, v in lc_index.bands(3).items()})
+            self.assertIn('g', counts)
+        finally:
+            handle.unlink()
+
+        lc_index.filters = lc_index.filters.astype(object)
+        with self.assertRaises(ValueError):
+            lc_index.to_shared_memory()
+
+
+if __name__ == '__main__':
+    unittest.main()
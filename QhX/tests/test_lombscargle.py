@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+import pandas as pd
+from QhX.algorithms.lombscargle import fast_lomb_scargle, LombScargleScreen
+from QhX.dynamical_mode import DataManagerDynamical, process1_new_dyn
+
+
+def direct_lomb_scargle(tt, yy, freqs):
+    """Floating-mean Lomb-Scargle evaluated by least squares at every frequency."""
+    power = []
+    for fr in freqs:
+        X = np.column_stack([np.ones_like(tt), np.cos(2 * np.pi * fr * tt), np.sin(2 * np.pi * fr * tt)])
+        beta = np.linalg.lstsq(X, yy, rcond=None)[0]
+        power.append(1 - np.sum((yy - X @ beta) ** 2) / np.sum((yy - yy.mean()) ** 2))
+    return np.array(power)
+
+
+class TestLombScargleScreen(unittest.TestCase):
+    """
+    Test suite for the fast Lomb-Scargle screening pre-stage.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.tt = np.sort(rng.uniform(50000, 53000, 300))
+        self.yy = 20 + 0.3 * np.sin(2 * np.pi * self.tt / 200) + rng.normal(0, 0.2, 300)
+        self.noise = 20 + rng.normal(0, 0.2, 300)
+
+    def test_matches_direct_periodogram(self):
+        f0, N = 1 / 2000, 400
+        df = (1 / 10 - f0) / (N - 1)
+        power = fast_lomb_scargle(self.tt, self.yy, f0, df, N)
+        expected = direct_lomb_scargle(self.tt, self.yy, f0 + df * np.arange(N))
+        self.assertLess(np.max(np.abs(power - expected)), 1e-2)
+
+    def test_screen_window(self):
+        screen = LombScargleScreen()
+        window = screen([(self.tt, self.yy), (self.tt, self.noise)], 2000, 10)
+        self.assertIsNotNone(window)
+        self.assertGreater(window[0], 200)
+        self.assertLess(window[1], 200)
+        self.assertIsNone(screen([(self.tt, self.noise)], 2000, 10))
+
+    def test_screen_skips_wwz(self):
+        data_manager = DataManagerDynamical()
+        data_manager.data_df = pd.DataFrame({
+            'objectId': ['1'] * 600,
+            'mjd': np.concatenate([self.tt, self.tt]),
+            'psMag': np.concatenate([self.noise, self.noise[::-1]]),
+            'filter': [0] * 300 + [1] * 300
+        })
+        data_manager.group_data()
+        result = process1_new_dyn(data_manager, '1', ntau=80, ngrid=100, provided_minfq=2000,
+                                  provided_maxfq=10, screen=lambda lcs, minfq, maxfq: None)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['label'], '0-1')
+        self.assertTrue(np.isnan(result[0]['period']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from QhX import DataManagerDynamical, process1_new_dyn
+from QhX.output import classify_periods
+from QhX.results import to_dataframe
+from QhX.output_parallel import classify_periods as classify_periods_parallel, \
+    flatten_detected_periods as flatten_detected_periods_parallel
+
+
+class TestOutput(unittest.TestCase):
+    """
+    Test suite for the classification of the periods detected by the detector functions.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(7)
+        mjd = np.sort(rng.uniform(50000, 53000, 240))
+        df = pd.DataFrame({
+            'objectId': '1',
+            'mjd': mjd,
+            'psMag': 20.0 + 0.5 * np.sin(2 * np.pi * mjd / 500.0) + rng.normal(0, 0.05, mjd.size),
+            'psMagErr': rng.uniform(0.02, 0.1, mjd.size),
+            'filter': rng.integers(0, 4, mjd.size)
+        })
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'fs.parquet')
+            df.to_parquet(path)
+            data_manager = DataManagerDynamical(
+                column_mapping={'flux': 'psMag', 'time': 'mjd', 'band': 'filter'},
+                group_by_key='objectId',
+                filter_mapping={0: 0, 1: 1, 2: 2, 3: 3}
+            )
+            data_manager.load_data(path)
+            data_manager.group_data()
+        # The detector returns record arrays, and None for a missing object
+        cls.detected = [process1_new_dyn(data_manager, set_id, ntau=80, ngrid=100,
+                                         provided_minfq=2000, provided_maxfq=10)
+                        for set_id in ('1', 'missing')]
+
+    def test_classify_detector_output(self):
+        records, missing = self.detected
+        self.assertIsInstance(records, np.ndarray)
+        self.assertIsNone(missing)
+        classified = classify_periods(self.detected)
+        # One row per couple of band pairs of the object
+        self.assertEqual(len(classified), len(records) * (len(records) - 1) // 2)
+        self.assertListEqual(classified['objectid'].unique().tolist(), ['1'])
+        self.assertTrue(set(classified['m7_1']) <= set(records['label']))
+
+    def test_classify_detector_output_parallel(self):
+        records = self.detected[0]
+        flat = flatten_detected_periods_parallel(self.detected)
+        # Only the band pairs with a common period and its errors are kept
+        self.assertListEqual([record['Common period (Band1 & Band1)'] for record in flat],
+                             records['period'][~np.isnan(records['significance'])].tolist())
+        self.assertTrue(all(record['ID'] == '1' for record in flat))
+        # Rows of a results file give the same records
+        rows = to_dataframe(records, csv_columns=True).to_dict('records')
+        self.assertListEqual(flatten_detected_periods_parallel(rows), flat)
+        classified = classify_periods_parallel(self.detected)
+        self.assertTrue(set(classified.get('ID', [])) <= {'1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
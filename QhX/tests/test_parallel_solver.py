@@ -1,12 +1,98 @@
 import os
+import sys
+import time
+import signal
+import pickle
+import shutil
+import tempfile
 import gc
 import threading
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 import unittest
-from QhX.parallelization_solver import ParallelSolver
+from QhX.parallelization_solver import ParallelSolver, STAGES_HEADER
+from QhX.utils.stage_timing import STAGES
+from QhX.scheduling import CostModel
+from QhX.job_queue import JobQueue, DONE, FAILED
+from QhX.results import to_dataframe
+from QhX.iparallelization_solver import IParallelSolver, ObjectTimeout, object_timeout
 from QhX import DataManagerDynamical, process1_new_dyn
+from QhX.data_manager import DataManager
+from QhX.data_manager_dask import DaskDataManager
+from QhX.algorithms.wavelets.wwtz import frequency_axes
+from QhX.tests.helpers import create_forced_source_data
+from unittest import mock
+
+class EchoSolver(IParallelSolver):
+    """Minimal solver whose workers crash on the set ID 'crash'."""
+
+    def get_process_function_result(self, set_id):
+        if set_id == 'crash':
+            os._exit(1)
+        return set_id
+
+    def aggregate_process_function_result(self, result):
+        return f"{result}\n"
+
+    def maybe_open_results(self, results_file, append=False):
+        if not hasattr(self, 'written_'):
+            self.written_ = []
+
+    def maybe_write_result(self, set_id, res):
+        self.written_.append(res)
+
+
+class HangSolver(EchoSolver):
+    """Solver stuck on the set ID 'hang' in a call the timeout signal cannot interrupt."""
+
+    def get_process_function_result(self, set_id):
+        if set_id == 'hang':
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+            time.sleep(60)
+        return set_id
+
+
+class MemorySolver(EchoSolver):
+    """Solver whose worker goes above its memory ceiling with the set ID 'big', reporting the worker of each set ID."""
+
+    def get_process_function_result(self, set_id):
+        time.sleep(0.2)
+        self.over_ = self.over_ or set_id == 'big'
+        return set_id, os.getpid()
+
+    def aggregate_process_function_result(self, result):
+        return result
+
+    def over_memory_limit(self):
+        return getattr(self, 'over_', False)
+
+
+class SlowLoadSolver(EchoSolver):
+    """Solver whose loads and computations take a while, reporting when each ran."""
+
+    def load_set(self, set_id):
+        start = time.time()
+        time.sleep(0.3)
+        return {'load': (start, time.time())}
+
+    def get_process_function_result(self, set_id, data=None):
+        start = time.time()
+        time.sleep(0.3)
+        return dict(data, compute=(start, time.time()))
+
+    def aggregate_process_function_result(self, result):
+        return result
+
+
+class PartitionSolver(ParallelSolver):
+    """Solver reporting the number of objects its data manager holds instead of detecting periods."""
+
+    def get_process_function_result(self, set_id):
+        n_objects = self.data_manager.fs_df['objectId'].nunique()
+        return [{'objectid': set_id, 'sampling_i': 0.0, 'sampling_j': 0.0, 'period': n_objects,
+                 'upper_error': 0.0, 'lower_error': 0.0, 'significance': 0.0, 'label': '0-1'}]
+
 
 class TestParallelSolver(unittest.TestCase):
     def setUp(self):
@@ -90,7 +176,235 @@ class TestParallelSolver(unittest.TestCase):
         # Print the result DataFrame for inspection
         print("\nContents of 1-reslut.csv:")
         print(actual_df.to_string(index=False))  # Print DataFrame without row indices
-    
+
+
+    def test_parallel_solver_shared_memory(self):
+        print("Running test_parallel_solver_shared_memory...")  # Debugging print
+        self.solver.share_memory = True
+        self.solver.process_ids(set_ids=self.setids, results_file='1-reslut.csv')
+        self.assertIsNone(self.solver.shared_handle_)
+
+        actual_df = pd.read_csv('1-reslut.csv')
+        self.assertEqual(len(actual_df), 6)  # One row per band pair at least
+        self.assertTrue((actual_df["ID"] == 1).all())
+
+    def test_parallel_solver_backends(self):
+        print("Running test_parallel_solver_backends...")  # Debugging print
+        self.solver.chunksize = 2
+        self.solver.max_in_flight = 1
+        self.solver.cost_model = CostModel(ntau=80, ngrid=100)
+        self.solver.process_ids(set_ids=['42', '1'], results_file='1-reslut.csv')
+        pool_df = pd.read_csv('1-reslut.csv')
+        self.assertEqual(len(self.solver.cost_model.observations), 1)  # Timing of '1', '42' has no data
+        self.assertListEqual([set_id for set_id, _ in self.solver.failures_], ['42'])
+        self.assertListEqual(pd.read_csv('1-reslut.csv.failures.csv')['ID'].tolist(), [42])
+
+        self.solver.backend = 'processes'
+        self.solver.max_tasks_per_worker = 1
+        self.solver.num_workers = 1
+        self.solver.process_ids(set_ids=['1', '42'], results_file='1-reslut.csv')
+        processes_df = pd.read_csv('1-reslut.csv')
+        self.assertListEqual([set_id for set_id, _ in self.solver.failures_], ['42'])
+
+        self.assertListEqual(list(pool_df.columns), list(processes_df.columns))
+        self.assertEqual(len(pool_df), len(processes_df))
+        self.assertTrue((pool_df["ID"] == 1).all())
+
+    def test_parallel_solver_resume(self):
+        print("Running test_parallel_solver_resume...")  # Debugging print
+        self.solver.process_ids(set_ids=['1'], results_file='1-reslut.csv')
+        first_df = pd.read_csv('1-reslut.csv')
+        with open('1-reslut.csv.journal') as f:
+            self.assertIn('done\t1\n', f.read())
+
+        # Nothing left to do, the results are kept
+        self.solver.process_ids(set_ids=['1'], results_file='1-reslut.csv', resume=True)
+        pd.testing.assert_frame_equal(pd.read_csv('1-reslut.csv'), first_df)
+
+    def test_object_timeout(self):
+        with self.assertRaises(ObjectTimeout):
+            with object_timeout(0.2):
+                time.sleep(5)
+
+        self.solver.timeout = 1e-3
+        self.solver.process_ids(set_ids=['1'], results_file='1-reslut.csv')
+        self.assertEqual(self.solver.failures_[0][1], 'Timeout after 0.001 s')
+        self.assertEqual(len(pd.read_csv('1-reslut.csv')), 0)
+
+    def test_stuck_worker(self):
+        # The parent kills the worker stuck past the timeout, the other set IDs run on its replacement
+        for backend in ['pool', 'processes']:
+            solver = HangSolver(num_workers=1, backend=backend, timeout=0.5, prefetch=1)
+            start = time.perf_counter()
+            solver.process_ids(['a', 'hang', 'b', 'c'])
+            self.assertLess(time.perf_counter() - start, 30)
+            self.assertListEqual(solver.failures_, [('hang', 'Timeout after 0.5 s, worker killed')])
+            self.assertSetEqual(set(solver.written_), {'a\n', 'b\n', 'c\n'})
+
+    def test_memory_ceiling(self):
+        # Only the worker above its memory ceiling is replaced
+        solver = MemorySolver(num_workers=2)
+        solver.over_ = False
+        solver.process_ids(['big'] + list('abcdefg'))
+        workers = dict(solver.written_)
+        self.assertEqual(len(workers), 8)
+        self.assertNotIn(workers['big'], [pid for set_id, pid in workers.items() if set_id != 'big'])
+        self.assertEqual(len(set(workers.values())), 3)
+
+    def test_crashed_worker(self):
+        solver = EchoSolver(num_workers=2, max_retries=1, max_tasks_per_worker=2)
+        solver.process_ids(['a', 'b', 'crash', 'c', 'd', 'e'])
+        self.assertListEqual([set_id for set_id, _ in solver.failures_], ['crash'])
+        self.assertIn('Worker crashed', solver.failures_[0][1])
+        self.assertSetEqual(set(solver.written_), {'a\n', 'b\n', 'c\n', 'd\n', 'e\n'})
+
+    def test_job_queue(self):
+        job_queue = JobQueue('1-reslut.sqlite', lease_seconds=0.5)
+        job_queue.add(['a', 'b', 'crash', 'c', 'd'])
+        job_queue.claim('dead', 1)  # Lease of an instance that died, claimed again once expired
+        solver = EchoSolver(num_workers=2, max_retries=0)
+        solver.process_queue(job_queue, lease_size=2)
+        self.assertSetEqual(set(solver.written_), {'a\n', 'b\n', 'c\n', 'd\n'})
+        self.assertListEqual([set_id for set_id, _ in job_queue.failures()], ['crash'])
+        self.assertListEqual([set_id for set_id, _ in solver.failures_], ['crash'])
+        self.assertEqual(job_queue.counts()[DONE], 4)
+
+    def test_job_queue_one_pool(self):
+        # All leases run on the same workers, whose results are marked done once written
+        job_queue = JobQueue('1-reslut.sqlite')
+        job_queue.add(list('abcdef'))
+        solver = MemorySolver(num_workers=1)
+        solver.over_ = False
+        solver.process_queue(job_queue, lease_size=2)
+        self.assertEqual(len(set(pid for _, pid in solver.written_)), 1)
+        self.assertEqual(job_queue.counts()[DONE], 6)
+        job_queue.close()
+        os.remove('1-reslut.sqlite')
+
+        data_manager = DataManager()
+        data_manager.fs_df = create_forced_source_data(num_objects=6)
+        data_manager.group_fs_df()
+        job_queue = JobQueue('1-reslut.sqlite')
+        job_queue.add(list(range(1, 7)))
+        solver = PartitionSolver(num_workers=2, data_manager=data_manager)
+        solver.process_queue(job_queue, results_file='1-reslut.csv', lease_size=2)
+        self.assertListEqual(sorted(pd.read_csv('1-reslut.csv')['ID']), list(range(1, 7)))
+        self.assertEqual(job_queue.counts()[DONE], 6)
+
+    def test_dask_backend(self):
+        with mock.patch.dict(sys.modules, {'dask.distributed': None}):
+            with self.assertRaisesRegex(ImportError, "pip install 'dask\\[distributed\\]'"):
+                EchoSolver(backend='dask').process_ids(['a'])
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            self.skipTest('dask.distributed is not installed')
+
+        with Client(LocalCluster(n_workers=2, threads_per_worker=1, processes=False)) as client:
+            solver = EchoSolver(backend='dask', client=client, chunksize=2)
+            solver.process_ids(['a', 'b', 'c', 'd', 'e'])
+            self.assertSetEqual(set(solver.written_), {'a\n', 'b\n', 'c\n', 'd\n', 'e\n'})
+
+            # Tasks of a partitioned data manager only see the partition of their objects
+            data_manager = DaskDataManager(npartitions=2)
+            data_manager.fs_df = data_manager.load_fs_df(self.write_forced_sources())
+            solver = PartitionSolver(num_workers=2, data_manager=data_manager, backend='dask', client=client,
+                                     chunksize=3)
+            # Partitions are computed as their tasks run, the table is never persisted as a whole
+            with mock.patch.object(Client, 'persist', side_effect=AssertionError('persisted')):
+                solver.process_ids(list(range(1, 7)), results_file='1-reslut.csv')
+            self.assertListEqual(solver.failures_, [])
+        df = pd.read_csv('1-reslut.csv')
+        self.assertListEqual(sorted(df['ID']), list(range(1, 7)))
+        partition_sizes = {obj_id: len(ids) for ids in data_manager.partition_layout().values() for obj_id in ids}
+        self.assertTrue(all(len(ids) < 6 for ids in data_manager.partition_layout().values()))
+        for obj_id, n_objects in zip(df['ID'], df['Common period (Band1 & Band2)']):
+            self.assertEqual(n_objects, partition_sizes[obj_id])
+
+    def test_worker_setup(self):
+        run_dir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            data_manager = DataManager()
+            data_manager.fs_df = create_forced_source_data(num_objects=3)
+            data_manager.group_fs_df()
+            # A relative store path, as in process_batches, which then changes to the batch directory
+            os.chdir(run_dir)
+            data_manager.export_lc_store('lc_store')
+            solver = ParallelSolver(num_workers=1, data_manager=data_manager, store_path='lc_store',
+                                    ngrid=100, provided_minfq=500, provided_maxfq=10, blas_threads=1)
+            os.mkdir('batch0')
+            os.chdir('batch0')
+
+            # Workers open the store themselves instead of receiving the data manager
+            worker = pickle.loads(pickle.dumps(solver))
+            self.assertIsNone(worker.data_manager)
+            worker.parent_pid_ = None  # As in a worker process
+            frequency_axes.cache_clear()
+            worker.setup_worker()
+            self.assertListEqual(worker.data_manager.lc_index.object_ids.tolist(), [1, 2, 3])
+            self.assertEqual(frequency_axes.cache_info().currsize, 1)
+            frequency_axes(100, 500, 10)
+            self.assertEqual(frequency_axes.cache_info().hits, 1)
+            if worker.blas_limits_ is not None:
+                from threadpoolctl import threadpool_info
+                self.assertTrue(all(pool['num_threads'] == 1 for pool in threadpool_info()))
+                worker.blas_limits_.restore_original_limits()
+
+            # A store that cannot be opened fails the setup of the workers, not each set ID
+            solver = ParallelSolver(num_workers=1, store_path='missing_store', max_retries=0)
+            with self.assertRaises(RuntimeError):
+                solver.setup_worker()
+            solver.process_ids(set_ids=[1, 2])
+            self.assertListEqual(sorted(set_id for set_id, _ in solver.failures_), [1, 2])
+            self.assertTrue(all(error.startswith('Worker setup failed') for _, error in solver.failures_))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(run_dir)
+
+    def test_prefetch(self):
+        self.solver.process_ids(set_ids=['1', '42'], results_file='1-reslut.csv')
+        expected_df = pd.read_csv('1-reslut.csv')
+
+        # Light curves loaded ahead give the same results, on both backends
+        self.solver.prefetch = 2
+        for backend in ['pool', 'processes']:
+            self.solver.backend = backend
+            self.solver.process_ids(set_ids=['1', '42'], results_file='1-reslut.csv')
+            pd.testing.assert_frame_equal(pd.read_csv('1-reslut.csv'), expected_df)
+            self.assertListEqual([set_id for set_id, _ in self.solver.failures_], ['42'])
+
+    def test_prefetch_overlap(self):
+        # A single worker fed one set ID at a time loads the next one while computing the current one
+        solver = SlowLoadSolver(num_workers=1, chunksize=1, prefetch=1)
+        solver.process_ids(['a', 'b', 'c', 'd'])
+        timings = solver.written_
+        self.assertEqual(len(timings), 4)
+        overlaps = [later['load'][0] < earlier['compute'][1] for earlier, later in zip(timings, timings[1:])]
+        self.assertTrue(all(overlaps))
+
+    def test_band_workers(self):
+        # Bands analyzed concurrently give the same records as one after another
+        kwargs = dict(ntau=80, ngrid=100, provided_minfq=500, provided_maxfq=10, include_errors=True)
+        serial = process1_new_dyn(self.data_manager, '1', **kwargs)
+        threaded = process1_new_dyn(self.data_manager, '1', band_workers=4, **kwargs)
+        pd.testing.assert_frame_equal(to_dataframe(threaded), to_dataframe(serial))
+
+    def test_record_stages(self):
+        self.solver.record_stages = True
+        self.solver.process_ids(set_ids=['1', '42'], results_file='1-reslut.csv')
+        stages_df = pd.read_csv('1-reslut.csv.stages.csv', index_col='ID')
+        self.assertListEqual(sorted(stages_df.index), [1, 42])  # Failed set IDs are timed as well
+        self.assertListEqual(list(stages_df.columns), list(STAGES_HEADER[1:]))
+        timings = stages_df.loc[1]
+        self.assertTrue((timings[['load', 'wwz', 'correlation', 'periods', 'matching', 'write']] > 0).all())
+        self.assertLessEqual(timings[list(STAGES)].sum(), timings['seconds'])
+        self.assertGreater(timings['rss_mb'], 0)
+        self.assertGreaterEqual(timings['maxrss_growth_mb'], 0)
+
+    def write_forced_sources(self):
+        create_forced_source_data(num_objects=6).sort_values('objectId').to_parquet(self.synthetic_data_file)
+        return self.synthetic_data_file
 
     def tearDown(self):
         print("Cleaning up...")  # Debugging print
@@ -104,6 +418,11 @@ class TestParallelSolver(unittest.TestCase):
             os.remove(self.synthetic_data_file)
         if os.path.isfile('1-reslut.csv'):
             os.remove('1-reslut.csv')
+        if os.path.isfile('1-reslut.sqlite'):
+            os.remove('1-reslut.sqlite')
+        for suffix in ['.journal', '.failures.csv', '.stages.csv']:
+            if os.path.isfile('1-reslut.csv' + suffix):
+                os.remove('1-reslut.csv' + suffix)
         gc.collect()
         for thread in threading.enumerate():
             if thread.name != "MainThread":
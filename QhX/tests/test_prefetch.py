@@ -0,0 +1,67 @@
+import time
+import threading
+import unittest
+import numpy as np
+from QhX.prefetch import Prefetcher, nbytes_of
+
+
+class TestPrefetch(unittest.TestCase):
+    """
+    Test suite for the prefetching loader thread.
+    """
+
+    def test_order_and_errors(self):
+        def load(set_id):
+            if set_id == 3:
+                raise ValueError('corrupt light curve')
+            return np.full(4, set_id)
+
+        with Prefetcher(load, range(6), depth=2) as prefetcher:
+            loaded = list(prefetcher)
+        self.assertListEqual([set_id for set_id, _ in loaded], list(range(6)))
+        self.assertIsNone(loaded[3][1])  # Loaded again by the caller, which reports the error
+        np.testing.assert_array_equal(loaded[5][1], np.full(4, 5))
+
+    def test_backpressure(self):
+        loaded = []
+        load = lambda set_id: loaded.append(set_id) or {0: (np.zeros(100), np.zeros(100), None)}
+        self.assertEqual(nbytes_of(load(-1)), 1600)
+        loaded.clear()
+
+        # The buffer holds at most depth set IDs
+        prefetcher = Prefetcher(load, range(10), depth=3).start()
+        time.sleep(0.2)
+        self.assertEqual(len(loaded), 3)
+        self.assertListEqual(prefetcher.close(), [0, 1, 2])
+
+        # and stops at max_bytes, the first set ID is loaded whatever its size
+        loaded.clear()
+        prefetcher = Prefetcher(load, range(10), depth=8, max_bytes=1000).start()
+        time.sleep(0.2)
+        self.assertEqual(len(loaded), 1)
+        iterator = iter(prefetcher)
+        self.assertEqual(next(iterator)[0], 0)
+        time.sleep(0.2)
+        self.assertEqual(len(loaded), 2)
+        self.assertListEqual(prefetcher.close(), [1])
+
+    def test_generator_source(self):
+        # Set IDs are only taken from the source when there is room
+        taken = []
+        lock = threading.Lock()
+
+        def source():
+            for set_id in range(100):
+                with lock:
+                    taken.append(set_id)
+                yield set_id
+
+        prefetcher = Prefetcher(lambda set_id: None, source(), depth=2).start()
+        first = [set_id for set_id, _ in zip(range(3), prefetcher)]
+        pending = prefetcher.close()
+        self.assertListEqual(first, [0, 1, 2])
+        self.assertListEqual(first + pending, taken)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pandas as pd
+from QhX.utils.remote_cache import fetch
+from QhX.dynamical_mode import DataManagerDynamical
+from QhX.tests.helpers import create_forced_source_data
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that records the status of every response."""
+    statuses = []
+
+    def send_response(self, code, message=None):
+        self.statuses.append(code)
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRemoteCache(unittest.TestCase):
+    """
+    Test suite for the cached remote loading against a local HTTP server.
+    """
+
+    def setUp(self):
+        self.serve_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.df = create_forced_source_data(num_objects=6)
+        self.path = os.path.join(self.serve_dir, 'fs.parquet')
+        self.df.sort_values('objectId').to_parquet(self.path, row_group_size=100)
+
+        CountingHandler.statuses = []
+        handler = partial(CountingHandler, directory=self.serve_dir)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/fs.parquet'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.serve_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def test_fetch_revalidates(self):
+        first = fetch(self.url, cache_dir=self.cache_dir, chunk_size=1024)
+        with open(first, 'rb') as a, open(self.path, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+        second = fetch(self.url, cache_dir=self.cache_dir)
+        self.assertEqual(first, second)
+        self.assertListEqual(CountingHandler.statuses, [200, 304])
+
+        fetch(self.url, cache_dir=self.cache_dir, revalidate=False)
+        self.assertEqual(len(CountingHandler.statuses), 2)
+
+        # A newer remote file is downloaded again under its new content hash
+        self.df.head(50).to_parquet(self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        third = fetch(self.url, cache_dir=self.cache_dir)
+        self.assertNotEqual(first, third)
+        self.assertEqual(len(pd.read_parquet(third)), 50)
+
+    def test_load_data_from_url(self):
+        data_manager = DataManagerDynamical(cache_dir=self.cache_dir)
+        df = data_manager.load_data(self.url, object_ids=[2, 4], columns=['mjd', 'psMag'])
+        self.assertSetEqual(set(df['objectId']), {2, 4})
+        self.assertListEqual(list(df.columns), ['objectId', 'filter', 'mjd', 'psMag'])
+
+        df = DataManagerDynamical(cache_dir=self.cache_dir).load_data(self.url)
+        self.assertEqual(len(df), len(self.df))
+        self.assertListEqual(CountingHandler.statuses, [200, 304])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+from threadpoolctl import threadpool_info
+import numpy as np
+from QhX.resources import CpuBudget, pin_blas_threads, benchmark_splits, rss_bytes, max_rss_bytes, THREAD_ENV_VARS
+from QhX.parallelization_solver import ParallelSolver
+
+
+def _square():
+    return sum(i * i for i in range(1000))
+
+
+class TestResources(unittest.TestCase):
+    """
+    Test suite for the CPU budget of a run.
+    """
+
+    def test_budget_splits(self):
+        budget = CpuBudget(8)
+        self.assertEqual((budget.processes, budget.threads_per_process), (8, 1))
+        self.assertListEqual(budget.splits(), [(8, 1), (4, 2), (2, 4), (1, 8)])
+        self.assertEqual(CpuBudget(8, processes=2).threads_per_process, 4)
+        self.assertEqual(CpuBudget(8, threads_per_process=3).processes, 2)
+        self.assertEqual(CpuBudget(2, processes=4).threads_per_process, 1)
+        self.assertFalse(CpuBudget(8).allows_parallel_wwz())
+
+    def test_pin_blas_threads(self):
+        saved = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+        limiter = pin_blas_threads(1)
+        try:
+            self.assertTrue(all(os.environ[var] == '1' for var in THREAD_ENV_VARS))
+            self.assertTrue(all(pool['num_threads'] == 1 for pool in threadpool_info()))
+        finally:
+            limiter.restore_original_limits()
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+    def test_benchmark_splits(self):
+        results = benchmark_splits(_square, n_tasks=4, total_cores=2)
+        self.assertListEqual(sorted((r['processes'], r['threads']) for r in results), [(1, 2), (2, 1)])
+        self.assertTrue(all(r['tasks_per_second'] > 0 for r in results))
+
+    def test_max_rss(self):
+        before = max_rss_bytes()
+        # Touched memory beyond the earlier maximum of the process
+        block = np.ones(before - rss_bytes() + 64 * 1024 * 1024, dtype=np.uint8)
+        self.assertGreater(max_rss_bytes(), before)
+        del block
+
+    def test_solver_budget(self):
+        solver = ParallelSolver(num_workers=2, cpu_budget=CpuBudget(8, processes=2), parallel_arithmetic=True)
+        self.assertEqual((solver.num_workers, solver.blas_threads), (2, 4))
+        # libwwz's own parallel mode would oversubscribe the budget
+        self.assertFalse(solver.parallel_arithmetic)
+
+        solver = ParallelSolver(num_workers=4, cpu_budget=4)
+        self.assertEqual((solver.num_workers, solver.blas_threads), (4, 1))
+
+        # Without a budget the thread pools of the workers are left as they are
+        solver = ParallelSolver(num_workers=1)
+        self.assertIsNone(solver.blas_threads)
+        solver.parent_pid_ = None  # As in a worker process
+        solver.setup_worker()
+        self.assertIsNone(getattr(solver, 'blas_limits_', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
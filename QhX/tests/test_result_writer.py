@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from QhX.journal import RunJournal
+from QhX.result_writer import ResultWriter
+from QhX.results import as_results, concat_results, to_csv_lines, to_dataframe, CSV_COLUMNS, RESULT_DTYPE, OBJECTID_LENGTH
+
+HEADER = ','.join(CSV_COLUMNS) + "\n"
+
+
+def make_rows(set_id, n):
+    return [{'objectid': set_id, 'sampling_i': 1.0, 'sampling_j': 2.0, 'period': 100.0 + i,
+             'upper_error': 1.0, 'lower_error': 0.5, 'significance': 0.9, 'label': '0-1'}
+            for i in range(n)]
+
+
+class TestResultWriter(unittest.TestCase):
+    """
+    Test suite for the result writer process.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.tmp_dir, 'result.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_csv_batches_and_journal(self):
+        path = os.path.join(self.tmp_dir, 'result.csv')
+        with ResultWriter(path, header=HEADER, batch_rows=4, journal_path=self.journal_path) as writer:
+            for set_id in ['1', '2', '3']:
+                writer.put(set_id, make_rows(set_id, 3))
+        df = pd.read_csv(path)
+        self.assertEqual(len(df), 9)
+        self.assertListEqual(list(df.columns), HEADER.strip().split(','))
+        self.assertSetEqual(RunJournal(self.journal_path).completed(), {'1', '2', '3'})
+
+        # Appending keeps the header and earlier rows
+        with ResultWriter(path, header=HEADER, append=True) as writer:
+            writer.put('4', make_rows('4', 2))
+        self.assertEqual(len(pd.read_csv(path)), 11)
+
+    def test_parquet_dataset(self):
+        path = os.path.join(self.tmp_dir, 'result.parquet')
+        with ResultWriter(path, batch_rows=5, journal_path=self.journal_path) as writer:
+            self.assertEqual(writer.result_format, 'parquet')
+            for set_id in [1, 2, 3, 4]:
+                writer.put(set_id, make_rows(set_id, 2))
+            writer.put(5, [])
+        df = pd.read_parquet(path)
+        self.assertEqual(len(df), 8)
+        self.assertSetEqual(set(df['objectid']), {'1', '2', '3', '4'})
+        self.assertGreater(len(os.listdir(path)), 1)  # One file per flushed batch
+        self.assertSetEqual(RunJournal(self.journal_path).completed(), {'1', '2', '3', '4', '5'})
+
+    def test_acknowledge(self):
+        path = os.path.join(self.tmp_dir, 'result.csv')
+        writer = ResultWriter(path, header=HEADER, flush_seconds=60, acknowledge=True).start()
+        writer.put('1', make_rows('1', 2))
+        writer.put('2', make_rows('2', 1))
+        writer.flush()
+        self.assertListEqual(writer.written(), ['1', '2'])
+        self.assertEqual(len(pd.read_csv(path)), 3)
+        self.assertListEqual(writer.written(), [])
+        writer.put('3', make_rows('3', 1))
+        writer.close()
+        self.assertListEqual(writer.written(), ['3'])
+
+    def test_result_records(self):
+        records = concat_results([make_rows(1, 2), [('2', 1.0, 2.0, float('nan'), 1.0, 0.5, 0.9, '1-2')], None])
+        self.assertEqual(records.dtype, RESULT_DTYPE)
+        self.assertListEqual(list(records['objectid']), ['1', '1', '2'])
+        self.assertEqual(to_csv_lines(records[2:]), "2,1.0,2.0,nan,1.0,0.5,0.9,1-2\n")
+        self.assertListEqual(list(to_dataframe(records, csv_columns=True).columns), list(CSV_COLUMNS))
+        self.assertIs(as_results(records), records)
+        # Object IDs are never truncated
+        long_id = 'x' * (OBJECTID_LENGTH + 1)
+        with self.assertRaises(ValueError):
+            as_results([(long_id, 1.0, 2.0, 3.0, 1.0, 0.5, 0.9, '1-2')])
+        with self.assertRaises(ValueError):
+            as_results(np.array([(long_id,)], dtype=[('objectid', 'U80')]))
+        with self.assertRaises(ValueError):
+            ResultWriter('result.txt', result_format='hdf5')
+
+
+if __name__ == '__main__':
+    unittest.main()
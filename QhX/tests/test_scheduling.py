@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+from QhX.scheduling import CostModel
+
+
+class TestCostModel(unittest.TestCase):
+    """
+    Test suite for the cost model used to dispatch objects longest-first.
+    """
+
+    def setUp(self):
+        self.counts = pd.DataFrame({0: [10, 300, 0, 400], 1: [10, 250, 0, 0], 2: [5, 280, 0, 390]},
+                                   index=['a', 'b', 'c', 'd'])
+
+    def test_longest_first(self):
+        model = CostModel(ntau=80, ngrid=100)
+        self.assertListEqual(model.order(['a', 'c', 'd', 'b', 'x'], self.counts), ['b', 'd', 'a', 'c', 'x'])
+        self.assertEqual(model.predict(['x'], self.counts)[0], 0)
+
+    def test_refine_from_timings(self):
+        model = CostModel(ntau=80, ngrid=100, coefficients=(1, 1, 1, 1))
+        true_coefficients = np.array([0.5, 0.0, 3e-6, 1e-8])
+        for obj_id in ['a', 'b', 'd', 'a', 'b']:
+            seconds = model.features(self.counts.loc[[obj_id]])[0] @ true_coefficients
+            model.record(obj_id, self.counts, seconds)
+        model.record('x', self.counts, 100.0)
+        self.assertEqual(len(model.observations), 5)
+        expected = model.features(self.counts.loc[['a', 'b', 'd']]) @ true_coefficients
+        np.testing.assert_allclose(model.predict(['a', 'b', 'd'], self.counts), expected, rtol=1e-6, atol=1e-6)
+
+        # Only the most recent observations are kept, the fit still uses all of them
+        model = CostModel(ntau=80, ngrid=100, max_observations=3)
+        for obj_id in ['a', 'b', 'd', 'a', 'b', 'd']:
+            model.record(obj_id, self.counts, model.features(self.counts.loc[[obj_id]])[0] @ true_coefficients)
+        self.assertEqual((len(model.observations), model.n_observations), (3, 6))
+        np.testing.assert_allclose(model.predict(['a', 'b', 'd'], self.counts), expected, rtol=1e-6, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
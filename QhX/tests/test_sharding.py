@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from QhX.sharding import parse_shard, shard_of, select_shard, read_object_ids, write_manifest, \
+    verify_manifests, merge_shards, find_manifests
+from QhX.batch_processor import write_shard_manifest
+from QhX.result_writer import ResultWriter
+from QhX.journal import JOURNAL_SUFFIX
+
+
+class TestSharding(unittest.TestCase):
+    """
+    Test suite for hash sharding and shard manifests.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.object_ids = list(range(1000, 1100))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_assignment(self):
+        self.assertEqual(parse_shard('3/16'), (3, 16))
+        for spec in ['3', '16/16', 'a/b', '-1/4']:
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+        shards = [select_shard(self.object_ids, i, 4) for i in range(4)]
+        self.assertEqual(sum(len(s) for s in shards), len(self.object_ids))
+        self.assertTrue(all(shards))
+        # Integer and string IDs hash alike, so catalogues can store either
+        self.assertEqual(shard_of(1234, 7), shard_of('1234', 7))
+
+        path = os.path.join(self.tmp_dir, 'fs.parquet')
+        pd.DataFrame({'objectId': [3, 1, 3, 2], 'mjd': [0.0, 1.0, 2.0, 3.0]}).to_parquet(path)
+        self.assertListEqual(read_object_ids(path), [3, 1, 2])
+
+    def write_shards(self, n_shards):
+        for shard in range(n_shards):
+            directory = os.path.join(self.tmp_dir, f'shard{shard}of{n_shards}')
+            os.makedirs(os.path.join(directory, 'batch0sz100'))
+            ids = select_shard(self.object_ids, shard, n_shards)
+            result_file = os.path.join(directory, 'batch0sz100', 'result.csv')
+            pd.DataFrame({'ID': ids, 'Significance': 0.5}).to_csv(result_file, index=False)
+            write_manifest(directory, shard, n_shards, ids, ids[1:], ids[:1], [result_file],
+                           {'batch_seconds': {'batch0sz100': 1.0}})
+
+    def test_verify_and_merge(self):
+        self.write_shards(3)
+        manifests = find_manifests(self.tmp_dir)
+        self.assertEqual(len(manifests), 3)
+        self.assertListEqual(verify_manifests(manifests, self.object_ids), [])
+        merged = merge_shards(manifests, os.path.join(self.tmp_dir, 'merged.csv'), self.object_ids)
+        self.assertListEqual(sorted(merged['ID']), self.object_ids)
+
+        # A missing shard and a modified result file are reported
+        self.assertIn('Missing shards [2] of 3', verify_manifests(manifests[:2]))
+        with open(os.path.join(self.tmp_dir, 'shard0of3', 'batch0sz100', 'result.csv'), 'a') as f:
+            f.write('1,0.5\n')
+        with self.assertRaises(ValueError):
+            merge_shards(manifests, os.path.join(self.tmp_dir, 'merged.csv'))
+
+    def test_parquet_results(self):
+        # A shard whose batches wrote Parquet datasets lists their part files in its manifest
+        n_shards = 2
+        cwd = os.getcwd()
+        for shard in range(n_shards):
+            directory = os.path.join(self.tmp_dir, f'shard{shard}of{n_shards}')
+            os.makedirs(os.path.join(directory, 'batch0sz100'))
+            ids = select_shard(self.object_ids, shard, n_shards)
+            result_path = os.path.join(directory, 'batch0sz100', 'result.parquet')
+            with ResultWriter(result_path, journal_path=result_path + JOURNAL_SUFFIX) as writer:
+                for object_id in ids:
+                    writer.put(str(object_id), [{'objectid': str(object_id), 'sampling_i': 1.0, 'sampling_j': 1.0, 'period': 1.0,
+                                                    'upper_error': 0.1, 'lower_error': 0.1, 'significance': 0.9,
+                                                    'label': '0-1'}])
+            os.chdir(directory)
+            try:
+                write_shard_manifest(shard, n_shards, ids, 100, 0.0, {}, 'result.parquet')
+            finally:
+                os.chdir(cwd)
+        manifests = find_manifests(self.tmp_dir)
+        with open(manifests[0]) as f:
+            results = json.load(f)['results']
+        self.assertTrue(results and all(name.endswith('.parquet') for name in results))
+        merged = merge_shards(manifests, os.path.join(self.tmp_dir, 'merged.csv'), self.object_ids)
+        self.assertListEqual(sorted(merged['objectid'].astype(int)), self.object_ids)
+
+    def test_unfinished_objects(self):
+        self.write_shards(2)
+        manifest_path = os.path.join(self.tmp_dir, 'shard1of2', 'manifest.json')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest['completed'] = manifest['completed'][1:]
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        self.assertListEqual(verify_manifests(find_manifests(self.tmp_dir)),
+                             ['Shard 1: 1 object IDs neither completed nor failed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import time
+import unittest
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from QhX.utils.stage_timing import stage, timed, record_stages, STAGES
+
+
+@timed('periods')
+def search_periods():
+    time.sleep(0.01)
+    # Nested stages are counted in the outer one
+    with stage('wwz'):
+        time.sleep(0.01)
+
+
+class TestStageTiming(unittest.TestCase):
+    """
+    Test suite for the stage timing of objects.
+    """
+
+    def test_record_stages(self):
+        with stage('load'):  # Nothing is recorded outside record_stages
+            pass
+        with record_stages() as recorder:
+            with stage('load'):
+                time.sleep(0.01)
+            search_periods()
+            search_periods()
+        timings = recorder.as_dict()
+        self.assertListEqual(list(timings)[:len(STAGES)], list(STAGES))
+        self.assertGreaterEqual(timings['load'], 0.01)
+        self.assertGreaterEqual(timings['periods'], 0.04)
+        self.assertEqual(timings['wwz'], 0.0)
+        self.assertEqual(recorder.calls, {'load': 1, 'periods': 2})
+
+    def test_threads(self):
+        def band(_):
+            with stage('wwz'):
+                time.sleep(0.01)
+
+        with record_stages() as recorder:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                contexts = [copy_context() for _ in range(4)]
+                list(executor.map(lambda context, i: context.run(band, i), contexts, range(4)))
+        # Durations are summed over the threads
+        self.assertEqual(recorder.calls['wwz'], 4)
+        self.assertGreaterEqual(recorder.seconds['wwz'], 0.04)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+This module provides a local, content-addressed cache for remote data files.
+
+Files are streamed to disk in chunks instead of being held in memory, stored under the
+SHA-256 of their content and revalidated with ETag/Last-Modified on later requests, so
+repeated runs and many worker processes share one downloaded copy. Interrupted downloads
+are resumed with HTTP range requests when the server supports them.
+
+Layout of the cache directory:
+
+    objects/<sha256>         downloaded file contents
+    urls/<sha256(url)>.json  ETag, Last-Modified and content hash of each URL
+    urls/<sha256(url)>.part  partial download of a URL, if interrupted
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows, downloads are then not serialized between processes
+    fcntl = None
+
+# Environment variable overriding the default cache directory
+CACHE_DIR_ENV = 'QHX_CACHE_DIR'
+# Default cache directory
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'qhx')
+# Size of streamed download chunks in bytes
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Seconds to wait for the server before giving up
+DEFAULT_TIMEOUT = 60
+
+
+def default_cache_dir():
+    """
+    Returns the cache directory, taken from the QHX_CACHE_DIR environment variable if set.
+    """
+    return os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _file_sha256(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _locked(lock_path):
+    """Holds an exclusive lock on `lock_path`, so concurrent workers download a URL once."""
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_entry(entry_path):
+    try:
+        with open(entry_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(entry_path, entry):
+    # Written to a temporary file and renamed, so readers never see a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, entry_path)
+
+
+def _download(session, url, part_path, entry_path, entry, chunk_size, timeout):
+    """
+    Streams `url` into `part_path`, resuming a previous partial download if possible.
+    Returns the response headers, or None if the server answered 304 Not Modified.
+    """
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and entry is not None and entry.get('partial_validator'):
+        # Only resume if the remote file is still the one the partial download came from
+        headers = {'Range': f'bytes={offset}-', 'If-Range': entry['partial_validator']}
+    else:
+        offset = 0
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        # Record the validator first, so an interrupted download can be resumed later
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        _write_entry(entry_path, dict(entry or {}, partial_validator=validator))
+        mode = 'ab' if offset and response.status_code == 206 else 'wb'
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+        return response.headers
+
+
+def fetch(url, cache_dir=None, revalidate=True, chunk_size=DEFAULT_CHUNK_SIZE, timeout=DEFAULT_TIMEOUT, session=None):
+    """
+    Returns the path of a local copy of `url`, downloading it only if needed.
+
+    Parameters:
+        url (str): URL of the remote file.
+        cache_dir (str, optional): Cache directory, defaults to `default_cache_dir()`.
+        revalidate (bool): If True, a cached copy is revalidated with the server using
+            ETag/Last-Modified. If False, a cached copy is used without contacting the server.
+        chunk_size (int): Size of streamed chunks in bytes.
+        timeout (float): Seconds to wait for the server.
+        session (requests.Session, optional): Session used for the requests.
+
+    Returns:
+        str: Path of the cached file. The path changes whenever the remote content changes.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    objects_dir = os.path.join(cache_dir, 'objects')
+    urls_dir = os.path.join(cache_dir, 'urls')
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(urls_dir, exist_ok=True)
+
+    key = _url_key(url)
+    entry_path = os.path.join(urls_dir, f'{key}.json')
+    part_path = os.path.join(urls_dir, f'{key}.part')
+
+    with _locked(os.path.join(urls_dir, f'{key}.lock')):
+        entry = _read_entry(entry_path)
+        cached_path = None
+        if entry is not None and entry.get('sha256'):
+            cached_path = os.path.join(objects_dir, entry['sha256'])
+            if not os.path.isfile(cached_path):
+                cached_path = None
+                entry = {k: v for k, v in entry.items() if k == 'partial_validator'}
+        if cached_path is not None and not revalidate:
+            return cached_path
+
+        session = session or requests.Session()
+        try:
+            headers = _download(session, url, part_path, entry_path, entry, chunk_size, timeout)
+        except requests.RequestException as e:
+            if cached_path is not None:
+                logging.warning(f"Could not revalidate {url} ({e}), using cached copy.")
+                return cached_path
+            raise
+
+        if headers is None:
+            logging.info(f"Cached copy of {url} is up to date.")
+            return cached_path
+
+        sha256 = _file_sha256(part_path, chunk_size)
+        object_path = os.path.join(objects_dir, sha256)
+        os.replace(part_path, object_path)
+        _write_entry(entry_path, {
+            'url': url,
+            'sha256': sha256,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'partial_validator': headers.get('ETag') or headers.get('Last-Modified')
+        })
+        logging.info(f"Downloaded {url} to {object_path}.")
+        return object_path
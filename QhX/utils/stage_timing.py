@@ -0,0 +1,127 @@
+"""
+Description:
+------------
+This module provides stage-level timing of the processing of one object.
+
+The detection code marks its stages with the `stage` context manager (or the `timed`
+decorator): loading and outlier cleaning of the light curves, the WWZ transform and the
+correlation of each band, the period search, the matching of periods between bands, the
+significance estimation and the writing of results (the local results of the worker and
+the hand-off of the records to the result writer in the parent, which writes them in batches
+in its own process, unattributed to objects). While a `record_stages` block is active
+in the current context, each stage adds its monotonic duration to a `StageRecorder`. Outside
+such a block the stages cost one context variable lookup.
+
+The memory of an object is reported twice: the largest resident set size sampled at the end
+of its stages (a transient peak inside a stage is missed), and the growth of the process's
+maximum resident set size (`ru_maxrss`) while it was processed, which catches such peaks but
+is 0 for an object that stays below the peak of an earlier one in the same process.
+
+Stages are exclusive: a stage started inside another one (e.g. the WWZ transforms of the
+simulated light curves of the significance stage) is counted in the outer stage, so the
+durations of an object add up to at most its processing time. Threads started by the
+processing (e.g. `band_periods`) record into the same recorder when they run in a copy of
+the caller's context, their durations are then summed over the threads.
+"""
+
+import time
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from QhX.resources import rss_bytes, max_rss_bytes
+
+# Stages of the processing of an object, in order
+STAGES = ('load', 'cleaning', 'wwz', 'correlation', 'periods', 'matching', 'significance', 'write')
+
+# Recorder of the object processed in the current context, and the stage running in it
+_recorder = ContextVar('stage_recorder', default=None)
+_active_stage = ContextVar('active_stage', default=None)
+
+
+class StageRecorder:
+    """
+    Durations of the stages of one object and its memory use.
+
+    Attributes:
+        seconds (dict): Total duration in seconds of each stage that ran.
+        calls (dict): Number of times each stage ran.
+        rss (int): Largest resident set size in bytes sampled at the end of a stage, None if unknown.
+        start_max_rss (int): Maximum resident set size of the process in bytes when the
+            recording started, None if unknown.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.rss = None
+        self.start_max_rss = max_rss_bytes()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        """Adds the duration of a stage, and samples the resident memory."""
+        rss = rss_bytes()
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if rss is not None and (self.rss is None or rss > self.rss):
+                self.rss = rss
+
+    def as_dict(self):
+        """
+        Returns the durations of all STAGES (0 for stages that did not run), the largest sampled
+        resident memory ('rss_mb') and the growth of the maximum resident memory ('maxrss_growth_mb'), in MiB.
+        """
+        max_rss = max_rss_bytes()
+        with self._lock:
+            timings = {name: self.seconds.get(name, 0.0) for name in STAGES}
+            timings.update((name, seconds) for name, seconds in self.seconds.items() if name not in timings)
+            timings['rss_mb'] = self.rss / (1024 * 1024) if self.rss is not None else None
+            timings['maxrss_growth_mb'] = ((max_rss - self.start_max_rss) / (1024 * 1024)
+                                           if max_rss is not None and self.start_max_rss is not None else None)
+        return timings
+
+
+@contextmanager
+def stage(name):
+    """Times the block as the stage `name` of the object being recorded, if any."""
+    recorder = _recorder.get()
+    if recorder is None or _active_stage.get() is not None:
+        yield
+        return
+    token = _active_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, time.perf_counter() - start)
+        _active_stage.reset(token)
+
+
+def timed(name):
+    """Decorator timing every call of a function as the stage `name`."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def record_stages():
+    """
+    Records the stages run in the block into a new StageRecorder, which is yielded.
+
+    Example:
+        >>> with record_stages() as recorder:
+        ...     process1_new(data_manager, set_id, ntau=80, ngrid=100)
+        >>> recorder.as_dict()['wwz']
+    """
+    recorder = StageRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
@@ -0,0 +1,316 @@
+"""
+worker_pool.py
+
+This module provides the worker processes of the 'pool' and 'processes' backends of the parallel solvers.
+
+Each worker process installs the solver once and receives its set IDs from the parent over its
+own task pipe, in chunks. The set IDs of a worker form one stream for the whole run, so when the
+solver prefetches, a single `Prefetcher` per worker loads the next set IDs while the current one
+is computed, whatever the chunk boundaries (a chunk of one set ID still overlaps with the next).
+The parent keeps every worker supplied with enough set IDs for its prefetch depth.
+
+Workers report over their result pipe when they start and finish a set ID. Pipes are written
+synchronously, so the parent knows the set ID a worker was running even if it crashed, and:
+
+- a set ID still running `timeout` seconds after it started (e.g. stuck in compiled code, where
+  the worker's own SIGALRM timeout cannot interrupt it) gets its worker killed and replaced, and
+  is recorded as failed;
+- a worker that crashed is replaced, the set ID it was running is retried up to `max_retries`
+  times and then recorded as failed;
+- a worker that retires (after `max_tasks_per_worker` set IDs or above the memory ceiling of
+  the solver) exits after its current set ID and is replaced alone.
+
+The other set IDs a killed, crashed or retired worker held are handed to the other workers.
+
+Classes:
+--------
+- WorkerPool: Worker processes running the set IDs of a solver, supervised by the parent.
+"""
+
+import os
+import time
+import math
+import threading
+from collections import deque
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+
+# Messages of a worker to the parent
+READY = 'ready'
+STARTED = 'started'
+FINISHED = 'finished'
+RETIRED = 'retired'
+# Seconds between checks of the task pipe by a worker asked to stop
+TASK_POLL_SECONDS = 0.1
+# Seconds given to workers to exit once asked to stop, before they are killed
+STOP_SECONDS = 10.0
+# Seconds a worker past the timeout has to report it itself before it is killed
+TIMEOUT_GRACE_SECONDS = 1.0
+
+
+def _worker_main(solver, tasks, results):
+    """
+    Body of a worker process: runs the set IDs received on `tasks` and reports on `results`
+    until it gets None, retires or its task pipe is closed.
+    """
+    stopping = threading.Event()
+
+    def report(*message):
+        # Sent synchronously, the parent gets it even if the worker crashes right after
+        results.send(message)
+
+    def stream():
+        # Set IDs of all chunks, read by the prefetching thread if there is one
+        while not stopping.is_set():
+            if not tasks.poll(TASK_POLL_SECONDS):
+                continue
+            try:
+                chunk = tasks.recv()
+            except EOFError:
+                return
+            if chunk is None:
+                return
+            yield from chunk
+
+    solver.setup_worker()
+    report(READY, os.getpid())
+    prefetcher = solver.prefetcher(stream()).start() if solver.prefetch else None
+    loaded = prefetcher if prefetcher is not None else ((set_id, None) for set_id in stream())
+    tasks_done = 0
+    try:
+        for set_id, data in loaded:
+            report(STARTED, set_id)
+            start = time.perf_counter()
+            res, error = solver.process_one(set_id, data)
+            report(FINISHED, (set_id, res, time.perf_counter() - start, error, solver.stages_))
+
+            tasks_done += 1
+            if solver.max_tasks_per_worker is not None and tasks_done >= solver.max_tasks_per_worker:
+                report(RETIRED, f'{tasks_done} set IDs processed')
+                break
+            if solver.over_memory_limit():
+                print(f'Worker {os.getpid()} above {solver.max_rss_mb} MiB, restarting.')
+                report(RETIRED, f'above {solver.max_rss_mb} MiB')
+                break
+    finally:
+        # Set IDs loaded ahead are not returned, the parent hands them to other workers
+        stopping.set()
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+class _Worker:
+    """Parent side of a worker process: its pipes and the set IDs it holds, in order."""
+
+    def __init__(self, solver):
+        # Pipe() returns the receiving and the sending end
+        tasks_end, self.tasks = Pipe(duplex=False)
+        self.results, results_end = Pipe(duplex=False)
+        self.process = Process(target=_worker_main, args=(solver, tasks_end, results_end), daemon=True)
+        self.process.start()
+        # The worker holds its own ends
+        tasks_end.close()
+        results_end.close()
+        self.ready = False
+        self.held = deque()
+        self.running = None
+        self.started = None
+        self.retiring = False
+
+    def send(self, chunk):
+        self.tasks.send(chunk)
+        if chunk is not None:
+            self.held.extend(chunk)
+
+
+class WorkerPool:
+    """
+    Worker processes running the set IDs of a solver, supervised by the parent process.
+
+    Set IDs are submitted with `submit` and their results are returned by `poll` as
+    (set ID, result, seconds, error, stages) tuples, the same as the workers of the other
+    backends produce. Set IDs that failed in the pool itself (e.g. their worker crashed
+    too often) come back with None as result and stages, and an error.
+
+    Attributes:
+        solver (IParallelSolver): Solver installed in the workers, its `process_one` runs the set IDs.
+        num_workers (int): Number of worker processes.
+        chunksize (int): Number of set IDs sent to a worker at once.
+        chunks_per_worker (int): Number of chunks a worker holds at most, its prefetch depth
+            permitting (a worker always holds one more set ID than it prefetches).
+        max_retries (int): Number of times a set ID is run again after its worker crashed.
+        timeout (float): Seconds after which a worker still running the same set ID is killed
+            (with a short grace period for the worker to time out by itself), None for no limit.
+        n_unfinished (int): Number of submitted set IDs whose result was not returned yet.
+        backlog (deque): Submitted set IDs not sent to a worker yet. More set IDs can be
+            submitted at any time, e.g. once the backlog is empty.
+    """
+
+    def __init__(self, solver, num_workers, chunksize=1, max_in_flight=None, max_retries=0, timeout=None):
+        self.solver = solver
+        self.num_workers = max(int(num_workers), 1)
+        self.chunksize = max(int(chunksize), 1)
+        max_in_flight = max_in_flight or 2 * self.num_workers
+        self.chunks_per_worker = max(math.ceil(max_in_flight / self.num_workers), 1)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.n_unfinished = 0
+        self.backlog = deque()
+        self.crashes = {}
+        self.setup_failures = 0
+        self.workers = []
+
+    def capacity(self):
+        """Number of set IDs a worker may hold."""
+        return max(self.chunks_per_worker * self.chunksize, (self.solver.prefetch or 0) + 1)
+
+    def start(self):
+        """Starts the worker processes."""
+        while len(self.workers) < self.num_workers:
+            self.workers.append(_Worker(self.solver))
+        return self
+
+    def submit(self, set_ids):
+        """Queues set IDs for the workers."""
+        set_ids = list(set_ids)
+        self.backlog.extend(set_ids)
+        self.n_unfinished += len(set_ids)
+
+    def _dispatch(self):
+        """Sends chunks from the backlog to the workers holding the fewest set IDs."""
+        capacity = self.capacity()
+        while self.backlog:
+            open_workers = [worker for worker in self.workers
+                            if not worker.retiring and len(worker.held) < capacity]
+            if not open_workers:
+                return
+            worker = min(open_workers, key=lambda w: len(w.held))
+            n = min(self.chunksize, capacity - len(worker.held), len(self.backlog))
+            chunk = [self.backlog.popleft() for _ in range(n)]
+            try:
+                worker.send(chunk)
+            except OSError:
+                # The worker died, its exit is handled with its sentinel
+                self.backlog.extendleft(reversed(chunk))
+                worker.retiring = True
+
+    def poll(self, timeout=None):
+        """
+        Supplies the workers, waits up to `timeout` seconds for their messages, handles the
+        workers that exited and kills the ones past the deadline of their set ID.
+
+        Returns:
+            list: (set ID, result, seconds, error, stages) tuples of the set IDs that finished.
+        """
+        self._replace_workers()
+        self._dispatch()
+        finished = []
+        connections = {worker.results: worker for worker in self.workers}
+        sentinels = {worker.process.sentinel: worker for worker in self.workers}
+        ready = wait(list(connections) + list(sentinels), timeout)
+        for handle in ready:
+            if handle in connections:
+                self._receive(connections[handle], finished)
+        for handle in ready:
+            if handle in sentinels:
+                self._handle_exit(sentinels[handle], finished)
+        self._enforce_deadlines(finished)
+        self.n_unfinished -= len(finished)
+        return finished
+
+    def _receive(self, worker, finished):
+        """Handles the messages waiting on the result pipe of a worker."""
+        try:
+            while worker.results.poll():
+                kind, payload = worker.results.recv()
+                if kind == READY:
+                    worker.ready = True
+                    self.setup_failures = 0
+                elif kind == STARTED:
+                    worker.running, worker.started = payload, time.monotonic()
+                elif kind == FINISHED:
+                    worker.held.remove(payload[0])
+                    worker.running = None
+                    finished.append(payload)
+                elif kind == RETIRED:
+                    worker.retiring = True
+        except (EOFError, OSError):
+            # The worker exited, handled with its sentinel
+            pass
+
+    def _handle_exit(self, worker, finished):
+        """Takes back the set IDs of a worker that exited and records the one it crashed on."""
+        self._receive(worker, finished)
+        worker.process.join()
+        self.workers.remove(worker)
+        exitcode = worker.process.exitcode
+        if worker.running is not None:
+            set_id = worker.running
+            worker.held.remove(set_id)
+            self.crashes[set_id] = self.crashes.get(set_id, 0) + 1
+            if self.crashes[set_id] <= self.max_retries:
+                self.backlog.appendleft(set_id)
+            else:
+                finished.append((set_id, None, None, f'Worker crashed (exit code {exitcode})', None))
+        elif not worker.ready:
+            # The worker failed in its setup, e.g. opening the data
+            self.setup_failures += 1
+            if self.setup_failures > self.max_retries:
+                for set_id in list(worker.held) + list(self.backlog):
+                    finished.append((set_id, None, None, f'Worker setup failed (exit code {exitcode})', None))
+                worker.held.clear()
+                self.backlog.clear()
+        # Set IDs sent to the worker and not started go to the other workers first
+        self.backlog.extendleft(reversed(worker.held))
+        self._close_pipes(worker)
+
+    def _enforce_deadlines(self, finished):
+        """Kills the workers running a set ID for longer than the timeout, which fails."""
+        if self.timeout is None:
+            return
+        for worker in list(self.workers):
+            if worker.running is None or time.monotonic() - worker.started <= self.timeout + TIMEOUT_GRACE_SECONDS:
+                continue
+            set_id = worker.running
+            print(f'Set ID {set_id} still running after {self.timeout} s, killing worker {worker.process.pid}.')
+            worker.process.kill()
+            worker.process.join()
+            # The set ID may have finished just before the worker was killed
+            self._receive(worker, finished)
+            if worker.running == set_id:
+                worker.held.remove(set_id)
+                worker.running = None
+                finished.append((set_id, None, time.monotonic() - worker.started,
+                                 f'Timeout after {self.timeout} s, worker killed', None))
+            self._handle_exit(worker, finished)
+
+    def _replace_workers(self):
+        """Starts workers in place of the ones that exited, while there are set IDs to run."""
+        if self.backlog:
+            self.start()
+
+    def _close_pipes(self, worker):
+        worker.tasks.close()
+        worker.results.close()
+
+    def close(self):
+        """Stops the workers, set IDs they still hold are abandoned."""
+        for worker in self.workers:
+            try:
+                worker.tasks.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + STOP_SECONDS
+        for worker in self.workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            self._close_pipes(worker)
+        self.workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()